@@ -1,64 +1,185 @@
 #!/usr/bin/env python3
 
-"""Batch process all studies from 2024-01-01 to today using store_study_info.py"""
+"""Backfill study_info.db for every day between --start and --end.
 
-import subprocess
+Days are harvested concurrently by a pool of worker threads that share the
+single Orthanc client of :mod:`store_study_info`; every finished day is then
+written by the main thread (the only one touching SQLite) in one transaction
+and recorded in a checkpoint file.  An interrupted run picks up where it left
+off when started again with the same checkpoint.
+
+Usage examples
+--------------
+    ./batch_process_studies.py --start 2024-01-01
+    ./batch_process_studies.py --start 2024-01-01 --end 2025-09-02 --workers 8
+"""
+
+import argparse
+import json
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
+import request_metrics
+import store_study_info
+
+DEFAULT_CHECKPOINT = "backfill_checkpoint.json"
+DEFAULT_DAY_WORKERS = 4
+
+
 def generate_date_range(start_date_str, end_date_str):
     """Generate all dates between start and end (inclusive)"""
     start = datetime.strptime(start_date_str, "%Y-%m-%d")
     end = datetime.strptime(end_date_str, "%Y-%m-%d")
-    
+
     current = start
     while current <= end:
         yield current.strftime("%Y%m%d")
         current += timedelta(days=1)
 
-def main():
-    start_date = "2024-01-01"
-    end_date = "2025-09-02"  # Today
-    
-    print(f"Processing studies from {start_date} to {end_date}")
-    
-    total_dates = 0
-    processed_dates = 0
-    
-    # Count total dates first
-    for _ in generate_date_range(start_date, end_date):
-        total_dates += 1
-    
-    print(f"Total dates to process: {total_dates}")
-    
-    for date_str in generate_date_range(start_date, end_date):
-        processed_dates += 1
-        print(f"[{processed_dates}/{total_dates}] Processing {date_str}...")
-        
-        try:
-            # Run store_study_info.py with the date
-            result = subprocess.run(
-                [sys.executable, "store_study_info.py", date_str],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout per date
+
+def load_checkpoint(path):
+    """Return the set of YYYYMMDD days already completed according to *path*."""
+    try:
+        with open(path) as f:
+            return set(json.load(f).get("completed", []))
+    except FileNotFoundError:
+        return set()
+
+
+def save_checkpoint(path, completed):
+    """Atomically write the set of *completed* days to *path*."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"completed": sorted(completed)}, f, indent=0)
+    os.replace(tmp, path)
+
+
+def backfill(days, conn, checkpoint, workers, series_workers):
+    """Harvest *days* concurrently and write each one as it completes.
+
+    Returns the number of days that failed.
+    """
+    completed = load_checkpoint(checkpoint)
+    pending = [day for day in days if day not in completed]
+    total = len(pending)
+    print(f"{len(days) - total} dates already done, {total} to process")
+
+    failures = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {}
+        for day in pending:
+            # Find the day's studies and preload on the main thread; workers
+            # only ever read the writer's in-memory state and queue rows on it.
+            try:
+                studies = store_study_info.studies_for_date(day)
+            except Exception as e:
+                failures += 1
+                print(f"ERROR finding studies for {day}: {e}", file=sys.stderr)
+                continue
+            writer = store_study_info.StudyInfoWriter(conn)
+            writer.preload(studies)
+            future = pool.submit(
+                store_study_info.process_day,
+                day,
+                writer,
+                studies=studies,
+                workers=series_workers,
             )
-            
-            if result.returncode != 0:
-                print(f"  ERROR processing {date_str}: {result.stderr}")
-            elif result.stdout.strip():
-                # Only print if there was output (studies processed)
-                lines = result.stdout.strip().split('\n')
-                print(f"  Processed {len(lines)} studies")
-            else:
-                print(f"  No studies found")
-                
-        except subprocess.TimeoutExpired:
-            print(f"  TIMEOUT processing {date_str}")
-        except Exception as e:
-            print(f"  EXCEPTION processing {date_str}: {e}")
-    
-    print(f"Batch processing complete. Processed {processed_dates} dates.")
+            futures[future] = (day, writer)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            day, writer = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{total}] ERROR processing {day}: {e}", file=sys.stderr)
+                continue
+
+            writer.flush()
+            completed.add(day)
+            save_checkpoint(checkpoint, completed)
+            print(f"[{done}/{total}] {day}: processed {count} studies")
+    except KeyboardInterrupt:
+        pool.shutdown(wait=True, cancel_futures=True)
+        print("Interrupted; rerun to resume from the checkpoint.", file=sys.stderr)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Backfill study_info.db for a range of study dates."
+    )
+    parser.add_argument(
+        "--start", required=True, metavar="YYYY-MM-DD", help="First study date"
+    )
+    parser.add_argument(
+        "--end",
+        default=datetime.today().strftime("%Y-%m-%d"),
+        metavar="YYYY-MM-DD",
+        help="Last study date, inclusive (default: today)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_DAY_WORKERS,
+        metavar="N",
+        help=f"Number of days harvested concurrently (default: {DEFAULT_DAY_WORKERS})",
+    )
+    parser.add_argument(
+        "--series-workers",
+        type=int,
+        default=store_study_info.DEFAULT_WORKERS,
+        metavar="N",
+        help=(
+            "Concurrent header downloads per study "
+            f"(default: {store_study_info.DEFAULT_WORKERS})"
+        ),
+    )
+    parser.add_argument(
+        "--db",
+        metavar="PATH",
+        default=store_study_info.DEFAULT_DB_PATH,
+        help=f"SQLite database file (default: {store_study_info.DEFAULT_DB_PATH})",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        default=DEFAULT_CHECKPOINT,
+        help=f"File recording completed days (default: {DEFAULT_CHECKPOINT})",
+    )
+    request_metrics.add_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    request_metrics.report_at_exit(args.metrics_out)
+    days = list(generate_date_range(args.start, args.end))
+
+    print(f"Processing studies from {args.start} to {args.end}")
+    print(f"Total dates to process: {len(days)}")
+
+    conn = store_study_info.get_db_connection(args.db)
+    try:
+        failures = backfill(
+            days, conn, args.checkpoint, args.workers, args.series_workers
+        )
+    finally:
+        conn.close()
+
+    print(f"Batch processing complete. {failures} dates failed.")
+    if failures:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+"""Benchmark the billing tools against a local fake Orthanc.
+
+Starts :class:`fake_orthanc.FakeOrthanc` with a synthetic corpus, runs
+``store_study_info.py``, ``duration.py`` and ``duration94.py`` on it as
+subprocesses (each in a scratch directory, with ``ORTHANC_URL`` pointing at the
+fake server and a throw-away netrc) and reports for every tool the requests
+it issued, the bytes transferred and the wall time, in total and per study.
+
+    ./bench_billing.py --days 5 --instances-per-series 200 --latency 0.002
+    ./bench_billing.py --json bench.json      # machine-readable, e.g. for CI
+
+The request and byte counts are deterministic for a given corpus, so they can
+be compared between commits directly; wall times depend on the machine.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_orthanc import FakeOrthanc, add_corpus_arguments, corpus_from_args
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BILLING_LOOKUP = "StudyID\tFundCode\tPIName\tRate\nPROJ_100\tF100\tInvestigator\t700\n"
+
+
+def tool_runs(month):
+    """Return (name, argv, studies counted) for every benchmarked run.
+
+    "E" counts only research studies, "all" every study of the corpus.
+    Runs sharing a scratch directory see each other's databases and caches,
+    which is how the cached duration run is measured.
+    """
+    return [
+        (
+            "store_study_info",
+            ["store_study_info.py", "--db", "study_info.db", month],
+            "E",
+        ),
+        ("duration", ["duration.py", month, "--refresh"], "E"),
+        ("duration (cached)", ["duration.py", month], "E"),
+        ("duration94", ["duration94.py", month, "--refresh"], "all"),
+    ]
+
+
+def run_tool(server, argv, workdir):
+    """Run one billing script against *server*; return (wall time, stats)."""
+    env = dict(os.environ, ORTHANC_URL=server.url, HOME=workdir)
+    server.stats.reset()
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.join(HERE, argv[0])] + argv[1:],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    wall_time = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{argv[0]} failed:\n{result.stderr}")
+    return wall_time, server.stats.snapshot()
+
+
+def benchmark(server, repeat=1):
+    """Run every tool *repeat* times; return a result dict per tool.
+
+    The wall time reported is the fastest of the repeats.
+    """
+    corpus = server.corpus
+    month = min(s["MainDicomTags"]["StudyDate"] for s in corpus.studies.values())[:6]
+    counts = {
+        "all": len(corpus.studies),
+        "E": sum(
+            s["MainDicomTags"]["AccessionNumber"].startswith("E")
+            for s in corpus.studies.values()
+        ),
+    }
+
+    results = {}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            netrc_path = os.path.join(workdir, ".netrc")
+            with open(netrc_path, "w") as f:
+                f.write("machine 127.0.0.1 login bench password bench\n")
+            os.chmod(netrc_path, 0o600)
+            with open(os.path.join(workdir, "billinglookup.tsv"), "w") as f:
+                f.write(BILLING_LOOKUP)
+
+            for name, argv, counted in tool_runs(month):
+                wall_time, stats = run_tool(server, argv, workdir)
+                best = results.get(name)
+                if best is not None and best["wall_time"] <= wall_time:
+                    continue
+                studies = max(1, counts[counted])
+                results[name] = {
+                    "studies": counts[counted],
+                    "wall_time": wall_time,
+                    "requests": stats["requests"],
+                    "bytes_in": stats["bytes_in"],
+                    "bytes_out": stats["bytes_out"],
+                    "connections": stats["connections"],
+                    "per_study": {
+                        "wall_time": wall_time / studies,
+                        "requests": stats["requests"] / studies,
+                        "bytes": (stats["bytes_in"] + stats["bytes_out"]) / studies,
+                    },
+                    "routes": stats["routes"],
+                }
+    return results
+
+
+def print_report(results, verbose=False):
+    header = (
+        f"{'tool':<20}{'studies':>8}{'requests':>10}{'MB':>9}{'wall s':>9}"
+        f"{'req/study':>11}{'kB/study':>10}{'ms/study':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        per = r["per_study"]
+        print(
+            f"{name:<20}{r['studies']:>8}{r['requests']:>10}"
+            f"{(r['bytes_in'] + r['bytes_out']) / 1e6:>9.2f}{r['wall_time']:>9.2f}"
+            f"{per['requests']:>11.1f}{per['bytes'] / 1e3:>10.1f}"
+            f"{per['wall_time'] * 1e3:>10.1f}"
+        )
+        if verbose:
+            for route, entry in sorted(r["routes"].items()):
+                print(
+                    f"    {route:<40}{entry['requests']:>8}"
+                    f"{(entry['bytes_in'] + entry['bytes_out']) / 1e6:>9.2f} MB"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the billing tools against a fake Orthanc."
+    )
+    add_corpus_arguments(parser)
+    parser.add_argument(
+        "--repeat", type=int, default=1, metavar="N", help="Keep the fastest of N runs"
+    )
+    parser.add_argument("--json", metavar="PATH", help="Also write the results here")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Break requests down per route"
+    )
+    args = parser.parse_args()
+
+    first = datetime.datetime.strptime(args.start, "%Y%m%d").date()
+    last = first + datetime.timedelta(days=args.days - 1)
+    if (first.year, first.month) != (last.year, last.month):
+        parser.error("the corpus must lie within one month (see --start, --days)")
+
+    corpus = corpus_from_args(args)
+    with FakeOrthanc(corpus, latency=args.latency) as server:
+        results = benchmark(server, repeat=max(1, args.repeat))
+
+    print_report(results, args.verbose)
+    if args.json:
+        corpus_info = {
+            key: getattr(args, key)
+            for key in (
+                "start",
+                "days",
+                "studies_per_day",
+                "series_per_study",
+                "instances_per_series",
+                "pixel_bytes",
+                "latency",
+            )
+        }
+        with open(args.json, "w") as f:
+            json.dump({"corpus": corpus_info, "tools": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
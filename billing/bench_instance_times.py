@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+"""Micro-benchmark: instance_times.time_bounds vs. the former strptime loop.
+
+    ./bench_instance_times.py [N_INSTANCES]
+
+Builds a synthetic bulk-content payload (half the times with fractional
+seconds, a few malformed entries) and reports the best of several runs.
+"""
+
+import datetime
+import random
+import sys
+import timeit
+
+from instance_times import instance_creation_pairs, time_bounds
+
+
+def strptime_bounds(data):
+    """The loop previously used by duration_utils.duration (reference)."""
+    instance_creation_datetimes = []
+
+    for item in data:
+        if (
+            "MainDicomTags" in item
+            and "InstanceCreationDate" in item["MainDicomTags"]
+            and "InstanceCreationTime" in item["MainDicomTags"]
+        ):
+            datetime_str = (
+                item["MainDicomTags"]["InstanceCreationDate"]
+                + item["MainDicomTags"]["InstanceCreationTime"]
+            )
+
+            # Try both formats - with and without microseconds
+            for fmt in ["%Y%m%d%H%M%S.%f", "%Y%m%d%H%M%S"]:
+                try:
+                    dt = datetime.datetime.strptime(datetime_str, fmt)
+                    instance_creation_datetimes.append(dt)
+                    break
+                except ValueError:
+                    continue
+
+    try:
+        return min(instance_creation_datetimes), max(instance_creation_datetimes)
+    except ValueError:
+        return None, None
+
+
+def synthetic_payload(n, seed=0):
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 3, 14, 8, 0, 0)
+    data = []
+    for i in range(n):
+        t = start + datetime.timedelta(seconds=rng.uniform(0, 3 * 3600))
+        time = t.strftime("%H%M%S.%f")[: rng.choice((6, 9, 13))]
+        if i % 997 == 0:
+            time = "garbage"
+        data.append(
+            {
+                "ID": f"{i:08x}-0000",
+                "MainDicomTags": {
+                    "InstanceCreationDate": t.strftime("%Y%m%d"),
+                    "InstanceCreationTime": time,
+                    "InstanceNumber": str(i),
+                    "SOPInstanceUID": f"1.2.3.{i}",
+                },
+            }
+        )
+    return data
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = synthetic_payload(n)
+    assert time_bounds(instance_creation_pairs(data)) == strptime_bounds(data)
+
+    for name, fn in (
+        ("strptime loop", lambda: strptime_bounds(data)),
+        ("time_bounds", lambda: time_bounds(instance_creation_pairs(data))),
+    ):
+        best = min(timeit.repeat(fn, number=1, repeat=5))
+        print(f"{name:>14}: {best * 1000:8.1f} ms for {n} instances")
+
+
+if __name__ == "__main__":
+    main()
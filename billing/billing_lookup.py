@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""StudyID -> fund code, PI and hourly rate, from billinglookup.tsv.
+
+:class:`BillingLookup` parses the tab-separated table (columns StudyID,
+FundCode, PIName, Rate) once and re-reads it only when the file's
+modification time or size changes, so a long-running billing process picks
+up edits without a restart.
+
+StudyIDs are matched exactly first, then normalized (case, surrounding
+blanks, and runs of blanks, "-" and "_" all count the same), then by the
+longest entry that is a prefix ending at a separator, so that "PROJ_100"
+covers "proj-100", "PROJ_100_session2" but not "PROJ_1000".  Every step is
+a dictionary lookup.
+"""
+
+import csv
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Tried in order; the first that exists is used.
+DEFAULT_PATHS = (
+    "/94tresearch/billing/billinglookup.tsv",  # primary location
+    "billinglookup.tsv",  # current directory fallback
+)
+FALLBACK_RATE = 9999
+
+_SEPARATORS = re.compile(r"[\s_-]+")
+
+
+def normalize_study_id(study_id):
+    """Return *study_id* upper-cased with separator runs replaced by "_"."""
+    return _SEPARATORS.sub("_", study_id.strip().upper()).strip("_")
+
+
+def parse_lookup(f, fallback_rate=FALLBACK_RATE):
+    """Return {StudyID: entry} from the open TSV file *f*.
+
+    An entry is a dict with "FundCode", "PIName" and "Rate" (an int; rates
+    that are not whole numbers become *fallback_rate*).
+    """
+    table = {}
+    for row in csv.DictReader(f, delimiter="\t"):
+        rate = row["Rate"]
+        table[row["StudyID"]] = {
+            "FundCode": row["FundCode"],
+            "PIName": row["PIName"],
+            "Rate": int(rate) if rate.isdigit() else fallback_rate,
+        }
+    return table
+
+
+class BillingLookup:
+    """Thread-safe, self-reloading view of the billing lookup table."""
+
+    def __init__(self, paths=DEFAULT_PATHS, fallback_rate=FALLBACK_RATE):
+        self.paths = tuple(paths)
+        self.fallback_rate = fallback_rate
+        self._lock = threading.Lock()
+        self._signature = ()  # see _current_file; () before the first check
+        self._exact = {}
+        self._normalized = {}
+
+    def get(self, study_id):
+        """Return the entry for *study_id*, or None if nothing matches."""
+        with self._lock:
+            self._refresh()
+            entry = self._exact.get(study_id)
+            if entry is not None:
+                return entry
+            key = normalize_study_id(study_id)
+            while key:
+                entry = self._normalized.get(key)
+                if entry is not None:
+                    return entry
+                key = key.rpartition("_")[0]
+            return None
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._exact)
+
+    def _refresh(self):
+        """Re-read the table if another file or a changed one is in place.
+
+        If the file disappears or cannot be parsed, the last table read
+        stays in use until the file changes again.
+        """
+        signature = self._current_file()
+        if signature == self._signature:
+            return
+        self._signature = signature
+        if signature is None:
+            logger.warning(
+                "No billing lookup table found in " + " or ".join(self.paths)
+            )
+            return
+
+        path = signature[0]
+        try:
+            with open(path, "r") as f:
+                table = parse_lookup(f, self.fallback_rate)
+        except Exception as e:
+            logger.warning(f"Failed to load billing lookup table from {path}: {e}")
+            return
+        self._load(table)
+        logger.info(f"Loaded {len(table)} entries from billing lookup table at {path}")
+
+    def _current_file(self):
+        """Return (path, mtime_ns, size) of the first existing path, or None."""
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            return (path, st.st_mtime_ns, st.st_size)
+        return None
+
+    def _load(self, table):
+        self._exact = table
+        self._normalized = {}
+        for study_id, entry in table.items():
+            self._normalized.setdefault(normalize_study_id(study_id), entry)
@@ -0,0 +1,52 @@
+import importlib
+
+import pytest
+
+import orthanc_client
+from scanner_model import ScannerModelResolver
+
+
+def import_script(name, server, monkeypatch, tmp_path_factory):
+    """Import the script module *name*, which connects on first import, with
+    the credentials and ORTHANC_URL of the test module's *server*; return
+    (module, a client for *server*)."""
+    home = tmp_path_factory.mktemp("home")
+    netrc = home / ".netrc"
+    netrc.write_text("machine 127.0.0.1 login orthanc password orthanc\n")
+    netrc.chmod(0o600)
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("ORTHANC_URL", server.url)
+    module = importlib.import_module(name)
+    return module, orthanc_client.PooledOrthanc(server.url, retries=0)
+
+
+@pytest.fixture
+def store_study_info(server, monkeypatch, tmp_path_factory):
+    """The store_study_info module, talking to the test module's *server*."""
+    module, client = import_script(
+        "store_study_info", server, monkeypatch, tmp_path_factory
+    )
+    monkeypatch.setattr(module, "ORTHANC", client)
+    monkeypatch.setattr(module, "SCANNER_MODELS", ScannerModelResolver(client))
+    return module
+
+
+@pytest.fixture
+def duration(server, monkeypatch, tmp_path_factory):
+    """The duration module, talking to the test module's *server*."""
+    module, client = import_script("duration", server, monkeypatch, tmp_path_factory)
+    monkeypatch.setattr(module, "o", client)
+    monkeypatch.setattr(module, "scanner_models", ScannerModelResolver(client))
+    return module
+
+
+@pytest.fixture
+def duration94(server, monkeypatch, tmp_path_factory):
+    """The duration94 module, talking to the test module's *server*, without
+    a billing lookup table."""
+    from billing_lookup import BillingLookup
+
+    module, client = import_script("duration94", server, monkeypatch, tmp_path_factory)
+    monkeypatch.setattr(module, "o", client)
+    monkeypatch.setattr(module, "BILLING_LOOKUP", BillingLookup(paths=()))
+    return module
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 
 import sys
+import argparse
 import csv
 import datetime
-import httpx
 import logging
-import pyorthanc
+import orthanc_client
+import request_metrics
+from concurrent.futures import ThreadPoolExecutor
+from duration_cache import DurationCache, DEFAULT_CACHE_PATH
+from scanner_model import ScannerModelResolver
 from duration_utils import (
+    ExpandedStudy,
     setup_orthanc_connection,
-    studies_for_date,
-    duration,
+    studies_for_dates,
+    cached_duration,
     parse_date_range,
     format_duration_hms,
 )
@@ -22,44 +27,48 @@ logger = logging.getLogger(__name__)
 
 host = "micvna.mclean.harvard.edu"
 port = 8042
-o, server, username, password = setup_orthanc_connection(host, port)
+DEFAULT_WORKERS = 8
+o = setup_orthanc_connection(host, port)
+scanner_models = ScannerModelResolver(o, workers=DEFAULT_WORKERS)
 
 
-def studies_for_date_filtered(study_date, qa_mode=False):
+def studies_for_dates_filtered(dates, qa_mode=False):
     if qa_mode:
-        return studies_for_date(study_date, o)
+        return studies_for_dates(dates, o)
     else:
-        return studies_for_date(study_date, o, {"AccessionNumber": "E*"})
+        return studies_for_dates(dates, o, {"AccessionNumber": "E*"})
 
 
-def get_study(study_id, qa_mode=False):
-    if type(study_id) == str and study_id.startswith("E"):
-        accnum = study_id
-        query = {"AccessionNumber": accnum}
-        studies = pyorthanc.find_studies(client=o, query=query)
-        if len(studies) == 0:
-            logger.error(f"No studies found with query {repr(query)}")
-            sys.exit(1)
-        study = studies[0]
-    else:
-        study = study_id
+def find_study(accnum):
+    query = {"AccessionNumber": accnum}
+    records = orthanc_client.find_expanded(o, query)
+    if len(records) == 0:
+        logger.error(f"No studies found with query {repr(query)}")
+        sys.exit(1)
+    return ExpandedStudy(records[0], o)
+
+
+def get_scanner_model(study):
+    # not every instance has the scanner model; the resolver checks series tags
+    # and scanners seen earlier in the run before sampling one instance per series
+    series = o.post_tools_bulk_content(
+        {"Resources": [study.identifier], "Level": "Series"}
+    )
+    return scanner_models.resolve(series) or "?"
 
+
+def study_row(study, qa_mode=False, cache=None):
+    """Return the CSV row for *study*, or None if it is not to be reported."""
     data = {}
-    
+
     # In QA mode, skip studies that start with "E"
     if qa_mode and study.main_dicom_tags["AccessionNumber"].startswith("E"):
-        return
-    
+        return None
+
     data["date"] = study.date
-    scanner_model = "?"
-    # not every instance has the scanner model, so we need to loop through all instances
-    for series in study.series:
-        try:
-            scanner_model = series.instances[0].get_content_by_tag("0008,1090")
-            if scanner_model:
-                break
-        except httpx.HTTPError:
-            continue
+    study_duration, _, scanner_model = cached_duration(
+        study, o, cache, get_scanner_model
+    )
 
     data["scanner"] = {
         "MAGNETOM Prisma Fit": "P2",
@@ -71,43 +80,93 @@ def get_study(study_id, qa_mode=False):
     data["protocol"] = study.main_dicom_tags.get("StudyDescription", "missing")
 
     # Format duration as total hours:minutes:seconds
-    study_duration, _ = duration(study, server, username, password)
     data["duration"] = format_duration_hms(study_duration)
 
     # sometimes reconstructs show up as 0
-    if data["duration"] != "0":
-        writer = csv.writer(sys.stdout)
-        writer.writerow(data.values())
-        sys.stdout.flush()
+    if data["duration"] == "0":
+        return None
+    return list(data.values())
+
+
+def write_row(row):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(row)
+    sys.stdout.flush()
+
+
+def get_study(study_id, qa_mode=False, cache=None):
+    if type(study_id) == str and study_id.startswith("E"):
+        study = find_study(study_id)
+    else:
+        study = study_id
+
+    row = study_row(study, qa_mode, cache)
+    if row is not None:
+        write_row(row)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Report scan durations from micvna as CSV.",
+    )
+    parser.add_argument(
+        "target", metavar="YYYYMM[DD] | accession_number", help="Month, day or accession"
+    )
+    parser.add_argument(
+        "--qa",
+        action="store_true",
+        help="Include only QA scans (non-E accession numbers)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        metavar="N",
+        help=f"Number of studies processed concurrently (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Recompute every study instead of using cached results",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        default=DEFAULT_CACHE_PATH,
+        help=f"Per-study result cache (default: {DEFAULT_CACHE_PATH})",
+    )
+    request_metrics.add_arguments(parser)
+    return parser.parse_args()
 
 
 def main():
-    qa_mode = False
-    args = sys.argv[1:]
-    
-    # Check for --qa flag
-    if "--qa" in args:
-        qa_mode = True
-        args.remove("--qa")
-    
-    if len(args) != 1:
-        print("Usage: duration.py [--qa] YYYYMM[DD] | accession_number")
-        print("  --qa: Include only QA scans (non-E accession numbers)")
+    args = parse_args()
+    request_metrics.report_at_exit(args.metrics_out)
+    qa_mode = args.qa
+    arg = args.target
+
+    if arg.startswith("E") and qa_mode:
+        print("Cannot use --qa flag with E accession numbers", file=sys.stderr)
         sys.exit(1)
-    
-    arg = args[0]
+
     print("datetime,scanner,accession_number,patientid,protocol,duration")
-    
+    cache = DurationCache(args.cache, refresh=args.refresh)
+
     if arg.startswith("E"):
-        if qa_mode:
-            print("Cannot use --qa flag with E accession numbers", file=sys.stderr)
-            sys.exit(1)
-        get_study(arg, qa_mode)
-    else:
-        dates = parse_date_range(arg)
-        for date in dates:
-            for study in studies_for_date_filtered(date, qa_mode):
-                get_study(study, qa_mode)
+        get_study(arg, qa_mode, cache)
+        return
+
+    dates = parse_date_range(arg)
+    by_date = studies_for_dates_filtered(dates, qa_mode)
+    studies = [study for date in dates for study in by_date[date]]
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        # map() yields in submission order, so rows come out in the same
+        # StudyDate order as a sequential run while studies are processed
+        # concurrently.
+        for row in pool.map(lambda s: study_row(s, qa_mode, cache), studies):
+            if row is not None:
+                write_row(row)
 
 
 if __name__ == "__main__":
@@ -1,19 +1,23 @@
 #!/usr/bin/env python3
 
 import sys
+import argparse
 import csv
 import datetime
 import logging
 import math
 import os
+import request_metrics
+from billing_lookup import BillingLookup, FALLBACK_RATE
+from concurrent.futures import ThreadPoolExecutor
+from duration_cache import DurationCache, DEFAULT_CACHE_PATH
 from duration_utils import (
     setup_orthanc_connection,
-    studies_for_date,
-    duration,
+    studies_for_dates,
+    cached_duration,
     parse_date_range,
 )
 
-
 logging.basicConfig(
     level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s"
 )
@@ -21,57 +25,13 @@ logger = logging.getLogger(__name__)
 
 host = "94tvna.mclean.harvard.edu"
 port = 8042
-FALLBACK_RATE = 9999
-
-o, server, username, password = setup_orthanc_connection(host, port)
-
-# Cache for billing lookup table
-_billing_lookup = None
-_row_counter = 2  # Start at row 2 (after header)
+DEFAULT_WORKERS = 8
 
+o = setup_orthanc_connection(host, port)
 
-def load_billing_lookup():
-    """Load the billing lookup table for 94T studies."""
-    import os
-
-    # Try /94tresearch/billing first, then current directory if not found
-    possible_paths = [
-        "/94tresearch/billing/billinglookup.tsv",  # primary location
-        "billinglookup.tsv",  # current directory fallback
-    ]
-
-    lookup_dict = {}
-
-    for lookup_file in possible_paths:
-        if os.path.exists(lookup_file):
-            try:
-                with open(lookup_file, "r") as f:
-                    reader = csv.DictReader(f, delimiter="\t")
-                    for row in reader:
-                        study_id = row["StudyID"]
-                        fund_code = row["FundCode"]
-                        pi_name = row["PIName"]
-                        rate = row["Rate"]
-                        lookup_dict[study_id] = {
-                            "FundCode": fund_code,
-                            "PIName": pi_name,
-                            "Rate": int(rate) if rate.isdigit() else FALLBACK_RATE,
-                        }
-                logger.info(
-                    f"Loaded {len(lookup_dict)} entries from billing lookup table at {lookup_file}"
-                )
-                return lookup_dict
-            except Exception as e:
-                logger.warning(
-                    f"Failed to load billing lookup table from {lookup_file}: {e}"
-                )
-                continue
-
-    # If no file found, log warning and return empty dict
-    logger.warning(
-        "No billing lookup table found in /94tresearch/billing or current directory"
-    )
-    return lookup_dict
+# Reloaded whenever billinglookup.tsv changes (see billing_lookup.py)
+BILLING_LOOKUP = BillingLookup()
+FIRST_ROW = 2  # Start at row 2 (after header)
 
 
 def calculate_invoice_number(scan_date):
@@ -86,18 +46,19 @@ def calculate_invoice_number(scan_date):
     return 116 + months_diff
 
 
-def get_study(study):
-    global _row_counter
+def get_study(study, cache=None):
+    """Return the invoice row for *study* without its TOTAL formula.
+
+    The formula refers to the row's own spreadsheet row number, which only
+    the caller knows; see :func:`with_total_formula`.  Returns None for
+    studies with no duration.
+    """
     service = "94T"
 
     # Handle StudyID lookup for 94T scanner
     study_id_tag = study.main_dicom_tags.get("StudyID", "missing")
     if study_id_tag != "missing":
-        global _billing_lookup
-        if _billing_lookup is None:
-            _billing_lookup = load_billing_lookup()
-
-        lookup_entry = _billing_lookup.get(study_id_tag)
+        lookup_entry = BILLING_LOOKUP.get(study_id_tag)
         if lookup_entry:
             grant = lookup_entry["FundCode"]
             pi_name = lookup_entry["PIName"]
@@ -112,12 +73,9 @@ def get_study(study):
         rate = FALLBACK_RATE
 
     # Get duration and start time
-    study_duration, start_time = duration(study, server, username, password)
+    study_duration, start_time, _ = cached_duration(study, o, cache)
     if study_duration == 0 or start_time is None:
-        return  # Skip studies with 0 duration
-    
-    # Get current row number for Excel formula
-    row_number = _row_counter
+        return None  # Skip studies with 0 duration
 
     # Calculate fields
     company = 1600
@@ -145,8 +103,8 @@ def get_study(study):
     # Run date format
     run_date = start_time.strftime("%Y-%m-%d")
 
-    # Output row
-    row = [
+    # Output row; TOTAL is filled in by with_total_formula
+    return [
         company,
         grant,
         service,
@@ -154,29 +112,64 @@ def get_study(study):
         quantity,
         pi_name,
         invoice_number,
-f"=D{row_number}*E{row_number}",
+        None,
         comment,
         run_date,
     ]
 
-    writer = csv.writer(sys.stdout)
-    writer.writerow(row)
-    
-    # Increment row counter for next study
-    _row_counter += 1
+
+def with_total_formula(row, row_number):
+    """Fill in the TOTAL column of *row* as RATE*QUANTITY for *row_number*."""
+    row[7] = f"=D{row_number}*E{row_number}"
+    return row
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Produce the 94T billing sheet as CSV.",
+    )
+    parser.add_argument("target", metavar="YYYYMM[DD]", help="Month or day to bill")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        metavar="N",
+        help=f"Number of studies processed concurrently (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Recompute every study instead of using cached results",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        default=DEFAULT_CACHE_PATH,
+        help=f"Per-study result cache (default: {DEFAULT_CACHE_PATH})",
+    )
+    request_metrics.add_arguments(parser)
+    return parser.parse_args()
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: duration94.py YYYYMM[DD]")
-        sys.exit(1)
-    arg = sys.argv[1]
+    args = parse_args()
+    request_metrics.report_at_exit(args.metrics_out)
     print("COMPANY,GRANT#,SERVICE,RATE,QUANTITY,PI,INVOICE#,TOTAL,COMMENT,RUNDATE")
 
-    dates = parse_date_range(arg)
-    for date in dates:
-        for study in studies_for_date(date, o):
-            get_study(study)
+    dates = parse_date_range(args.target)
+    cache = DurationCache(args.cache, refresh=args.refresh)
+    writer = csv.writer(sys.stdout)
+    row_number = FIRST_ROW
+    by_date = studies_for_dates(dates, o)
+    studies = [study for date in dates for study in by_date[date]]
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        # map() preserves StudyDate order, which the TOTAL formulas rely on.
+        for row in pool.map(lambda s: get_study(s, cache), studies):
+            if row is None:
+                continue
+            writer.writerow(with_total_formula(row, row_number))
+            row_number += 1
 
 
 if __name__ == "__main__":
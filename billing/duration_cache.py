@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""On-disk cache of per-study billing results.
+
+Computing a study's duration means downloading the bulk-content of every one
+of its instances.  Closed studies never change, so the result (duration, start
+time and scanner model) is stored in a small SQLite file keyed by Orthanc
+server and study ID, together with a fingerprint made of the study's
+LastUpdate and instance count.  A cached entry is only used while the
+fingerprint still matches; studies that Orthanc does not yet consider stable
+are never cached.
+"""
+
+import datetime
+import sqlite3
+import threading
+
+from request_metrics import METRICS
+
+DEFAULT_CACHE_PATH = "duration_cache.db"
+
+
+def study_fingerprint(study, client):
+    """Return "LastUpdate/CountInstances" for *study*, or None if not stable."""
+    info = study.get_main_information()
+    if not info.get("IsStable"):
+        return None
+    count = client.get_studies_id_statistics(study.identifier)["CountInstances"]
+    return f"{info['LastUpdate']}/{count}"
+
+
+class DurationCache:
+    """Thread-safe SQLite store of (duration, start time, scanner model).
+
+    With *refresh* set, lookups always miss but results are still stored, so
+    a refreshed run repopulates the cache.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, refresh=False):
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS durations (
+                server        TEXT NOT NULL,
+                study_id      TEXT NOT NULL,
+                fingerprint   TEXT NOT NULL,
+                duration      REAL,     -- seconds
+                start_time    TEXT,     -- ISO 8601
+                scanner_model TEXT,
+                PRIMARY KEY (server, study_id)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, server, study_id, fingerprint):
+        """Return the cached entry as a dict, or None on a miss.
+
+        The dict has keys "duration" (timedelta, or 0 as returned by
+        :func:`duration_utils.duration` for empty studies), "start_time"
+        (datetime or None) and "scanner_model" (str or None).
+        """
+        if self.refresh or fingerprint is None:
+            return None
+        with self._lock, METRICS.timed("sqlite", "cache get"):
+            row = self._conn.execute(
+                "SELECT fingerprint, duration, start_time, scanner_model "
+                "FROM durations WHERE server = ? AND study_id = ?",
+                (server, study_id),
+            ).fetchone()
+        if row is None or row[0] != fingerprint:
+            return None
+
+        _, seconds, start_time, scanner_model = row
+        if start_time is None:
+            return {"duration": 0, "start_time": None, "scanner_model": scanner_model}
+        return {
+            "duration": datetime.timedelta(seconds=seconds),
+            "start_time": datetime.datetime.fromisoformat(start_time),
+            "scanner_model": scanner_model,
+        }
+
+    def put(
+        self, server, study_id, fingerprint, study_duration, start_time, scanner_model=None
+    ):
+        """Store a result; ignored when *fingerprint* is None (unstable study)."""
+        if fingerprint is None:
+            return
+        seconds = 0 if study_duration == 0 else study_duration.total_seconds()
+        with self._lock, METRICS.timed("sqlite", "cache put"), self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO durations
+                    (server, study_id, fingerprint, duration, start_time, scanner_model)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(server, study_id) DO UPDATE SET
+                    fingerprint   = excluded.fingerprint,
+                    duration      = excluded.duration,
+                    start_time    = excluded.start_time,
+                    scanner_model = COALESCE(excluded.scanner_model,
+                                             durations.scanner_model)
+                """,
+                (
+                    server,
+                    study_id,
+                    fingerprint,
+                    seconds,
+                    None if start_time is None else start_time.isoformat(),
+                    scanner_model,
+                ),
+            )
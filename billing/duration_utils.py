@@ -1,85 +1,110 @@
 #!/usr/bin/env python3
 
 import datetime
-import netrc
-import requests
 import pyorthanc
-import time
 import logging
-import os
+
+import orthanc_client
+from duration_cache import study_fingerprint
+from instance_times import instance_creation_pairs, time_bounds
+from json_stream import iter_json_array
 
 
 logger = logging.getLogger(__name__)
 
 
 def setup_orthanc_connection(host, port=8042):
-    """Setup Orthanc connection with netrc authentication."""
-    server = f"http://{host}:{port}"
+    """Setup pooled Orthanc connection with netrc authentication."""
+    return orthanc_client.connect(host, port)
 
-    try:
-        netrc_file = os.path.expanduser("~/.netrc")
-        username, _, password = netrc.netrc(netrc_file).authenticators(host)
-    except (FileNotFoundError, TypeError):
-        username, _, password = netrc.netrc("netrc").authenticators(host)
 
-    o = pyorthanc.Orthanc(server, username=username, password=password)
-    return o, server, username, password
+class ExpandedStudy(pyorthanc.Study):
+    """pyorthanc Study backed by the record an expanded ``/tools/find`` returned.
 
+    MainDicomTags, PatientMainDicomTags, the series list, IsStable and
+    LastUpdate are read from that record instead of a GET /studies/{id} on
+    every attribute access.
+    """
 
-def studies_for_date(study_date, client, query_filter=None):
-    """Find studies for a given date with optional query filter."""
-    query = {"StudyDate": study_date}
+    def __init__(self, record, client):
+        super().__init__(record["ID"], client)
+        self._record = record
+
+    def get_main_information(self):
+        return self._record
+
+
+def studies_for_dates(dates, client, query_filter=None):
+    """Return {date: studies sorted by time} for the YYYYMMDD strings *dates*.
+
+    All dates are fetched with one ranged StudyDate query (paged with
+    Limit/Since for very large ranges) and grouped locally.
+    """
+    query = {"StudyDate": orthanc_client.date_range_query(dates)}
     if query_filter:
         query.update(query_filter)
 
-    studies = pyorthanc.find_studies(client=client, query=query)
-    return sorted(studies, key=lambda study: study.date)
+    by_date = {date: [] for date in dates}
+    for record in orthanc_client.find_expanded(client, query):
+        date = record["MainDicomTags"].get("StudyDate")
+        if date in by_date:
+            by_date[date].append(ExpandedStudy(record, client))
+    for studies in by_date.values():
+        studies.sort(key=lambda study: study.date)
+    return by_date
+
+
+def studies_for_date(study_date, client, query_filter=None):
+    """Find studies for a given date with optional query filter."""
+    return studies_for_dates([study_date], client, query_filter)[study_date]
 
 
-def duration(study, server, username, password):
+def duration(study, client):
     """Calculate study duration from DICOM instance creation times."""
-    # Use bulk-content as it's vastly faster than the pyorthanc method; retry on transient connection errors.
-    while True:
-        try:
-            data = requests.post(
-                server + "/tools/bulk-content",
-                json={"Resources": [study.identifier], "Level": "Instance"},
-                auth=(username, password),
-            ).json()
-            logger.info(f"Getting {study.identifier}")
-            break
-        except Exception as e:
-            logger.warning(f"Warning: {e}, retrying in 1 second...")
-            time.sleep(1)
-
-    instance_creation_datetimes = []
-
-    for item in data:
-        if (
-            "MainDicomTags" in item
-            and "InstanceCreationDate" in item["MainDicomTags"]
-            and "InstanceCreationTime" in item["MainDicomTags"]
-        ):
-            datetime_str = (
-                item["MainDicomTags"]["InstanceCreationDate"]
-                + item["MainDicomTags"]["InstanceCreationTime"]
-            )
-
-            # Try both formats - with and without microseconds
-            for fmt in ["%Y%m%d%H%M%S.%f", "%Y%m%d%H%M%S"]:
-                try:
-                    dt = datetime.datetime.strptime(datetime_str, fmt)
-                    instance_creation_datetimes.append(dt)
-                    break
-                except ValueError:
-                    continue
-
-    try:
-        min_time = min(instance_creation_datetimes)
-        max_time = max(instance_creation_datetimes)
-        return max_time - min_time, min_time
-    except ValueError:
+    # Use bulk-content as it's vastly faster than the pyorthanc method; the
+    # client retries transient connection errors with backoff.  The response
+    # is decoded one instance at a time so memory stays flat for huge studies.
+    logger.info(f"Getting {study.identifier}")
+    with client.stream(
+        "POST",
+        client.url + "/tools/bulk-content",
+        json={"Resources": [study.identifier], "Level": "Instance"},
+    ) as response:
+        response.raise_for_status()
+        instances = iter_json_array(response.iter_bytes())
+        min_time, max_time = time_bounds(instance_creation_pairs(instances))
+    if min_time is None:
         return 0, None
+    return max_time - min_time, min_time
+
+
+def cached_duration(study, client, cache, scanner_model_fn=None):
+    """Return (duration, start_time, scanner_model), consulting *cache* first.
+
+    *cache* is a :class:`duration_cache.DurationCache` or None.  The scanner
+    model is only looked up (with ``scanner_model_fn(study)``) when a function
+    is given; otherwise None is returned in its place.
+    """
+    if cache is None:
+        study_duration, start_time = duration(study, client)
+        model = scanner_model_fn(study) if scanner_model_fn else None
+        return study_duration, start_time, model
+
+    fingerprint = study_fingerprint(study, client)
+    entry = cache.get(client.url, study.identifier, fingerprint)
+    if entry is not None:
+        study_duration, start_time = entry["duration"], entry["start_time"]
+        model = entry["scanner_model"]
+        if model is not None or scanner_model_fn is None:
+            return study_duration, start_time, model
+    else:
+        study_duration, start_time = duration(study, client)
+
+    model = scanner_model_fn(study) if scanner_model_fn else None
+    cache.put(
+        client.url, study.identifier, fingerprint, study_duration, start_time, model
+    )
+    return study_duration, start_time, model
 
 
 def parse_date_range(arg):
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""Export study_info.db as a columnar dataset for SAR and utilization reports.
+
+Every series is written as one row together with its study's columns, so
+reports need no joins, into Parquet (default) or Arrow IPC files partitioned
+by the month of the study date::
+
+    study_info_export/
+        _manifest.json
+        study_month=202404/part-0.parquet
+        study_month=202405/part-0.parquet
+        ...
+
+The layout is Hive-style, so the whole export reads as one table, e.g. with
+``pyarrow.dataset.dataset("study_info_export", partitioning="hive")`` or
+DuckDB's ``read_parquet('study_info_export/*/*.parquet', hive_partitioning=1)``.
+
+Refreshes are incremental: the manifest keeps a digest of every month's rows
+and only months whose digest changed are rewritten; months that disappeared
+from the database are removed.
+
+Usage examples
+--------------
+    ./export_study_info.py                          # study_info.db -> study_info_export/
+    ./export_study_info.py --db /data/study_info.db --out /data/sar --format arrow
+    ./export_study_info.py --full                   # rewrite every month
+
+Requires ``pyarrow``.
+"""
+
+import argparse
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+from study_info_db import DEFAULT_DB_PATH, get_db_connection
+
+DEFAULT_OUT = "study_info_export"
+MANIFEST = "_manifest.json"
+MANIFEST_VERSION = 1
+
+# Partition of series whose study has no usable date (the Hive convention
+# for NULL, which readers turn back into a null study_month).
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# (column, table alias, type).  Numeric values are exported only when SQLite
+# actually stored a number, so that a stray string cannot break a month.
+COLUMNS = [
+    ("series_uid", "se", "text"),
+    ("accession", "st", "text"),
+    ("study_date", "st", "text"),
+    ("patient_id", "st", "text"),
+    ("age", "st", "integer"),
+    ("height", "st", "real"),
+    ("weight", "st", "real"),
+    ("sex", "st", "text"),
+    ("ethnic_group", "st", "text"),
+    ("body_part", "st", "text"),
+    ("manufacturer_model", "st", "text"),
+    ("study_description", "st", "text"),
+    ("wall_seconds", "st", "integer"),
+    ("series_number", "se", "integer"),
+    ("series_description", "se", "text"),
+    ("pulse_sequence_name", "se", "text"),
+    ("sequence_name", "se", "text"),
+    ("sar", "se", "real"),
+    ("duration", "se", "integer"),  # seconds
+    ("repetition_time", "se", "real"),  # milliseconds
+]
+
+FORMATS = {"parquet": "part-0.parquet", "arrow": "part-0.arrow"}
+
+
+def _select_expr(column, alias, kind):
+    expr = f"{alias}.{column}"
+    if kind == "text":
+        return expr
+    sql_type = kind.upper()
+    return (
+        f"CASE WHEN typeof({expr}) IN ('integer', 'real') "
+        f"THEN CAST({expr} AS {sql_type}) END"
+    )
+
+
+EXPORT_SQL = f"""
+    SELECT CASE WHEN st.study_date GLOB '[0-9][0-9][0-9][0-9][0-9][0-9]*'
+                THEN substr(st.study_date, 1, 6) END AS month,
+           {", ".join(_select_expr(*column) for column in COLUMNS)}
+    FROM series AS se
+    JOIN studies AS st ON st.accession = se.accession
+    ORDER BY month, se.series_uid
+"""
+
+
+def month_rows(conn):
+    """Yield (month, rows) for every study month, rows ordered by series UID.
+
+    *month* is "YYYYMM", or None for studies without a usable date.
+    """
+    rows = conn.execute(EXPORT_SQL)
+    for month, group in itertools.groupby(rows, key=lambda row: row[0]):
+        yield month, [row[1:] for row in group]
+
+
+def rows_digest(rows):
+    """Return a digest identifying the content of *rows*."""
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(repr(row).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def partition_name(month):
+    return f"study_month={month or NULL_PARTITION}"
+
+
+def load_manifest(out_dir, fmt):
+    """Return the months recorded in *out_dir*'s manifest.
+
+    An export in another format or with other columns counts as empty, so
+    that every month is rewritten.
+    """
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if (
+        manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("format") != fmt
+        or manifest.get("columns") != [column for column, _, _ in COLUMNS]
+    ):
+        return {}
+    return manifest.get("months", {})
+
+
+def _write_atomic(path, write):
+    """Call ``write(tmp_path)`` and move the result to *path*."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def save_manifest(out_dir, fmt, months):
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "format": fmt,
+        "columns": [column for column, _, _ in COLUMNS],
+        "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "months": months,
+    }
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    _write_atomic(os.path.join(out_dir, MANIFEST), write)
+
+
+def arrow_table(rows):
+    """Return the pyarrow Table for *rows* as selected by :data:`EXPORT_SQL`."""
+    types = {"text": pa.string(), "integer": pa.int64(), "real": pa.float64()}
+    values = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+    return pa.table(
+        {
+            column: pa.array(vals, type=types[kind])
+            for (column, _, kind), vals in zip(COLUMNS, values)
+        }
+    )
+
+
+def write_partition(out_dir, month, rows, fmt):
+    """Replace the data file of *month* in *out_dir*; return its relative path."""
+    part_dir = os.path.join(out_dir, partition_name(month))
+    os.makedirs(part_dir, exist_ok=True)
+    table = arrow_table(rows)
+
+    def write(tmp):
+        if fmt == "parquet":
+            pyarrow.parquet.write_table(table, tmp, compression="zstd")
+        else:
+            pyarrow.feather.write_feather(table, tmp, compression="zstd")
+
+    path = os.path.join(part_dir, FORMATS[fmt])
+    _write_atomic(path, write)
+    # a previous export in the other format would otherwise be read twice
+    for other in FORMATS.values():
+        if other != FORMATS[fmt] and os.path.exists(os.path.join(part_dir, other)):
+            os.unlink(os.path.join(part_dir, other))
+    return os.path.relpath(path, out_dir)
+
+
+def export(conn, out_dir, fmt="parquet", full=False, verbose=True):
+    """Bring the export in *out_dir* up to date with *conn*.
+
+    Returns ``(written, unchanged, removed)`` month counts.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    previous = {} if full else load_manifest(out_dir, fmt)
+
+    months = {}
+    written = unchanged = 0
+    for month, rows in month_rows(conn):
+        key = month or NULL_PARTITION
+        digest = rows_digest(rows)
+        entry = previous.get(key)
+        if (
+            entry
+            and entry.get("digest") == digest
+            and os.path.exists(os.path.join(out_dir, entry["file"]))
+        ):
+            months[key] = entry
+            unchanged += 1
+            continue
+        path = write_partition(out_dir, month, rows, fmt)
+        months[key] = {"digest": digest, "rows": len(rows), "file": path}
+        written += 1
+        if verbose:
+            print(f"{key}: {len(rows)} series -> {path}")
+
+    removed = 0
+    for name in os.listdir(out_dir):
+        if name.startswith("study_month=") and name[12:] not in months:
+            shutil.rmtree(os.path.join(out_dir, name))
+            removed += 1
+            if verbose:
+                print(f"{name[12:]}: removed")
+
+    save_manifest(out_dir, fmt, months)
+    return written, unchanged, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Export study_info.db as month-partitioned Parquet/Arrow files, "
+            "rewriting only the months that changed."
+        )
+    )
+    parser.add_argument(
+        "--db",
+        metavar="PATH",
+        default=DEFAULT_DB_PATH,
+        help=f"SQLite database file (default: {DEFAULT_DB_PATH})",
+    )
+    parser.add_argument(
+        "--out",
+        metavar="DIR",
+        default=DEFAULT_OUT,
+        help=f"Export directory (default: {DEFAULT_OUT})",
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(FORMATS),
+        default="parquet",
+        help="File format (default: parquet)",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Rewrite every month, changed or not"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Only print the final counts"
+    )
+    args = parser.parse_args()
+
+    if pa is None:
+        parser.error("pyarrow is required (pip install pyarrow)")
+    if not os.path.exists(args.db):
+        parser.error(f"database {args.db} does not exist")
+
+    conn = get_db_connection(args.db)
+    try:
+        written, unchanged, removed = export(
+            conn, args.out, args.format, full=args.full, verbose=not args.quiet
+        )
+    finally:
+        conn.close()
+    print(
+        f"{written} month(s) written, {unchanged} unchanged, {removed} removed",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
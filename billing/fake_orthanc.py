@@ -0,0 +1,715 @@
+#!/usr/bin/env python3
+
+"""Local stand-in for the parts of the Orthanc REST API used by the billing tools.
+
+Serves a synthetic, deterministic corpus of MR studies so that
+``store_study_info.py``, ``duration.py`` and ``duration94.py`` can be run,
+measured and regression-tested without touching micvna or 94tvna.  Point a
+script at it through the ``ORTHANC_URL`` environment variable understood by
+:func:`orthanc_client.connect` (the credentials are looked up in netrc for the
+server's host name, usually 127.0.0.1, but are not checked).
+
+Implemented routes:
+
+    POST /tools/find                      Study/Series/Instance level, Expand,
+                                          Limit/Since, exact, wildcard and
+                                          date-range (A-B, A-, -B) matching
+    POST /tools/bulk-content              Resources at any level, Level
+    GET  /studies/{id}[/statistics]
+    GET  /series/{id}
+    GET  /instances/{id}
+    GET  /instances/{id}/file             small DICOM Part 10 file
+    GET  /instances/{id}/tags             full, ?short or ?simplify
+    GET  /instances/{id}/content/{tag}
+    GET  /changes                         ?since, ?limit, ?last
+
+Every request is counted per route together with the bytes received and sent,
+so a benchmark can report what a tool cost; see ``bench_billing.py``.  Run
+standalone with ``./fake_orthanc.py --port 8042 --days 3`` for manual testing.
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+DEFAULT_START = "20250101"
+DEFAULT_LAST_UPDATE = "20250201T000000"
+
+SCANNER_MODELS = ("MAGNETOM Prisma Fit", "Prisma")
+SERIES_PROTOCOLS = (
+    # (SeriesDescription, SequenceName, PulseSequenceName, RepetitionTime)
+    ("localizer", "*fl2d1", "fl2d1", "8.6"),
+    ("T1w_MPR", "*tfl3d1_16ns", "tfl3d1_16ns", "2400"),
+    ("T2w_SPC", "*spc_314ns", "spc_314ns", "3200"),
+    ("rfMRI_REST_AP", "epfid2d1_104", "epfid2d1_104", "800"),
+    ("dMRI_dir98_AP", "*ep_b1000#1", "ep_b1000", "3230"),
+)
+
+# name -> (tag, VR), for the tags a synthetic instance carries
+TAGS = {
+    "InstanceCreationDate": ("0008,0012", "DA"),
+    "InstanceCreationTime": ("0008,0013", "TM"),
+    "SOPInstanceUID": ("0008,0018", "UI"),
+    "StudyDate": ("0008,0020", "DA"),
+    "StudyTime": ("0008,0030", "TM"),
+    "SeriesTime": ("0008,0031", "TM"),
+    "AccessionNumber": ("0008,0050", "SH"),
+    "Modality": ("0008,0060", "CS"),
+    "Manufacturer": ("0008,0070", "LO"),
+    "StationName": ("0008,1010", "SH"),
+    "StudyDescription": ("0008,1030", "LO"),
+    "SeriesDescription": ("0008,103e", "LO"),
+    "ManufacturerModelName": ("0008,1090", "LO"),
+    "PatientName": ("0010,0010", "PN"),
+    "PatientID": ("0010,0020", "LO"),
+    "PatientSex": ("0010,0040", "CS"),
+    "PatientAge": ("0010,1010", "AS"),
+    "PatientSize": ("0010,1020", "DS"),
+    "PatientWeight": ("0010,1030", "DS"),
+    "EthnicGroup": ("0010,2160", "SH"),
+    "BodyPartExamined": ("0018,0015", "CS"),
+    "SequenceName": ("0018,0024", "SH"),
+    "RepetitionTime": ("0018,0080", "DS"),
+    "SAR": ("0018,1316", "DS"),
+    "PulseSequenceName": ("0018,9005", "SH"),
+    "StudyInstanceUID": ("0020,000d", "UI"),
+    "SeriesInstanceUID": ("0020,000e", "UI"),
+    "StudyID": ("0020,0010", "SH"),
+    "SeriesNumber": ("0020,0011", "IS"),
+    "InstanceNumber": ("0020,0013", "IS"),
+    "SeriesDuration": ("0051,100a", "LO"),  # Siemens private, as text
+}
+
+
+def orthanc_id(*parts):
+    """Return a stable identifier shaped like Orthanc's (5 groups of 8 hex)."""
+    digest = hashlib.sha1("/".join(map(str, parts)).encode()).hexdigest()
+    return "-".join(digest[i : i + 8] for i in range(0, 40, 8))
+
+
+def dicom_uid(*parts):
+    digest = hashlib.sha1("/".join(map(str, parts)).encode()).hexdigest()
+    return "2.25." + str(int(digest[:30], 16))
+
+
+class Corpus:
+    """Synthetic Orthanc content held in memory.
+
+    *days* consecutive days starting at *start* (YYYYMMDD) each hold
+    *studies_per_day* studies of *series_per_study* series with
+    *instances_per_series* instances.  Every fourth study is a QA scan (its
+    accession number does not start with "E"); the others are research scans
+    billed to one of a few StudyIDs.  Instance headers carry the tags read by
+    the billing tools; the first series of each study lacks the scanner model
+    so that fallbacks get exercised too.
+    """
+
+    def __init__(
+        self,
+        start=DEFAULT_START,
+        days=1,
+        studies_per_day=4,
+        series_per_study=5,
+        instances_per_series=20,
+        pixel_bytes=16384,
+    ):
+        self.pixel_bytes = pixel_bytes
+        self.studies = {}
+        self.series = {}
+        self.instances = {}
+        self.changes = []
+        self._file_sizes = {}
+
+        first_day = datetime.datetime.strptime(start, "%Y%m%d").date()
+        for d in range(days):
+            date = (first_day + datetime.timedelta(days=d)).strftime("%Y%m%d")
+            for k in range(studies_per_day):
+                self._add_study(date, k, series_per_study, instances_per_series)
+
+    def _add_study(self, date, k, n_series, n_instances):
+        study_id = orthanc_id("study", date, k)
+        start = datetime.datetime.strptime(date, "%Y%m%d") + datetime.timedelta(
+            hours=7, minutes=75 * k
+        )
+        qa = k % 4 == 3
+        patient_id = f"{'QA' if qa else 'S'}{date}{k:02d}"
+        study_tags = {
+            "StudyDate": date,
+            "StudyTime": start.strftime("%H%M%S"),
+            "AccessionNumber": f"QA{date}{k:02d}" if qa else f"E{date[2:]}{k:03d}",
+            "StudyDescription": (
+                "QA^Phantom" if qa else f"Investigators^Protocol{k % 3}"
+            ),
+            "StudyInstanceUID": dicom_uid("study", date, k),
+            "StudyID": "QA" if qa else f"PROJ_{100 + k % 3}",
+        }
+        patient_tags = {
+            "PatientName": f"{patient_id}^Synthetic",
+            "PatientID": patient_id,
+            "PatientSex": "FO"[k % 2],
+        }
+        study = {
+            "ID": study_id,
+            "IsStable": True,
+            "Labels": [],
+            "LastUpdate": DEFAULT_LAST_UPDATE,
+            "MainDicomTags": study_tags,
+            "ParentPatient": orthanc_id("patient", patient_id),
+            "PatientMainDicomTags": patient_tags,
+            "Series": [],
+            "Type": "Study",
+            # not part of Orthanc's answer; stripped by resource_json()
+            "_private": {
+                "PatientAge": f"{20 + k % 50:03d}Y",
+                "PatientSize": "1.75",
+                "PatientWeight": "70",
+                "EthnicGroup": "",
+                "BodyPartExamined": "BRAIN",
+                "ManufacturerModelName": SCANNER_MODELS[k % len(SCANNER_MODELS)],
+            },
+        }
+        self.studies[study_id] = study
+
+        for j in range(n_series):
+            description, seq, pulse_seq, tr = SERIES_PROTOCOLS[
+                j % len(SERIES_PROTOCOLS)
+            ]
+            series_id = orthanc_id("series", study_id, j)
+            series_start = start + datetime.timedelta(minutes=6 * j)
+            series = {
+                "ExpectedNumberOfInstances": None,
+                "ID": series_id,
+                "Instances": [],
+                "IsStable": True,
+                "Labels": [],
+                "LastUpdate": DEFAULT_LAST_UPDATE,
+                "MainDicomTags": {
+                    "Modality": "MR",
+                    "Manufacturer": "SIEMENS",
+                    "StationName": f"MRC{35000 + k % len(SCANNER_MODELS)}",
+                    "SeriesDescription": description,
+                    "SeriesInstanceUID": dicom_uid("series", study_id, j),
+                    "SeriesNumber": str(j + 1),
+                    "SeriesTime": series_start.strftime("%H%M%S"),
+                },
+                "ParentStudy": study_id,
+                "Status": "Unknown",
+                "Type": "Series",
+                "_private": {
+                    "SequenceName": seq,
+                    "PulseSequenceName": pulse_seq,
+                    "RepetitionTime": tr,
+                    "SAR": f"{0.05 + 0.1 * (j % 7):.3f}",
+                    "SeriesDuration": f"TA {2 + j % 5:02d}:{(7 * j) % 60:02d}",
+                },
+            }
+            study["Series"].append(series_id)
+            self.series[series_id] = series
+
+            for i in range(n_instances):
+                created = series_start + datetime.timedelta(seconds=2 * i)
+                instance_id = orthanc_id("instance", series_id, i)
+                self.instances[instance_id] = {
+                    "FileSize": 0,  # see resource_json()
+                    "FileUuid": orthanc_id("file", instance_id),
+                    "ID": instance_id,
+                    "IndexInSeries": i + 1,
+                    "Labels": [],
+                    "MainDicomTags": {
+                        "InstanceCreationDate": created.strftime("%Y%m%d"),
+                        "InstanceCreationTime": created.strftime("%H%M%S.%f")[:10],
+                        "SOPInstanceUID": dicom_uid("instance", series_id, i),
+                        "InstanceNumber": str(i + 1),
+                    },
+                    "ParentSeries": series_id,
+                    "Type": "Instance",
+                }
+                series["Instances"].append(instance_id)
+
+        self.changes.append(
+            {
+                "ChangeType": "StableStudy",
+                "Date": DEFAULT_LAST_UPDATE,
+                "ID": study_id,
+                "Path": f"/studies/{study_id}",
+                "ResourceType": "Study",
+                "Seq": len(self.changes) + 1,
+            }
+        )
+
+    # -- views -------------------------------------------------------------
+
+    def instance_values(self, instance_id):
+        """Return {tag name: value} for every tag of *instance_id*."""
+        instance = self.instances[instance_id]
+        series = self.series[instance["ParentSeries"]]
+        study = self.studies[series["ParentStudy"]]
+
+        values = {}
+        values.update(study["MainDicomTags"])
+        values.update(study["PatientMainDicomTags"])
+        values.update(study["_private"])
+        values.update(series["MainDicomTags"])
+        values.update(series["_private"])
+        values.update(instance["MainDicomTags"])
+        if series["MainDicomTags"]["SeriesNumber"] == "1":
+            # localizers of this corpus lack the model, as real ones sometimes do
+            del values["ManufacturerModelName"]
+        return values
+
+    def resource_json(self, resource):
+        out = {key: value for key, value in resource.items() if key != "_private"}
+        if out["Type"] == "Instance":
+            out["FileSize"] = self.file_size(out["ID"])
+        return out
+
+    def file_size(self, instance_id):
+        size = self._file_sizes.get(instance_id)
+        if size is None:
+            size = self._file_sizes[instance_id] = len(self.dicom_file(instance_id))
+        return size
+
+    def tags_json(self, instance_id, mode="full"):
+        """Return /instances/{id}/tags in Orthanc's full, short or simplify form."""
+        out = {}
+        for name, value in sorted(
+            self.instance_values(instance_id).items(), key=lambda item: TAGS[item[0]]
+        ):
+            tag, vr = TAGS[name]
+            if mode == "short":
+                out[tag] = value
+            elif mode == "simplify":
+                out[name] = value
+            else:
+                out[tag] = {"Name": name, "Type": "String", "Value": value}
+        return out
+
+    def dicom_file(self, instance_id):
+        """Return a small explicit VR little endian DICOM file for *instance_id*."""
+        values = self.instance_values(instance_id)
+        elements = []
+        for name, value in values.items():
+            tag, vr = TAGS[name]
+            raw = value.encode("ascii")
+            if len(raw) % 2:
+                raw += b"\0" if vr == "UI" else b" "
+            group, element = (int(part, 16) for part in tag.split(","))
+            elements.append(
+                (
+                    group,
+                    element,
+                    struct.pack("<HH2sH", group, element, vr.encode(), len(raw)) + raw,
+                )
+            )
+        pixels = struct.pack("<HH2sHI", 0x7FE0, 0x0010, b"OW", 0, self.pixel_bytes)
+        pixels += bytes(self.pixel_bytes)
+
+        transfer_syntax = b"1.2.840.10008.1.2.1\0"
+        meta = (
+            struct.pack("<HH2sH", 2, 0x0010, b"UI", len(transfer_syntax))
+            + transfer_syntax
+        )
+        meta_length = struct.pack("<HH2sHI", 2, 0, b"UL", 4, len(meta))
+        body = b"".join(data for _, _, data in sorted(elements))
+        return bytes(128) + b"DICM" + meta_length + meta + body + pixels
+
+    # -- queries -----------------------------------------------------------
+
+    def _level_resources(self, level):
+        return {
+            "Study": self.studies,
+            "Series": self.series,
+            "Instance": self.instances,
+        }[level]
+
+    def _lineage_values(self, resource):
+        """MainDicomTags of *resource* and all of its parents."""
+        values = dict(resource["MainDicomTags"])
+        while "ParentStudy" in resource or "ParentSeries" in resource:
+            if "ParentSeries" in resource:
+                resource = self.series[resource["ParentSeries"]]
+            else:
+                resource = self.studies[resource["ParentStudy"]]
+            values.update(resource["MainDicomTags"])
+        values.update(resource.get("PatientMainDicomTags", {}))
+        return values
+
+    def find(self, request):
+        """Answer a /tools/find *request* body."""
+        level = request.get("Level", "Study")
+        query = request.get("Query", {})
+        since = int(request.get("Since") or 0)
+        limit = int(request.get("Limit") or 0)
+
+        matches = [
+            resource
+            for resource in self._level_resources(level).values()
+            if all(
+                matches_constraint(
+                    name, self._lineage_values(resource).get(name, ""), constraint
+                )
+                for name, constraint in query.items()
+            )
+        ]
+        matches = matches[since : since + limit if limit else None]
+        if request.get("Expand"):
+            return [self.resource_json(resource) for resource in matches]
+        return [resource["ID"] for resource in matches]
+
+    def resource(self, resource_id):
+        for resources in (self.studies, self.series, self.instances):
+            if resource_id in resources:
+                return resources[resource_id]
+        raise KeyError(resource_id)
+
+    def type_of(self, resource_id):
+        return self.resource(resource_id)["Type"]
+
+    def children(self, resource_id, level):
+        """Return the resources at *level* below (or equal to) *resource_id*."""
+        resource = self.resource(resource_id)
+
+        if resource["Type"] == level:
+            return [resource]
+        if resource["Type"] == "Study":
+            nested = [self.series[i] for i in resource["Series"]]
+        elif resource["Type"] == "Series":
+            nested = [self.instances[i] for i in resource["Instances"]]
+        else:
+            return []
+        return [child for r in nested for child in self.children(r["ID"], level)]
+
+    def bulk_content(self, request):
+        level = request.get("Level")
+        out = []
+        for resource_id in request.get("Resources", []):
+            # without Level each resource is returned as it is
+            out.extend(self.children(resource_id, level or self.type_of(resource_id)))
+        return [self.resource_json(resource) for resource in out]
+
+    def statistics(self, study_id):
+        study = self.studies[study_id]
+        instances = [i for s in study["Series"] for i in self.series[s]["Instances"]]
+        size = sum(self.file_size(i) for i in instances)
+        return {
+            "CountInstances": len(instances),
+            "CountSeries": len(study["Series"]),
+            "DiskSize": str(size),
+            "DiskSizeMB": size // 2**20,
+            "UncompressedSize": str(size),
+            "UncompressedSizeMB": size // 2**20,
+        }
+
+    def changes_json(self, since=0, limit=100, last=False):
+        if last:
+            return {
+                "Changes": self.changes[-1:],
+                "Done": True,
+                "Last": len(self.changes),
+            }
+        batch = [c for c in self.changes if c["Seq"] > since][:limit]
+        last_seq = batch[-1]["Seq"] if batch else max(since, len(self.changes))
+        return {
+            "Changes": batch,
+            "Done": last_seq >= len(self.changes),
+            "Last": last_seq,
+        }
+
+
+def matches_constraint(name, value, constraint):
+    """Orthanc-style matching of one /tools/find constraint."""
+    if name.endswith("Date") and "-" in constraint:
+        low, high = constraint.split("-", 1)
+        return (not low or value >= low) and (not high or value <= high)
+    if "*" in constraint or "?" in constraint:
+        pattern = "".join(
+            ".*" if c == "*" else "." if c == "?" else re.escape(c) for c in constraint
+        )
+        return re.fullmatch(pattern, value) is not None
+    return constraint == "" or value == constraint
+
+
+class Stats:
+    """Thread-safe per-route counters of requests and bytes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}
+            self.connections = 0
+
+    def connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def record(self, route, bytes_in, bytes_out):
+        with self._lock:
+            entry = self.routes.setdefault(
+                route, {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+            )
+            entry["requests"] += 1
+            entry["bytes_in"] += bytes_in
+            entry["bytes_out"] += bytes_out
+
+    def snapshot(self):
+        """Return totals and a copy of the per-route counters."""
+        with self._lock:
+            routes = {route: dict(entry) for route, entry in self.routes.items()}
+            connections = self.connections
+        return {
+            "requests": sum(e["requests"] for e in routes.values()),
+            "bytes_in": sum(e["bytes_in"] for e in routes.values()),
+            "bytes_out": sum(e["bytes_out"] for e in routes.values()),
+            "connections": connections,
+            "routes": routes,
+        }
+
+
+class NotFound(Exception):
+    pass
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as Orthanc does
+    disable_nagle_algorithm = True  # headers and body are written separately
+    server_version = "FakeOrthanc"
+
+    def setup(self):
+        super().setup()
+        self.server.stats.connection()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._dispatch("GET", b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._dispatch("POST", self.rfile.read(length))
+
+    def _dispatch(self, method, body):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        url = urlsplit(self.path)
+        params = {
+            key: values[-1]
+            for key, values in parse_qs(url.query, keep_blank_values=True).items()
+        }
+        route = method + " " + re.sub(r"[0-9a-f]{8}(-[0-9a-f]{8}){4}", "{id}", url.path)
+        if route.startswith("GET /instances/{id}/content/"):
+            route = "GET /instances/{id}/content/{tag}"
+
+        try:
+            status, content_type, payload = self._route(method, url.path, params, body)
+        except (NotFound, KeyError):
+            status, content_type, payload = 404, "application/json", {"HttpStatus": 404}
+        except (ValueError, TypeError) as e:
+            status, content_type, payload = 400, "application/json", {"Message": str(e)}
+
+        if content_type == "application/json":
+            payload = json.dumps(payload, indent=3).encode()
+        self.server.stats.record(route, len(body), len(payload))
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self, method, path, params, body):
+        corpus = self.server.corpus
+        parts = path.strip("/").split("/")
+        json_ok = lambda payload: (200, "application/json", payload)  # noqa: E731
+
+        if method == "POST":
+            request = json.loads(body or b"{}")
+            if path == "/tools/find":
+                return json_ok(corpus.find(request))
+            if path == "/tools/bulk-content":
+                return json_ok(corpus.bulk_content(request))
+            raise NotFound(path)
+
+        if parts == ["changes"]:
+            return json_ok(
+                corpus.changes_json(
+                    since=int(params.get("since", 0)),
+                    limit=int(params.get("limit", 100)),
+                    last="last" in params,
+                )
+            )
+        if len(parts) < 2:
+            raise NotFound(path)
+
+        kind, resource_id, rest = parts[0], parts[1], parts[2:]
+        if kind == "studies":
+            if rest == []:
+                return json_ok(corpus.resource_json(corpus.studies[resource_id]))
+            if rest == ["statistics"]:
+                return json_ok(corpus.statistics(resource_id))
+            if rest == ["series"]:
+                return json_ok(
+                    [
+                        corpus.resource_json(s)
+                        for s in corpus.children(resource_id, "Series")
+                    ]
+                )
+        elif kind == "series" and rest == []:
+            return json_ok(corpus.resource_json(corpus.series[resource_id]))
+        elif kind == "instances":
+            if rest == []:
+                return json_ok(corpus.resource_json(corpus.instances[resource_id]))
+            if rest == ["file"]:
+                return 200, "application/dicom", corpus.dicom_file(resource_id)
+            if rest == ["tags"]:
+                mode = (
+                    "short"
+                    if "short" in params
+                    else "simplify" if "simplify" in params else "full"
+                )
+                return json_ok(corpus.tags_json(resource_id, mode))
+            if len(rest) == 2 and rest[0] == "content":
+                tag = rest[1].replace("-", ",").lower()
+                values = corpus.instance_values(resource_id)
+                for name, value in values.items():
+                    if tag in (TAGS[name][0], name.lower()):
+                        return 200, "application/octet-stream", value.encode()
+                raise NotFound(path)
+        raise NotFound(path)
+
+
+class FakeOrthanc(ThreadingHTTPServer):
+    """HTTP server answering like Orthanc from a :class:`Corpus`.
+
+    Use as a context manager to serve from a background thread::
+
+        with FakeOrthanc(Corpus(days=2)) as server:
+            os.environ["ORTHANC_URL"] = server.url
+            ...
+            print(server.stats.snapshot())
+    """
+
+    daemon_threads = True
+
+    def __init__(self, corpus, host="127.0.0.1", port=0, latency=0.0, verbose=False):
+        super().__init__((host, port), Handler)
+        self.corpus = corpus
+        self.latency = latency
+        self.verbose = verbose
+        self.stats = Stats()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
+
+
+def add_corpus_arguments(parser):
+    """Add the options that size the synthetic corpus to *parser*."""
+    parser.add_argument(
+        "--start",
+        default=DEFAULT_START,
+        metavar="YYYYMMDD",
+        help=f"First study date (default: {DEFAULT_START})",
+    )
+    parser.add_argument(
+        "--days", type=int, default=1, help="Number of days (default: 1)"
+    )
+    parser.add_argument(
+        "--studies-per-day",
+        type=int,
+        default=4,
+        metavar="N",
+        help="Studies per day (default: 4)",
+    )
+    parser.add_argument(
+        "--series-per-study",
+        type=int,
+        default=5,
+        metavar="N",
+        help="Series per study (default: 5)",
+    )
+    parser.add_argument(
+        "--instances-per-series",
+        type=int,
+        default=20,
+        metavar="N",
+        help="Instances per series (default: 20)",
+    )
+    parser.add_argument(
+        "--pixel-bytes",
+        type=int,
+        default=16384,
+        metavar="N",
+        help="Size of each instance's pixel data (default: 16384)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Delay added to every request (default: 0)",
+    )
+
+
+def corpus_from_args(args):
+    return Corpus(
+        start=args.start,
+        days=args.days,
+        studies_per_day=args.studies_per_day,
+        series_per_study=args.series_per_study,
+        instances_per_series=args.instances_per_series,
+        pixel_bytes=args.pixel_bytes,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Orthanc corpus.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8042)
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Log every request"
+    )
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOrthanc(
+        corpus_from_args(args), args.host, args.port, args.latency, args.verbose
+    )
+    print(
+        f"Serving {len(server.corpus.studies)} studies, "
+        f"{len(server.corpus.instances)} instances on {server.url}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats.snapshot(), indent=2))
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
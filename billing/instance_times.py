@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Fast extraction of the first and last instance creation time of a study.
+
+``duration_utils.duration`` needs only the minimum and maximum of
+InstanceCreationDate + InstanceCreationTime over every instance of a study.
+Calling ``datetime.strptime`` (twice, for the two accepted formats) on each of
+tens of thousands of instances dominated its CPU time.  Here every timestamp
+is turned into a single integer with fixed-width slicing (YYYYMMDDHHMMSS
+followed by six digits of microseconds), a running min/max is kept over those
+integers in one pass and only the two extremes are turned into datetimes.
+
+Accepted values are the same as with the previous strptime formats
+"%Y%m%d%H%M%S.%f" and "%Y%m%d%H%M%S": HHMMSS with an optional fraction of one
+to six digits.  Anything else is ignored.
+"""
+
+import datetime
+
+DAYS_IN_MONTH = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def instance_creation_pairs(items):
+    """Yield (InstanceCreationDate, InstanceCreationTime) from bulk-content *items*."""
+    for item in items:
+        tags = item.get("MainDicomTags")
+        if tags is None:
+            continue
+        date = tags.get("InstanceCreationDate")
+        time = tags.get("InstanceCreationTime")
+        if date is not None and time is not None:
+            yield date, time
+
+
+def timestamp_key(date, time):
+    """Return YYYYMMDDHHMMSSffffff as an int, or None if malformed."""
+    if len(date) != 8 or len(time) < 6:
+        return None
+    if len(time) == 6:
+        fraction = "000000"
+    elif time[6] == "." and 8 <= len(time) <= 13:
+        fraction = time[7:].ljust(6, "0")
+    else:
+        return None
+
+    digits = date + time[:6] + fraction
+    # also rejects signs, blanks and non-ASCII digits that int() would accept
+    if not (digits.isascii() and digits.isdigit()):
+        return None
+
+    year = int(date[0:4])
+    month = int(date[4:6])
+    day = int(date[6:8])
+    if year < 1 or not 1 <= month <= 12 or not 1 <= day <= DAYS_IN_MONTH[month]:
+        return None
+    if month == 2 and day == 29 and not (
+        year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    ):
+        return None
+    if int(time[0:2]) > 23 or int(time[2:4]) > 59 or int(time[4:6]) > 59:
+        return None
+    return int(digits)
+
+
+def key_to_datetime(key):
+    """Inverse of :func:`timestamp_key`."""
+    s = f"{key:020d}"
+    return datetime.datetime(
+        int(s[0:4]),
+        int(s[4:6]),
+        int(s[6:8]),
+        int(s[8:10]),
+        int(s[10:12]),
+        int(s[12:14]),
+        int(s[14:20]),
+    )
+
+
+def time_bounds(pairs):
+    """Return (earliest, latest) datetime over (date, time) *pairs*.
+
+    Returns (None, None) if no pair holds a valid timestamp.  *pairs* may be
+    any iterable, including a generator over a streamed response; memory use
+    does not depend on its length.
+    """
+    lo = hi = None
+    for date, time in pairs:
+        key = timestamp_key(date, time)
+        if key is None:
+            continue
+        if lo is None:
+            lo = hi = key
+        elif key < lo:
+            lo = key
+        elif key > hi:
+            hi = key
+
+    if lo is None:
+        return None, None
+    return key_to_datetime(lo), key_to_datetime(hi)
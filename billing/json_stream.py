@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+"""Incremental decoding of a top-level JSON array.
+
+``/tools/bulk-content`` answers with one JSON array holding an object per
+instance; for a 20k-instance study calling ``.json()`` on it builds every
+object at once.  :func:`iter_json_array` instead decodes the array element by
+element from the raw byte chunks of a streamed response, so only the current
+element (and one network chunk) is held in memory at a time.
+"""
+
+import codecs
+import json
+import re
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_array(chunks):
+    """Yield the elements of the JSON array delivered as byte *chunks*.
+
+    Raises ValueError if the input is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    expect = "["  # "[", "first" (value or "]"), "value", or "," (or "]")
+    final = False
+    chunks = iter(chunks)
+
+    while True:
+        try:
+            buf += utf8.decode(next(chunks))
+        except StopIteration:
+            buf += utf8.decode(b"", final=True)
+            final = True
+
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+
+            if expect == "[":
+                if buf[pos] != "[":
+                    raise ValueError(f"expected '[' but found {buf[pos]!r}")
+                pos += 1
+                expect = "first"
+            elif expect in ("first", ",") and buf[pos] == "]":
+                return
+            elif expect == ",":
+                if buf[pos] != ",":
+                    raise ValueError(f"expected ',' or ']' but found {buf[pos]!r}")
+                pos += 1
+                expect = "value"
+            else:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # element not complete yet
+                if end == len(buf) and not final:
+                    break  # a number such as 12 might continue as 123
+                yield value
+                pos = end
+                expect = ","
+
+        buf = buf[pos:]
+        if final:
+            raise ValueError("unexpected end of JSON array")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""Shared Orthanc client for the billing scripts.
+
+Every script talks to Orthanc through :func:`connect`, which returns a
+:class:`PooledOrthanc` – a regular :class:`pyorthanc.Orthanc` whose underlying
+httpx client keeps a bounded pool of keep-alive connections, applies timeouts
+and retries transient failures with exponential backoff.  The pool size also
+caps the number of concurrent requests a script can have in flight, whatever
+its thread count.  Every request is recorded in
+:data:`request_metrics.METRICS`.
+
+Defaults can be overridden through the environment:
+
+    ORTHANC_URL         use this server instead of the script's own, e.g. a
+                        local fake_orthanc.py (credentials are looked up for
+                        its host name)
+    ORTHANC_POOL_SIZE   maximum number of connections (default 16)
+    ORTHANC_TIMEOUT     connect/read/write timeout in seconds (default 60)
+    ORTHANC_RETRIES     retries after the first attempt (default 5)
+"""
+
+import logging
+import netrc
+import os
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import pyorthanc
+
+import request_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = int(os.environ.get("ORTHANC_POOL_SIZE", 16))
+DEFAULT_TIMEOUT = float(os.environ.get("ORTHANC_TIMEOUT", 60))
+DEFAULT_RETRIES = int(os.environ.get("ORTHANC_RETRIES", 5))
+DEFAULT_BACKOFF = 0.5  # seconds; doubled after every failed attempt
+
+# Responses worth retrying: the server or a proxy in front of it is busy.
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+FIND_PAGE_SIZE = 1000  # resources per /tools/find page
+
+
+class PooledOrthanc(pyorthanc.Orthanc):
+    """pyorthanc client with a bounded connection pool and retrying ``send``.
+
+    Other keyword arguments, such as ``transport``, go to ``httpx.Client``.
+    """
+
+    def __init__(
+        self,
+        url,
+        username=None,
+        password=None,
+        *,
+        pool_size=DEFAULT_POOL_SIZE,
+        timeout=DEFAULT_TIMEOUT,
+        retries=DEFAULT_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        **client_kwargs,
+    ):
+        super().__init__(
+            url,
+            username=username,
+            password=password,
+            # pool=None: wait for a free connection instead of failing, so the
+            # pool size acts as the concurrency limit.
+            timeout=httpx.Timeout(timeout, pool=None),
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            **client_kwargs,
+        )
+        self.retries = retries
+        self.backoff = backoff
+
+    def send(self, request, **kwargs):
+        """Send *request*, retrying transport errors and busy responses."""
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = self._metered_send(request, **kwargs)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise
+                reason = repr(e)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    return response
+                response.close()
+                reason = f"HTTP {response.status_code}"
+
+            delay = self.backoff * 2**attempt
+            logger.warning(
+                f"{request.method} {request.url.path} failed ({reason}), "
+                f"retrying in {delay:g}s"
+            )
+            time.sleep(delay)
+
+    def _metered_send(self, request, **kwargs):
+        """Send *request* once and record it in :data:`request_metrics.METRICS`.
+
+        Streamed responses are recorded when their body has been consumed or
+        closed, so the time and bytes of the download are included.
+        """
+        operation = request_metrics.operation_name(request.method, request.url)
+        bytes_out = len(request.content)
+        started = time.perf_counter()
+
+        def record(response=None):
+            request_metrics.METRICS.observe(
+                request.url.host,
+                operation,
+                time.perf_counter() - started,
+                bytes_in=0 if response is None else response.num_bytes_downloaded,
+                bytes_out=bytes_out,
+                error=response is None or response.status_code >= 400,
+            )
+
+        try:
+            response = super().send(request, **kwargs)
+        except httpx.TransportError:
+            record()
+            raise
+
+        if kwargs.get("stream"):
+            response.stream = _MeteredStream(response.stream, lambda: record(response))
+        else:
+            record(response)
+        return response
+
+
+class _MeteredStream(httpx.SyncByteStream):
+    """Response body stream that calls *on_close* once when it is closed."""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close, on_close = None, self._on_close
+                on_close()
+
+
+def find_expanded(client, query, level="Study", page_size=FIND_PAGE_SIZE):
+    """Return the expanded records of every *level* resource matching *query*.
+
+    Pages through ``/tools/find`` with Limit/Since; a page shorter than
+    *page_size* is taken as the last one, so a month that fits in one page
+    costs a single request.
+    """
+    records = []
+    while True:
+        page = client.post_tools_find(
+            {
+                "Level": level,
+                "Query": query,
+                "Expand": True,
+                "Limit": page_size,
+                "Since": len(records),
+            }
+        )
+        records.extend(page)
+        if len(page) < page_size:
+            return records
+
+
+def date_range_query(dates):
+    """Return a StudyDate constraint covering the YYYYMMDD strings *dates*."""
+    first, last = min(dates), max(dates)
+    return first if first == last else f"{first}-{last}"
+
+
+def netrc_credentials(host):
+    """Return (username, password) for *host* from ~/.netrc, else ./netrc."""
+    try:
+        netrc_file = os.path.expanduser("~/.netrc")
+        username, _, password = netrc.netrc(netrc_file).authenticators(host)
+    except (FileNotFoundError, TypeError):
+        username, _, password = netrc.netrc("netrc").authenticators(host)
+    return username, password
+
+
+def connect(host, port=8042, **kwargs):
+    """Return a :class:`PooledOrthanc` for *host* using netrc credentials.
+
+    Keyword arguments (``pool_size``, ``timeout``, ``retries``, ``backoff``)
+    are passed on to :class:`PooledOrthanc`.
+    """
+    url = os.environ.get("ORTHANC_URL")
+    if url:
+        host = urlsplit(url).hostname
+    else:
+        url = f"http://{host}:{port}"
+
+    username, password = netrc_credentials(host)
+    return PooledOrthanc(url, username=username, password=password, **kwargs)
@@ -0,0 +1 @@
+../request-metrics/request_metrics.py
\ No newline at end of file
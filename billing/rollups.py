@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+"""Daily utilization rollups of study_info.db.
+
+The *rollup_daily* table (see ``study_info_db.py``) holds, per study day,
+scanner (Manufacturer's Model Name) and protocol (Study Description):
+
+* the number of studies and their summed wall-clock time,
+* the number of stored series and their summed duration (0051,100a),
+* a :class:`SarSketch` of the series' SAR values.
+
+``store_study_info.StudyInfoWriter`` recomputes the days it touches in the
+same transaction as its inserts, so the table is always consistent with the
+*studies* and *series* tables, and a report over a date range reads one row
+per day and key instead of every series.  SAR sketches merge, so percentiles
+over any range and grouping come from the daily rows alone.
+
+Usage examples
+--------------
+    ./rollups.py 202404                      # per scanner, April 2024
+    ./rollups.py 20240401 20240630 --by month,scanner,protocol
+    ./rollups.py --rebuild                   # backfill an existing database
+"""
+
+import argparse
+import json
+import math
+import sys
+
+from study_info_db import DEFAULT_DB_PATH, get_db_connection
+
+GROUPINGS = ("day", "month", "scanner", "protocol")
+
+
+class SarSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch).
+
+    Values fall into logarithmic buckets ``(gamma**(i-1), gamma**i]``; any
+    quantile is then known to within :attr:`RELATIVE_ACCURACY` of the true
+    value, and two sketches merge by adding their bucket counts.
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+
+    def __init__(self, bins=None, zeros=0):
+        self.bins = dict(bins or {})
+        self.zeros = zeros  # values <= 0
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zeros += count
+            return
+        i = math.ceil(math.log(value, self.GAMMA))
+        self.bins[i] = self.bins.get(i, 0) + count
+
+    def merge(self, other):
+        self.zeros += other.zeros
+        for i, n in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + n
+        return self
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.bins.values())
+
+    def quantile(self, q):
+        """Return the estimated *q* quantile (0 <= q <= 1), or None if empty."""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        cumulative = self.zeros
+        if cumulative > rank:
+            return 0.0
+        for i in sorted(self.bins):
+            cumulative += self.bins[i]
+            if cumulative > rank:
+                return 2 * self.GAMMA**i / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.bins) / (self.GAMMA + 1)
+
+    def to_json(self):
+        return json.dumps(
+            {"zeros": self.zeros, "bins": {str(i): n for i, n in self.bins.items()}},
+            separators=(",", ":"),
+            sort_keys=True,
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls({int(i): n for i, n in data["bins"].items()}, data["zeros"])
+
+
+# ---------------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------------
+
+
+def days_of_accessions(conn, accessions):
+    """Return the set of study dates stored for *accessions*."""
+    accessions = list(dict.fromkeys(accessions))
+    days = set()
+    for i in range(0, len(accessions), 500):
+        chunk = accessions[i : i + 500]
+        marks = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT DISTINCT study_date FROM studies WHERE accession IN ({marks})",
+            chunk,
+        )
+        days.update(row[0] for row in rows if row[0])
+    return days
+
+
+def refresh_days(conn, days):
+    """Recompute the rollup rows of *days* from the studies and series tables.
+
+    Runs in the caller's transaction.
+    """
+    for day in sorted(days):
+        rows = {}
+
+        def entry(scanner, protocol):
+            key = (scanner, protocol)
+            if key not in rows:
+                rows[key] = [0, 0, 0, 0, SarSketch()]
+            return rows[key]
+
+        for scanner, protocol, studies, seconds in conn.execute(
+            """
+            SELECT IFNULL(manufacturer_model, ''), IFNULL(study_description, ''),
+                   count(*), IFNULL(sum(wall_seconds), 0)
+            FROM studies WHERE study_date = ?
+            GROUP BY 1, 2
+            """,
+            (day,),
+        ):
+            row = entry(scanner, protocol)
+            row[0], row[1] = studies, seconds
+
+        for scanner, protocol, duration, sar in conn.execute(
+            """
+            SELECT IFNULL(st.manufacturer_model, ''), IFNULL(st.study_description, ''),
+                   se.duration, se.sar
+            FROM series AS se JOIN studies AS st ON st.accession = se.accession
+            WHERE st.study_date = ?
+            """,
+            (day,),
+        ):
+            row = entry(scanner, protocol)
+            row[2] += 1
+            row[3] += duration or 0
+            if isinstance(sar, (int, float)):
+                row[4].add(sar)
+
+        conn.execute("DELETE FROM rollup_daily WHERE day = ?", (day,))
+        conn.executemany(
+            "INSERT INTO rollup_daily VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (day, scanner, protocol, *values[:4], values[4].to_json())
+                for (scanner, protocol), values in rows.items()
+            ],
+        )
+
+
+def rebuild(conn):
+    """Recompute every day; returns the number of days."""
+    days = {
+        row[0]
+        for row in conn.execute("SELECT DISTINCT study_date FROM studies")
+        if row[0]
+    }
+    with conn:
+        conn.execute("DELETE FROM rollup_daily")
+        refresh_days(conn, days)
+    return len(days)
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+
+def query(conn, first_day, last_day, by=("scanner",)):
+    """Return merged rollups for days *first_day*..*last_day* (YYYYMMDD).
+
+    Rows are grouped by the fields in *by* (see :data:`GROUPINGS`) and carry
+    ``studies``, ``study_seconds``, ``series``, ``series_seconds`` and a
+    merged ``sar`` :class:`SarSketch`.
+    """
+    unknown = set(by) - set(GROUPINGS)
+    if unknown:
+        raise ValueError(f"cannot group by {', '.join(sorted(unknown))}")
+
+    groups = {}
+    rows = conn.execute(
+        """
+        SELECT day, scanner, protocol, studies, study_seconds, series,
+               series_seconds, sar_sketch
+        FROM rollup_daily WHERE day BETWEEN ? AND ?
+        """,
+        (first_day, last_day),
+    )
+    for day, scanner, protocol, studies, study_s, series, series_s, sketch in rows:
+        fields = {
+            "day": day,
+            "month": day[:6],
+            "scanner": scanner,
+            "protocol": protocol,
+        }
+        key = tuple(fields[name] for name in by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = dict(
+                zip(by, key),
+                studies=0,
+                study_seconds=0,
+                series=0,
+                series_seconds=0,
+                sar=SarSketch(),
+            )
+        group["studies"] += studies
+        group["study_seconds"] += study_s
+        group["series"] += series
+        group["series_seconds"] += series_s
+        group["sar"].merge(SarSketch.from_json(sketch))
+    return [groups[key] for key in sorted(groups)]
+
+
+def date_range(first, last=None):
+    """Return (first day, last day) for YYYYMM / YYYYMMDD tokens."""
+    last = last or first
+    for token in (first, last):
+        if not (token.isdigit() and len(token) in (6, 8)):
+            raise ValueError(f"expected YYYYMM or YYYYMMDD, got {token!r}")
+    # "31" is past the end of every month, which is all BETWEEN needs
+    return (
+        first if len(first) == 8 else first + "01",
+        last if len(last) == 8 else last + "31",
+    )
+
+
+def print_report(groups, by):
+    def fmt(value):
+        return "-" if value is None else f"{value:.3f}"
+
+    header = [*by, "studies", "study h", "series", "scan h", "SAR p50", "SAR p95"]
+    lines = [header]
+    for group in groups:
+        lines.append(
+            [group[name] or "?" for name in by]
+            + [
+                str(group["studies"]),
+                f"{group['study_seconds'] / 3600:.2f}",
+                str(group["series"]),
+                f"{group['series_seconds'] / 3600:.2f}",
+                fmt(group["sar"].quantile(0.5)),
+                fmt(group["sar"].quantile(0.95)),
+            ]
+        )
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    for line in lines:
+        cells = [
+            cell.ljust(width) if i < len(by) else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(line, widths))
+        ]
+        print("  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report utilization from the daily rollups of study_info.db."
+    )
+    parser.add_argument("first", nargs="?", help="First day (YYYYMMDD) or month")
+    parser.add_argument("last", nargs="?", help="Last day or month (default: first)")
+    parser.add_argument(
+        "--by",
+        default="scanner",
+        help=f"Comma-separated grouping, from {', '.join(GROUPINGS)} "
+        "(default: scanner)",
+    )
+    parser.add_argument(
+        "--db",
+        metavar="PATH",
+        default=DEFAULT_DB_PATH,
+        help=f"SQLite database file (default: {DEFAULT_DB_PATH})",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Recompute all rollups from the studies and series tables first",
+    )
+    args = parser.parse_args()
+
+    by = tuple(name.strip() for name in args.by.split(",") if name.strip())
+    if set(by) - set(GROUPINGS):
+        parser.error(f"--by takes {', '.join(GROUPINGS)}")
+    if not (args.first or args.rebuild):
+        parser.error("give a date range, --rebuild, or both")
+
+    conn = get_db_connection(args.db)
+    if args.rebuild:
+        print(f"Rebuilt rollups for {rebuild(conn)} day(s)", file=sys.stderr)
+    if args.first:
+        try:
+            first_day, last_day = date_range(args.first, args.last)
+        except ValueError as exc:
+            parser.error(str(exc))
+        print_report(query(conn, first_day, last_day, by), by)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""Resolve a study's Manufacturer's Model Name (0008,1090) cheaply.
+
+Not every instance carries the scanner model; localizers in particular often
+lack it.  Scanning instance after instance with one
+``/instances/{id}/content/0008-1090`` request each could cost thousands of
+requests for a single study.  :class:`ScannerModelResolver` instead looks, in
+order, at
+
+1. instance headers the caller has already downloaded,
+2. the series-level MainDicomTags (present when Orthanc is configured to
+   index ManufacturerModelName),
+3. models already resolved during this run for the same scanner, identified
+   by StationName or DeviceSerialNumber,
+4. one sampled instance per series, fetched concurrently,
+
+so the worst case is one request per series and the usual case none.
+"""
+
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+MANUFACTURER_MODEL_TAG = "0008,1090"
+STATION_NAME_TAG = "0008,1010"
+DEVICE_SERIAL_NUMBER_TAG = "0018,1000"
+
+DEFAULT_WORKERS = 8
+
+
+def header_value(ds, tag):
+    """Return the non-empty string value of *tag* ("GGGG,EEEE") in *ds*, or None.
+
+    *ds* is anything with a pydicom-like ``get`` returning an element with a
+    ``value``, such as a :class:`pydicom.Dataset` or
+    ``store_study_info.TagDataset``.
+    """
+    elem = ds.get(tag)
+    if elem is None:
+        elem = ds.get((int(tag[0:4], 16), int(tag[5:9], 16)))
+    if elem is None or elem.value in ("", None):
+        return None
+    return str(elem.value).strip()
+
+
+def _first(values):
+    """Return the first truthy item of *values*, or None."""
+    return next(filter(None, values), None)
+
+
+class ScannerModelResolver:
+    """Thread-safe scanner model lookup with a per-run, per-device memo."""
+
+    def __init__(self, client, workers=DEFAULT_WORKERS):
+        self.client = client
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._by_device = {}
+        self._device_locks = {}
+
+    def resolve(self, series_list, headers=()):
+        """Return the scanner model of a study, or None if none can be found.
+
+        *series_list* holds the study's expanded series records (with
+        ``MainDicomTags`` and ``Instances``, as from ``/tools/bulk-content``
+        at Level Series); *headers* are instance datasets already at hand
+        (see :func:`header_value`), the most representative first.
+        """
+        headers = [ds for ds in headers if ds is not None]
+        devices = self._device_keys(series_list, headers)
+
+        model = _first(header_value(ds, MANUFACTURER_MODEL_TAG) for ds in headers)
+        if model is None:
+            model = _first(
+                series["MainDicomTags"].get("ManufacturerModelName")
+                for series in series_list
+            )
+        if model is not None:
+            self._remember(devices, model)
+            return model
+
+        # Concurrent studies from one scanner wait for the first to sample it.
+        with self._device_lock(devices):
+            with self._lock:
+                model = _first(self._by_device.get(key) for key in devices)
+            if model is None:
+                model = self._sample(series_list)
+                if model is not None:
+                    self._remember(devices, model)
+        return model
+
+    def _remember(self, devices, model):
+        with self._lock:
+            for key in devices:
+                self._by_device.setdefault(key, model)
+
+    def _device_lock(self, devices):
+        if not devices:
+            return contextlib.nullcontext()
+        with self._lock:
+            return self._device_locks.setdefault(devices[0], threading.Lock())
+
+    @staticmethod
+    def _device_keys(series_list, headers):
+        keys = []
+        for series in series_list:
+            station = series["MainDicomTags"].get("StationName")
+            if station:
+                keys.append(("StationName", station))
+        for ds in headers:
+            station = header_value(ds, STATION_NAME_TAG)
+            if station:
+                keys.append(("StationName", station))
+            serial = header_value(ds, DEVICE_SERIAL_NUMBER_TAG)
+            if serial:
+                keys.append(("DeviceSerialNumber", serial))
+        return list(dict.fromkeys(keys))
+
+    def _sample(self, series_list):
+        """Read the model of one instance per series, concurrently."""
+        instance_ids = [
+            series["Instances"][len(series["Instances"]) // 2]
+            for series in series_list
+            if series.get("Instances")
+        ]
+        if not instance_ids:
+            return None
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            return _first(pool.map(self._instance_model, instance_ids))
+
+    def _instance_model(self, instance_id):
+        try:
+            value = self.client.get_instances_id_content_path(
+                instance_id, MANUFACTURER_MODEL_TAG.replace(",", "-")
+            )
+        except httpx.HTTPError:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode("utf-8", "replace")
+        return value.replace("\x00", "").strip() or None
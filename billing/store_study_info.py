@@ -24,6 +24,8 @@ Per-study (recorded once):
     0008,1090  Manufacturer Model Name
     0008,0020  Study Date
     0008,1030  Study Description
+    Study wall-clock time, from the Series Time (0008,0031) and duration of
+    the series headers fetched anyway
 
 Per-series (recorded once *per series* when available):
     0018,1316  SAR (Specific Absorption Rate)
@@ -42,17 +44,21 @@ Database schema (auto-created on first run)
 ------------------------------------------
 Table *studies*
     accession (PK) | patient_id | age | height | weight | sex | ethnic_group |
-    body_part | manufacturer_model | study_date | study_description
+    body_part | manufacturer_model | study_date | study_description |
+    wall_seconds
 
 Table *series*
     series_uid (PK) | accession (FK) | sar | duration | series_number |
     series_description | pulse_sequence_name | sequence_name | repetition_time
 
+Table *rollup_daily* (day x scanner x protocol aggregates, see rollups.py)
+
 Usage examples
 --------------
     ./store_study_info.py E12345678           # single accession
     ./store_study_info.py 20240427            # all studies on 27-Apr-2024
     ./store_study_info.py 202404              # all studies in April 2024
+    ./store_study_info.py --follow            # ingest new studies as they arrive
 
 Progress reporting
 ------------------
@@ -63,33 +69,150 @@ to stdout before extraction begins so you can monitor progress.
 from __future__ import annotations
 
 import argparse
-import netrc
+import json
 import os
 import sqlite3
 import sys
-from typing import Any, Dict, Optional, Callable
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Callable
 
 import pydicom  # type: ignore
-import pyorthanc
 import datetime
 import calendar
 
+import orthanc_client
+import request_metrics
+import rollups
+from request_metrics import METRICS
+from scanner_model import ScannerModelResolver
+from study_info_db import DEFAULT_DB_PATH, get_db_connection
+
+# Number of concurrent header downloads per study.  Kept small so that a
+# backfill does not saturate Orthanc.
+DEFAULT_WORKERS = 8
+
 
 # ---------------------------------------------------------------------------
 # Date helpers (for YYYYMM / YYYYMMDD selection)
 # ---------------------------------------------------------------------------
 
 
-def studies_for_date(date_str: str):
-    """Return list of Study objects whose StudyDate equals *date_str* (YYYYMMDD)."""
+def studies_for_dates(dates: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Return ``{date: expanded study records}`` for the YYYYMMDD *dates*.
+
+    One ranged ``/tools/find`` query with ``Expand`` (paged for very large
+    ranges) returns the MainDicomTags, PatientMainDicomTags and series
+    identifiers of every study between the first and last date; the records
+    are then grouped by StudyDate locally.
+    """
 
-    query = {"StudyDate": date_str}
-    studies = pyorthanc.find_studies(client=ORTHANC, query=query)
+    studies = orthanc_client.find_expanded(
+        ORTHANC, {"StudyDate": orthanc_client.date_range_query(dates)}
+    )
     # Sort by date/time to keep deterministic order
-    return sorted(studies, key=lambda s: (s.date, s.identifier))
+    studies.sort(
+        key=lambda s: (
+            s["MainDicomTags"].get("StudyDate", ""),
+            s["MainDicomTags"].get("StudyTime", "")[:6],
+            s["ID"],
+        ),
+    )
+    by_date: Dict[str, List[Dict[str, Any]]] = {date: [] for date in dates}
+    for study in studies:
+        date = study["MainDicomTags"].get("StudyDate")
+        if date in by_date:
+            by_date[date].append(study)
+    return by_date
+
+
+def studies_for_date(date_str: str) -> List[Dict[str, Any]]:
+    """Return expanded study records whose StudyDate equals *date_str* (YYYYMMDD)."""
+
+    return studies_for_dates([date_str])[date_str]
+
+
+def process_studies(
+    studies: List[Dict[str, Any]],
+    writer: StudyInfoWriter,
+    *,
+    force: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    _skip_cb: Optional[Callable[[str], None]] = None,
+    on_error: Optional[Callable[[Dict[str, Any], Exception], None]] = None,
+) -> int:
+    """Queue every not-yet-recorded "E" study of *studies* on *writer*.
+
+    *studies* are expanded study records.  Only Orthanc is contacted; the
+    database is touched solely through *writer*, whose
+    :meth:`~StudyInfoWriter.flush` is left to the caller.  Returns the number
+    of studies harvested.
+
+    A study that fails propagates its exception, unless *on_error* is given:
+    then everything queued for that study is dropped again (see
+    :meth:`StudyInfoWriter.discard`), ``on_error(study, exc)`` is called and
+    the remaining studies are processed.
+    """
+
+    pending = []
+    to_purge = set()
+    for study in studies:
+        acc = study["MainDicomTags"].get("AccessionNumber", "")
+
+        if not acc.startswith("E"):
+            continue
+
+        if writer.has_accession(acc):
+            if not force:
+                if _skip_cb:
+                    _skip_cb(acc)
+                continue  # skip existing study
+            to_purge.add(acc)
+
+        pending.append(study)
+
+    # One bulk request for the series of every pending study.
+    for study in attach_series_details(pending):
+        acc = study["MainDicomTags"]["AccessionNumber"]
+        print(acc)
+        if acc in to_purge:
+            # purge and reprocess before re-acquiring
+            to_purge.discard(acc)
+            writer.purge(acc)
+        try:
+            _process_study(study, writer, workers=workers)
+        except Exception as exc:
+            if on_error is None:
+                raise
+            writer.discard(acc)
+            on_error(study, exc)
+
+    return len(pending)
 
 
-# Callable already imported above via typing import Any, Dict, Optional, Callable
+def process_day(
+    date_str: str,
+    writer: StudyInfoWriter,
+    *,
+    studies: Optional[List[Dict[str, Any]]] = None,
+    force: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    _skip_cb: Optional[Callable[[str], None]] = None,
+) -> int:
+    """Queue the studies acquired on *date_str* (see :func:`process_studies`).
+
+    *studies* are the day's expanded study records if already fetched.
+    """
+
+    if studies is None:
+        studies = studies_for_date(date_str)
+    return process_studies(
+        studies,
+        writer,
+        force=force,
+        workers=workers,
+        _skip_cb=_skip_cb,
+    )
 
 
 def process_date_arg(
@@ -97,33 +220,24 @@ def process_date_arg(
     conn: sqlite3.Connection,
     *,
     force: bool = False,
+    workers: int = DEFAULT_WORKERS,
     _skip_cb: Optional[Callable[[str], None]] = None,
 ) -> None:
     """Handle an argument that is a date (YYYYMM or YYYYMMDD).
 
     The *force* flag has the same semantics as in :func:`store_study` – when
     False, studies whose accession already exists in the database are skipped.
-    When True, they are purged beforehand.
+    When True, they are purged beforehand.  *workers* bounds the number of
+    concurrent header downloads per study (see :func:`_process_study`).
+
+    The studies of the whole token are fetched with one ranged query, then
+    processed day by day.  All rows for *date_token* are written in a single
+    transaction at the end.
     """
 
     if len(date_token) == 8:  # YYYYMMDD
         # single day
-        for study in studies_for_date(date_token):
-            acc = study.main_dicom_tags.get("AccessionNumber", "")
-
-            if not acc.startswith("E"):
-                continue
-
-            if accession_exists(conn, acc):
-                if not force:
-                    if _skip_cb:
-                        _skip_cb(acc)
-                    continue  # skip existing study
-                # purge and reprocess before re-acquiring
-                purge_accession(conn, acc)
-
-            print(acc)
-            _process_study(study, conn)
+        days = [date_token]
 
     elif len(date_token) == 6:  # YYYYMM -> full month
         year = int(date_token[:4])
@@ -131,107 +245,50 @@ def process_date_arg(
 
         # Days in month
         days_in_month = calendar.monthrange(year, month)[1]
-
-        for day in range(1, days_in_month + 1):
-            date_str = f"{year:04d}{month:02d}{day:02d}"
-            for study in studies_for_date(date_str):
-                acc = study.main_dicom_tags.get("AccessionNumber", "")
-                if not acc.startswith("E"):
-                    continue
-
-                if accession_exists(conn, acc):
-                    if not force:
-                        if _skip_cb:
-                            _skip_cb(acc)
-                        continue
-                    purge_accession(conn, acc)
-
-                print(acc)
-                _process_study(study, conn)
+        days = [
+            f"{year:04d}{month:02d}{day:02d}" for day in range(1, days_in_month + 1)
+        ]
     else:
         print(
             f"Invalid date token '{date_token}'. Expected YYYYMM or YYYYMMDD.",
             file=sys.stderr,
         )
+        return
+
+    by_date = studies_for_dates(days)
+    writer = StudyInfoWriter(conn)
+    writer.preload([study for studies in by_date.values() for study in studies])
+    try:
+        for date_str in days:
+            process_studies(
+                by_date[date_str],
+                writer,
+                force=force,
+                workers=workers,
+                _skip_cb=_skip_cb,
+            )
+    finally:
+        # Keep whatever was harvested even if a later day fails.
+        writer.flush()
 
 
 # ---------------------------------------------------------------------------
-# Orthanc configuration (duplicated from duration.py for consistency)
+# Orthanc configuration (shared pooled client, see orthanc_client.py)
 # ---------------------------------------------------------------------------
 
 HOST = "micvna.mclean.harvard.edu"
 PORT = 8042
-SERVER_URL = f"http://{HOST}:{PORT}"
 
-# Credentials are stored in a *netrc* file next to this script (same scheme as
-# duration.py)
+# Credentials come from ~/.netrc or a *netrc* file next to this script (same
+# scheme as duration.py)
 try:
-    USERNAME, _, PASSWORD = netrc.netrc("netrc").authenticators(HOST)
-except FileNotFoundError:
+    ORTHANC = orthanc_client.connect(HOST, PORT)
+except (FileNotFoundError, TypeError):
     print("Could not locate 'netrc' file for Orthanc credentials.", file=sys.stderr)
     sys.exit(1)
 
-ORTHANC = pyorthanc.Orthanc(SERVER_URL, username=USERNAME, password=PASSWORD)
-
-
-# ---------------------------------------------------------------------------
-# SQLite helpers
-# ---------------------------------------------------------------------------
-
-DEFAULT_DB_PATH = "study_info.db"
-
-
-def get_db_connection(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
-    """Open (and create if missing) the SQLite database at *db_path* and ensure
-    that the required tables exist.
-
-    The function creates the file if it does not already exist and initialises
-    the *studies* and *series* tables when they are missing.
-    """
-
-    conn = sqlite3.connect(db_path)
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS studies (
-            accession          TEXT PRIMARY KEY,
-            patient_id         TEXT,
-            age                INTEGER,
-            height             REAL,
-            weight             REAL,
-            sex                TEXT,
-            ethnic_group       TEXT,
-            body_part          TEXT,
-            manufacturer_model TEXT,
-            study_date         TEXT,
-            study_description  TEXT
-        )
-        """
-    )
-
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS series (
-            series_uid          TEXT PRIMARY KEY,
-            accession           TEXT NOT NULL,
-            sar                 REAL,
-            duration            INTEGER,  -- seconds
-            series_number       INTEGER,
-            series_description  TEXT,
-            pulse_sequence_name TEXT,
-            sequence_name       TEXT,
-            repetition_time     REAL,     -- milliseconds
-            FOREIGN KEY (accession) REFERENCES studies(accession)
-        )
-        """
-    )
-
-    # Lightweight migration: add repetition_time column to pre-existing DBs.
-    cols = {row[1] for row in conn.execute("PRAGMA table_info(series)").fetchall()}
-    if "repetition_time" not in cols:
-        conn.execute("ALTER TABLE series ADD COLUMN repetition_time REAL")
-        conn.commit()
-
-    return conn
+# Remembers each scanner's model for the rest of the run (see scanner_model.py)
+SCANNER_MODELS = ScannerModelResolver(ORTHANC, workers=DEFAULT_WORKERS)
 
 
 # ---------------------------------------------------------------------------
@@ -257,6 +314,151 @@ def purge_accession(conn: sqlite3.Connection, accession: str) -> None:
     conn.commit()
 
 
+STUDY_UPSERT_SQL = """
+    INSERT INTO studies (
+        accession, patient_id, age, height, weight, sex, ethnic_group, body_part,
+        manufacturer_model, study_date, study_description, wall_seconds
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(accession) DO UPDATE SET
+        patient_id          = excluded.patient_id,
+        age                 = COALESCE(excluded.age, studies.age),
+        height              = COALESCE(excluded.height, studies.height),
+        weight              = COALESCE(excluded.weight, studies.weight),
+        sex                 = COALESCE(excluded.sex, studies.sex),
+        ethnic_group        = COALESCE(excluded.ethnic_group, studies.ethnic_group),
+        body_part           = COALESCE(excluded.body_part, studies.body_part),
+        manufacturer_model  = COALESCE(excluded.manufacturer_model, studies.manufacturer_model),
+        study_date          = COALESCE(excluded.study_date, studies.study_date),
+        study_description   = COALESCE(excluded.study_description, studies.study_description),
+        wall_seconds        = COALESCE(excluded.wall_seconds, studies.wall_seconds)
+"""
+
+# OR IGNORE covers series recorded under an accession that was not preloaded.
+SERIES_INSERT_SQL = """
+    INSERT OR IGNORE INTO series (series_uid, accession, sar, duration, series_number,
+                                  series_description, pulse_sequence_name, sequence_name, repetition_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class StudyInfoWriter:
+    """Buffer rows for *conn* and write them in a single transaction.
+
+    The sets of accessions and series UIDs already present for a batch of
+    studies are loaded once with :meth:`preload`, replacing a ``SELECT`` per
+    study and per series.  Purges and inserts are queued and applied together by
+    :meth:`flush` using ``executemany``, which also brings the daily rollups
+    of the affected days up to date (see rollups.py).
+    """
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.known_accessions: set = set()
+        # series_uid -> accession, so that purges can forget their series
+        self.known_series: Dict[str, str] = {}
+        self._purges: List[str] = []
+        self._studies: List[tuple] = []
+        self._series: List[tuple] = []
+
+    def preload(self, studies: List[Dict[str, Any]]) -> None:
+        """Load which of the expanded *studies* are stored, by accession.
+
+        Keyed on the accession rather than the study date, so that a study
+        stored with another or no study_date still counts as present.
+        """
+
+        self.preload_accessions(
+            [study["MainDicomTags"].get("AccessionNumber", "") for study in studies]
+        )
+
+    def preload_accessions(self, accessions: List[str]) -> None:
+        """Load whichever of *accessions* are stored, with their series UIDs."""
+
+        accessions = list(dict.fromkeys(accessions))
+        with METRICS.timed("sqlite", "preload"):
+            # stay well below SQLite's limit on bound parameters
+            for i in range(0, len(accessions), 500):
+                chunk = accessions[i : i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT accession FROM studies WHERE accession IN ({marks})",
+                    chunk,
+                )
+                self.known_accessions.update(row[0] for row in rows)
+                rows = self.conn.execute(
+                    "SELECT series_uid, accession FROM series "
+                    f"WHERE accession IN ({marks})",
+                    chunk,
+                )
+                self.known_series.update(rows)
+
+    def has_accession(self, accession: str) -> bool:
+        return accession in self.known_accessions
+
+    def purge(self, accession: str) -> None:
+        """Queue removal of *accession*; applied before any queued insert."""
+
+        self._purges.append(accession)
+        self.known_accessions.discard(accession)
+        self.known_series = {
+            uid: acc for uid, acc in self.known_series.items() if acc != accession
+        }
+
+    def discard(self, accession: str) -> None:
+        """Drop whatever is queued for *accession*, its purge included."""
+
+        self._purges = [acc for acc in self._purges if acc != accession]
+        self._studies = [row for row in self._studies if row[0] != accession]
+        self._series = [row for row in self._series if row[1] != accession]
+        # back to what the database holds
+        self.known_accessions.discard(accession)
+        self.known_series = {
+            uid: acc for uid, acc in self.known_series.items() if acc != accession
+        }
+        self.preload_accessions([accession])
+
+    def add_study(self, row: tuple) -> None:
+        """Queue a row for :data:`STUDY_UPSERT_SQL` (accession first)."""
+
+        self._studies.append(row)
+        self.known_accessions.add(row[0])
+
+    def add_series(self, row: tuple) -> bool:
+        """Queue a row for :data:`SERIES_INSERT_SQL` unless already known."""
+
+        if row[0] in self.known_series:
+            return False
+        self._series.append(row)
+        self.known_series[row[0]] = row[1]
+        return True
+
+    def flush(self) -> None:
+        """Write everything queued so far in one transaction."""
+
+        if not (self._purges or self._studies or self._series):
+            return
+
+        purges = [(acc,) for acc in self._purges]
+        touched = (
+            self._purges
+            + [row[0] for row in self._studies]
+            + [row[1] for row in self._series]
+        )
+        with METRICS.timed("sqlite", "flush"), self.conn:
+            # days as stored before and after, in case a study changed date
+            days = rollups.days_of_accessions(self.conn, touched)
+            self.conn.executemany("DELETE FROM series WHERE accession = ?", purges)
+            self.conn.executemany("DELETE FROM studies WHERE accession = ?", purges)
+            self.conn.executemany(STUDY_UPSERT_SQL, self._studies)
+            self.conn.executemany(SERIES_INSERT_SQL, self._series)
+            days |= rollups.days_of_accessions(self.conn, touched)
+            rollups.refresh_days(self.conn, days)
+
+        self._purges.clear()
+        self._studies.clear()
+        self._series.clear()
+
+
 # ---------------------------------------------------------------------------
 # DICOM helpers
 # ---------------------------------------------------------------------------
@@ -284,6 +486,8 @@ SERIES_DESCRIPTION_TAG = "0008,103e"  # Series Description
 PULSE_SEQUENCE_NAME_TAG = "0018,9005"  # Pulse Sequence Name
 SEQUENCE_NAME_TAG = "0018,0024"  # Sequence Name
 REPETITION_TIME_TAG = "0018,0080"  # Repetition Time (ms)
+SERIES_TIME_TAG = "0008,0031"  # Series Time (HHMMSS.frac)
+ACQUISITION_TIME_TAG = "0008,0032"  # Acquisition Time, if Series Time is absent
 
 
 def extract_patient_tags(ds: pydicom.FileDataset) -> Dict[str, Optional[str]]:
@@ -458,74 +662,188 @@ def extract_sar(ds: pydicom.FileDataset) -> Optional[float]:
             return None
 
 
+def extract_series_start(ds: pydicom.FileDataset) -> Optional[float]:
+    """Return the series start (0008,0031, else 0008,0032) in seconds after
+    midnight, or None."""
+
+    for tag in (SERIES_TIME_TAG, ACQUISITION_TIME_TAG):
+        elem = get_element(ds, tag)
+        if elem is None or elem.value in ("", None):  # type: ignore[attr-defined]
+            continue
+        raw_value = str(elem.value).strip().replace(":", "")  # type: ignore[attr-defined]
+        try:
+            hours = int(raw_value[0:2])
+            minutes = int(raw_value[2:4] or 0)
+            seconds = float(raw_value[4:] or 0)
+        except ValueError:
+            continue
+        return hours * 3600 + minutes * 60 + seconds
+    return None
+
+
+def study_wall_seconds(headers: List[Any]) -> Optional[int]:
+    """Return the wall-clock length of a study in seconds, or None.
+
+    Spans from the earliest series start to the latest series end (start
+    plus 0051,100a duration) over the series *headers* that carry both.
+    """
+
+    spans = []
+    for ds in headers:
+        if ds is None:
+            continue
+        start = extract_series_start(ds)
+        duration = extract_series_duration(ds)
+        if start is not None and duration is not None:
+            spans.append((start, start + duration))
+    if not spans:
+        return None
+    wall = max(end for _, end in spans) - min(start for start, _ in spans)
+    # a study running past midnight would need the series dates too
+    return int(wall) if 0 <= wall < 86400 else None
+
+
+# ---------------------------------------------------------------------------
+# Header-only tag retrieval
+# ---------------------------------------------------------------------------
+
+
+class TagElement:
+    """Minimal stand-in for :class:`pydicom.DataElement` exposing ``value``."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+
+class TagDataset:
+    """Read-only, pydicom-like view over Orthanc's ``/instances/{id}/tags?short``.
+
+    Only ``get`` is implemented, accepting either a ``"GGGG,EEEE"`` string or a
+    ``(group, element)`` tuple – exactly the lookups performed by
+    :func:`get_element` and the ``extract_*`` helpers, which therefore work
+    unchanged on this object and on a full :class:`pydicom.FileDataset`.
+    """
+
+    def __init__(self, tags: Dict[str, Any]) -> None:
+        self._tags = {key.lower(): value for key, value in tags.items()}
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if isinstance(key, tuple):
+            key = f"{key[0]:04x},{key[1]:04x}"
+        else:
+            key = str(key).lower()
+
+        if key not in self._tags:
+            return default
+        return TagElement(self._tags[key])
+
+
+def fetch_instance_tags(instance_id: str) -> TagDataset:
+    """Return the header of *instance_id* as a :class:`TagDataset`.
+
+    Orthanc parses the file server-side and stops before PixelData, so only a
+    few kilobytes of JSON cross the network instead of the whole instance.
+    """
+
+    tags = ORTHANC.get_instances_id_tags(instance_id, params={"short": True})
+    return TagDataset(tags)
+
+
+def attach_series_details(studies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Add a ``SeriesDetails`` list to every expanded study record in *studies*.
+
+    Uses ``/tools/bulk-content`` (as :func:`duration_utils.duration` does) to
+    retrieve the MainDicomTags and instance identifiers of every series of
+    every study in one request, instead of walking ``study.series`` and
+    ``series.instances`` object by object.  Series keep the order in which the
+    study lists them.
+    """
+
+    if not studies:
+        return studies
+
+    series_list = ORTHANC.post_tools_bulk_content(
+        json={"Resources": [study["ID"] for study in studies], "Level": "Series"}
+    )
+    by_id = {series["ID"]: series for series in series_list}
+
+    for study in studies:
+        study["SeriesDetails"] = [
+            by_id[series_id] for series_id in study["Series"] if series_id in by_id
+        ]
+    return studies
+
+
 # ---------------------------------------------------------------------------
 # Core logic
 # ---------------------------------------------------------------------------
 
 
+def _fetch_series_header(series: Dict[str, Any]):
+    """Return ``(series_uid, dataset, error)`` for the first instance of *series*.
+
+    *series* is a record from :func:`attach_series_details`.  Runs on a worker
+    thread; failures to download the header are returned rather than raised so
+    that the writer can report them per series.
+    """
+
+    series_uid = series["MainDicomTags"].get("SeriesInstanceUID")
+    try:
+        return series_uid, fetch_instance_tags(series["Instances"][0]), None
+    except Exception as exc:
+        return series_uid, None, exc
+
+
 # Internal routine that does the actual database operations ------------------
 
 
-def _process_study(study: pyorthanc.Study, conn: sqlite3.Connection) -> None:
-    """Store desired information from *study* into *conn*."""
+def _process_study(
+    study: Dict[str, Any],
+    writer: StudyInfoWriter,
+    *,
+    workers: int = DEFAULT_WORKERS,
+) -> None:
+    """Queue desired information from *study* on *writer*.
+
+    *study* is an expanded study record carrying ``SeriesDetails`` (see
+    :func:`attach_series_details`).  The first instance of every series is
+    downloaded concurrently on up to *workers* threads; rows are handed to
+    *writer* on the calling thread and written when the caller flushes it.
+    """
+
+    # Core identifiers
+    accession = study["MainDicomTags"].get("AccessionNumber")
+
+    # Fetch stage: pull the per-series header data in parallel.
+    all_series = study["SeriesDetails"]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        headers = list(pool.map(_fetch_series_header, all_series))
 
     # Use the very first DICOM instance of the study to populate patient tags.
     # This prevents multiple requests for identical information and avoids the
     # need to tap directly into Orthanc's database.
-    # Core identifiers
-    accession = study.main_dicom_tags.get("AccessionNumber")
-
-    first_instance = study.series[0].instances[0]
-    ds_first = first_instance.get_pydicom()
+    _, ds_first, first_error = headers[0]
+    if first_error is not None:
+        raise first_error
 
     patient_info = extract_patient_tags(ds_first)
     body_part = extract_body_part(ds_first)
     study_description = extract_study_description(ds_first)
 
-    # Manufacturer model: try first instance; if missing, search others
-    elem_mm = get_element(ds_first, MANUFACTURER_MODEL_TAG)
-    manufacturer_model = (
-        None
-        if elem_mm is None or elem_mm.value in ("", None)  # type: ignore[attr-defined]
-        else str(elem_mm.value)  # type: ignore[attr-defined]
+    # Manufacturer model: first instance, then the other headers fetched above,
+    # then at most one sampled instance per series.
+    manufacturer_model = SCANNER_MODELS.resolve(
+        all_series, [ds for _, ds, _ in headers]
     )
 
-    if manufacturer_model is None:
-        # scan other instances until found
-        for series in study.series:
-            for inst in series.instances:
-                try:
-                    val = inst.get_content_by_tag(MANUFACTURER_MODEL_TAG)
-                    if val:
-                        manufacturer_model = val
-                        break
-                except Exception:
-                    continue
-            if manufacturer_model is not None:
-                break
-
-    study_date = study.main_dicom_tags.get("StudyDate")
-    patient_id = study.patient_information.get("PatientID")
+    study_date = study["MainDicomTags"].get("StudyDate")
+    patient_id = study["PatientMainDicomTags"].get("PatientID")
+    wall_seconds = study_wall_seconds([ds for _, ds, _ in headers])
 
     # Insert or update the *studies* table.
-    conn.execute(
-        """
-        INSERT INTO studies (
-            accession, patient_id, age, height, weight, sex, ethnic_group, body_part,
-            manufacturer_model, study_date, study_description
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(accession) DO UPDATE SET
-            patient_id          = excluded.patient_id,
-            age                 = COALESCE(excluded.age, studies.age),
-            height              = COALESCE(excluded.height, studies.height),
-            weight              = COALESCE(excluded.weight, studies.weight),
-            sex                 = COALESCE(excluded.sex, studies.sex),
-            ethnic_group        = COALESCE(excluded.ethnic_group, studies.ethnic_group),
-            body_part           = COALESCE(excluded.body_part, studies.body_part),
-            manufacturer_model  = COALESCE(excluded.manufacturer_model, studies.manufacturer_model),
-            study_date          = COALESCE(excluded.study_date, studies.study_date),
-            study_description   = COALESCE(excluded.study_description, studies.study_description)
-        """,
+    writer.add_study(
         (
             accession,
             patient_id,
@@ -538,21 +856,22 @@ def _process_study(study: pyorthanc.Study, conn: sqlite3.Connection) -> None:
             manufacturer_model,
             study_date,
             study_description,
-        ),
+            wall_seconds,
+        )
     )
 
-    # Iterate over every series in the study and store SAR.
-    for series in study.series:
-        series_uid = series.uid
-
+    # Write stage: iterate over every series in the study and store SAR.
+    for series_uid, ds, error in headers:
         # Check if we already stored this series.
-        cur = conn.execute("SELECT 1 FROM series WHERE series_uid = ?", (series_uid,))
-        if cur.fetchone() is not None:
+        if series_uid in writer.known_series:
+            continue
+
+        if error is not None:
+            print(f"Failed to fetch series {series_uid}: {error}", file=sys.stderr)
             continue
 
         # Retrieve SAR and duration from the first instance.
         try:
-            ds = series.instances[0].get_pydicom()
             sar = extract_sar(ds)
             duration = extract_series_duration(ds)
 
@@ -576,55 +895,255 @@ def _process_study(study: pyorthanc.Study, conn: sqlite3.Connection) -> None:
             sequence_name = extract_sequence_name(ds)
             repetition_time = extract_repetition_time(ds)
 
-            conn.execute(
-                """
-                INSERT INTO series (series_uid, accession, sar, duration, series_number,
-                                  series_description, pulse_sequence_name, sequence_name, repetition_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (series_uid, accession, sar, duration, series_number, series_description, pulse_sequence_name, sequence_name, repetition_time),
+            writer.add_series(
+                (
+                    series_uid,
+                    accession,
+                    sar,
+                    duration,
+                    series_number,
+                    series_description,
+                    pulse_sequence_name,
+                    sequence_name,
+                    repetition_time,
+                )
             )
 
         except Exception as exc:
             print(f"Failed to fetch series {series_uid}: {exc}", file=sys.stderr)
 
-    conn.commit()
-
 
 # Public helper --------------------------------------------------------------
 
 
 def store_study(
-    accession: str, conn: sqlite3.Connection, *, force: bool = False
+    accession: str,
+    conn: sqlite3.Connection,
+    *,
+    force: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    _skip_cb: Optional[Callable[[str], None]] = None,
 ) -> None:
     """Locate study by *accession* and store its information.
 
     Behaviour is influenced by *force*:
 
     • If *force* is False (default) and the accession already exists in the
-      database, the function returns immediately.
+      database, nothing is fetched; *_skip_cb* is called with the accession.
     • If *force* is True, any existing rows for the accession (including
-      related *series*) are removed before the data are retrieved again from
-      Orthanc.
-    """
-
-    if accession_exists(conn, accession):
-        if not force:
-            # Skip silently – caller decides whether to print something.
-            return
+      related *series*) are replaced, in the same transaction, by the data
+      retrieved again from Orthanc.
 
-        # Remove stale data before re-importing.
-        purge_accession(conn, accession)
+    The database is consulted once, through :class:`StudyInfoWriter`, and the
+    expanded study record is passed on as is (see :func:`process_studies`).
+    """
 
-    studies = pyorthanc.find_studies(
-        client=ORTHANC, query={"AccessionNumber": accession}
-    )
+    writer = StudyInfoWriter(conn)
+    writer.preload_accessions([accession])
+    if writer.has_accession(accession) and not force:
+        if _skip_cb:
+            _skip_cb(accession)
+        return
 
+    studies = orthanc_client.find_expanded(ORTHANC, {"AccessionNumber": accession})
     if not studies:
         print(f"No study found for accession number {accession}", file=sys.stderr)
         return
 
-    _process_study(studies[0], conn)
+    try:
+        process_studies(studies[:1], writer, force=force, workers=workers)
+    finally:
+        writer.flush()
+
+
+# ---------------------------------------------------------------------------
+# Incremental ingestion (--follow)
+# ---------------------------------------------------------------------------
+
+CHANGES_SEQ_KEY = "orthanc_changes_seq"
+# Studies whose ingestion failed, as a JSON object {study ID: failed attempts};
+# they are tried again once per poll.
+CHANGES_RETRY_KEY = "orthanc_changes_retry"
+CHANGES_BATCH = 500
+DEFAULT_POLL_INTERVAL = 30  # seconds
+# A study that fails this many polls in a row is given up on, so that a
+# single unreadable study is neither retried forever nor holds up the others.
+MAX_STUDY_ATTEMPTS = 3
+
+
+def get_state(conn: sqlite3.Connection, key: str) -> Optional[str]:
+    """Return the *ingest_state* value stored under *key*, or None."""
+
+    row = conn.execute(
+        "SELECT value FROM ingest_state WHERE key = ?", (key,)
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+def set_state(conn: sqlite3.Connection, key: str, value: Any) -> None:
+    """Store *value* under *key* in *ingest_state* (caller commits)."""
+
+    conn.execute(
+        "INSERT INTO ingest_state (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, str(value)),
+    )
+
+
+def fetch_studies(study_ids: List[str]) -> List[Dict[str, Any]]:
+    """Return expanded study records for *study_ids*.
+
+    One bulk request normally; if that fails (e.g. a study was deleted in the
+    meantime) each study is requested on its own and missing ones are left
+    out.
+    """
+
+    try:
+        return ORTHANC.post_tools_bulk_content(
+            json={"Resources": study_ids, "Level": "Study"}
+        )
+    except Exception:
+        studies = []
+        for study_id in study_ids:
+            try:
+                studies.append(ORTHANC.get_studies_id(study_id))
+            except Exception as exc:
+                print(f"Failed to fetch study {study_id}: {exc}", file=sys.stderr)
+        return studies
+
+
+def queue_changed_studies(
+    study_ids: List[str],
+    writer: StudyInfoWriter,
+    *,
+    force: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    _skip_cb: Optional[Callable[[str], None]] = None,
+) -> List[str]:
+    """Queue the studies *study_ids* on *writer*; return the IDs that failed.
+
+    The batch is fetched and processed with bulk requests, and a study that
+    fails leaves nothing queued (see :func:`process_studies`).  If a bulk
+    request itself fails, the studies are tried one by one.
+    """
+
+    failed: List[str] = []
+
+    def on_error(study: Dict[str, Any], exc: Exception) -> None:
+        print(f"Failed to process study {study['ID']}: {exc}", file=sys.stderr)
+        failed.append(study["ID"])
+
+    def queue(ids: List[str]) -> None:
+        studies = fetch_studies(ids)
+        fetched = {study["ID"] for study in studies}
+        failed.extend(study_id for study_id in ids if study_id not in fetched)
+        writer.preload_accessions(
+            [study["MainDicomTags"].get("AccessionNumber", "") for study in studies]
+        )
+        process_studies(
+            studies,
+            writer,
+            force=force,
+            workers=workers,
+            _skip_cb=_skip_cb,
+            on_error=on_error,
+        )
+
+    try:
+        queue(study_ids)
+        return failed
+    except Exception as exc:
+        if len(study_ids) == 1:
+            print(f"Failed to process study {study_ids[0]}: {exc}", file=sys.stderr)
+            return list(study_ids)
+        print(f"Failed to process changes in bulk: {exc}", file=sys.stderr)
+
+    # Nothing was queued: the bulk steps come before any study is processed.
+    failed.clear()
+    for study_id in study_ids:
+        try:
+            queue([study_id])
+        except Exception as exc:
+            print(f"Failed to process study {study_id}: {exc}", file=sys.stderr)
+            failed.append(study_id)
+    return failed
+
+
+def follow_changes(
+    conn: sqlite3.Connection,
+    *,
+    force: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    since: Optional[int] = None,
+    _skip_cb: Optional[Callable[[str], None]] = None,
+) -> None:
+    """Ingest studies as Orthanc reports them stable; runs until interrupted.
+
+    Tails Orthanc's ``/changes`` log for ``StableStudy`` events starting at
+    *since*, or at the sequence number persisted in *ingest_state* by the
+    previous run, or – on the very first run – at the current end of the log.
+    A study that fails is skipped and tried again at the following polls (up
+    to :data:`MAX_STUDY_ATTEMPTS` times in all); the position and the list of
+    studies to retry are saved in the same transaction as the studies stored.
+    """
+
+    seq = since
+    if seq is None:
+        stored = get_state(conn, CHANGES_SEQ_KEY)
+        seq = int(stored) if stored is not None else None
+    if seq is None:
+        seq = ORTHANC.get_changes(params={"last": True})["Last"]
+        set_state(conn, CHANGES_SEQ_KEY, seq)
+        conn.commit()
+    retry = json.loads(get_state(conn, CHANGES_RETRY_KEY) or "{}")
+    retry_now = True
+
+    print(f"Following Orthanc changes from sequence {seq}", file=sys.stderr)
+
+    while True:
+        try:
+            changes = ORTHANC.get_changes(params={"since": seq, "limit": CHANGES_BATCH})
+        except Exception as exc:
+            print(f"Failed to read changes after {seq}: {exc}", file=sys.stderr)
+            time.sleep(poll_interval)
+            continue
+
+        # Earlier failures are retried once per poll, with its first batch.
+        retrying = list(retry) if retry_now else []
+        study_ids = list(retrying)
+        for change in changes["Changes"]:
+            if change["ChangeType"] == "StableStudy" and change["ID"] not in study_ids:
+                study_ids.append(change["ID"])
+
+        writer = StudyInfoWriter(conn)
+        failed = []
+        if study_ids:
+            failed = queue_changed_studies(
+                study_ids, writer, force=force, workers=workers, _skip_cb=_skip_cb
+            )
+
+        for study_id in retrying:
+            if study_id not in failed:
+                del retry[study_id]
+        for study_id in dict.fromkeys(failed):
+            retry[study_id] = retry.get(study_id, 0) + 1
+            if retry[study_id] >= MAX_STUDY_ATTEMPTS:
+                print(
+                    f"Giving up on study {study_id} after {retry[study_id]} attempts",
+                    file=sys.stderr,
+                )
+                del retry[study_id]
+        retry_now = changes["Done"]
+
+        seq = changes["Last"]
+        set_state(conn, CHANGES_SEQ_KEY, seq)
+        set_state(conn, CHANGES_RETRY_KEY, json.dumps(retry))
+        writer.flush()
+        conn.commit()
+
+        if changes["Done"]:
+            time.sleep(poll_interval)
 
 
 # ---------------------------------------------------------------------------
@@ -638,7 +1157,7 @@ def parse_args() -> argparse.Namespace:
     )
     parser.add_argument(
         "tokens",
-        nargs="+",
+        nargs="*",
         help="Accession numbers starting with 'E', or date strings YYYYMM / YYYYMMDD",
     )
 
@@ -656,14 +1175,61 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--db",
         metavar="PATH",
-        default="study_info.db",
-        help="Path to the SQLite database file to use (default: study_info.db)",
+        default=DEFAULT_DB_PATH,
+        help=f"Path to the SQLite database file to use (default: {DEFAULT_DB_PATH})",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        metavar="N",
+        help=(
+            "Maximum number of concurrent instance downloads per study "
+            f"(default: {DEFAULT_WORKERS})"
+        ),
     )
-    return parser.parse_args()
+
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help=(
+            "After processing any tokens, keep running and ingest studies as "
+            "Orthanc reports them stable (tails /changes; position is kept in the "
+            "database)"
+        ),
+    )
+
+    parser.add_argument(
+        "--since",
+        type=int,
+        metavar="SEQ",
+        help="With --follow, start at this Orthanc change sequence number",
+    )
+
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        metavar="SECONDS",
+        help=(
+            "With --follow, how long to wait when no new changes are pending "
+            f"(default: {DEFAULT_POLL_INTERVAL})"
+        ),
+    )
+
+    request_metrics.add_arguments(parser)
+
+    args = parser.parse_args()
+    if not args.tokens and not args.follow:
+        parser.error("at least one token is required unless --follow is given")
+    return args
 
 
 def main() -> None:
     args = parse_args()
+    request_metrics.report_at_exit(args.metrics_out)
 
     conn = get_db_connection(args.db)
 
@@ -672,19 +1238,40 @@ def main() -> None:
 
     for token in args.tokens:
         if token.startswith("E"):
-            if not args.force and accession_exists(conn, token):
-                _print_skip(token)
-                continue
-
-            store_study(token, conn, force=args.force)
+            store_study(
+                token,
+                conn,
+                force=args.force,
+                workers=args.workers,
+                _skip_cb=_print_skip,
+            )
         elif token.isdigit() and len(token) in (6, 8):
-            process_date_arg(token, conn, force=args.force, _skip_cb=_print_skip)
+            process_date_arg(
+                token,
+                conn,
+                force=args.force,
+                workers=args.workers,
+                _skip_cb=_print_skip,
+            )
         else:
             print(
                 f"Unrecognised argument '{token}'. Expected accession starting with 'E' or date string.",
                 file=sys.stderr,
             )
 
+    if args.follow:
+        try:
+            follow_changes(
+                conn,
+                force=args.force,
+                workers=args.workers,
+                poll_interval=args.poll_interval,
+                since=args.since,
+                _skip_cb=_print_skip,
+            )
+        except KeyboardInterrupt:
+            pass
+
     conn.close()
 
 
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""Schema of the study_info.db SQLite database.
+
+Written by ``store_study_info.py`` and read by reporting tools such as
+``export_study_info.py``.  Kept apart from ``store_study_info.py`` so that
+readers can open the database without Orthanc credentials.
+"""
+
+import sqlite3
+
+DEFAULT_DB_PATH = "study_info.db"
+
+
+def get_db_connection(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Open (and create if missing) the SQLite database at *db_path* and ensure
+    that the required tables exist.
+
+    The function creates the file if it does not already exist and initialises
+    the *studies* and *series* tables when they are missing.
+    """
+
+    conn = sqlite3.connect(db_path, timeout=30)
+
+    # WAL lets readers of the database proceed while the ingester writes;
+    # NORMAL sync is durable across application crashes and avoids an fsync
+    # per transaction.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -65536")  # 64 MiB
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS studies (
+            accession          TEXT PRIMARY KEY,
+            patient_id         TEXT,
+            age                INTEGER,
+            height             REAL,
+            weight             REAL,
+            sex                TEXT,
+            ethnic_group       TEXT,
+            body_part          TEXT,
+            manufacturer_model TEXT,
+            study_date         TEXT,
+            study_description  TEXT,
+            wall_seconds       INTEGER   -- first series start to last series end
+        )
+        """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS series (
+            series_uid          TEXT PRIMARY KEY,
+            accession           TEXT NOT NULL,
+            sar                 REAL,
+            duration            INTEGER,  -- seconds
+            series_number       INTEGER,
+            series_description  TEXT,
+            pulse_sequence_name TEXT,
+            sequence_name       TEXT,
+            repetition_time     REAL,     -- milliseconds
+            FOREIGN KEY (accession) REFERENCES studies(accession)
+        )
+        """)
+
+    # Small key/value store for ingestion bookkeeping (e.g. --follow position).
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_state (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """)
+
+    # Lightweight migration: add repetition_time column to pre-existing DBs.
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(series)").fetchall()}
+    if "repetition_time" not in cols:
+        conn.execute("ALTER TABLE series ADD COLUMN repetition_time REAL")
+        conn.commit()
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(studies)").fetchall()}
+    if "wall_seconds" not in cols:
+        conn.execute("ALTER TABLE studies ADD COLUMN wall_seconds INTEGER")
+        conn.commit()
+
+    # Per day x scanner x protocol aggregates, maintained by rollups.py
+    # whenever StudyInfoWriter flushes.  Unknown scanners and protocols are
+    # stored as '' so that they take part in the primary key.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_daily (
+            day            TEXT NOT NULL,     -- study_date, YYYYMMDD
+            scanner        TEXT NOT NULL,     -- studies.manufacturer_model
+            protocol       TEXT NOT NULL,     -- studies.study_description
+            studies        INTEGER NOT NULL,
+            study_seconds  INTEGER NOT NULL,  -- sum of studies.wall_seconds
+            series         INTEGER NOT NULL,
+            series_seconds INTEGER NOT NULL,  -- sum of series.duration
+            sar_sketch     TEXT NOT NULL,     -- rollups.SarSketch as JSON
+            PRIMARY KEY (day, scanner, protocol)
+        )
+        """)
+
+    # Month-level reports filter studies by date (and scanner) and join the
+    # series on accession; studies.accession is already indexed as the key.
+    conn.execute("CREATE INDEX IF NOT EXISTS studies_study_date ON studies(study_date)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS studies_model_date "
+        "ON studies(manufacturer_model, study_date)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS series_accession ON series(accession)")
+    conn.commit()
+
+    return conn
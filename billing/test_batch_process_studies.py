@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from fake_orthanc import Corpus, FakeOrthanc
+from study_info_db import get_db_connection
+
+DAYS = ["20250101", "20250102", "20250103"]
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeOrthanc(Corpus(days=3, studies_per_day=2, series_per_study=2)) as server:
+        yield server
+
+
+@pytest.fixture
+def batch_process_studies(store_study_info):
+    import batch_process_studies
+
+    return batch_process_studies
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = get_db_connection(str(tmp_path / "study_info.db"))
+    yield conn
+    conn.close()
+
+
+def stored_days(conn):
+    return sorted(
+        row[0] for row in conn.execute("SELECT DISTINCT study_date FROM studies")
+    )
+
+
+def completed(checkpoint):
+    with open(checkpoint) as f:
+        return json.load(f)["completed"]
+
+
+def test_resumes_from_partial_checkpoint(batch_process_studies, conn, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    batch_process_studies.save_checkpoint(checkpoint, {"20250102"})
+
+    failures = batch_process_studies.backfill(DAYS, conn, checkpoint, 2, 2)
+    assert failures == 0
+    assert stored_days(conn) == ["20250101", "20250103"]  # 20250102 was done
+    assert completed(checkpoint) == DAYS
+
+
+def test_failed_day_is_retried_on_resume(
+    batch_process_studies, store_study_info, conn, tmp_path, monkeypatch
+):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    process_day = store_study_info.process_day
+
+    def fail_second_day(day, writer, **kwargs):
+        if day == "20250102":
+            raise RuntimeError("Orthanc went away")
+        return process_day(day, writer, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(store_study_info, "process_day", fail_second_day)
+        assert batch_process_studies.backfill(DAYS, conn, checkpoint, 2, 2) == 1
+    assert stored_days(conn) == ["20250101", "20250103"]
+    assert completed(checkpoint) == ["20250101", "20250103"]
+
+    harvested = []
+
+    def spy(day, writer, **kwargs):
+        harvested.append(day)
+        return process_day(day, writer, **kwargs)
+
+    monkeypatch.setattr(store_study_info, "process_day", spy)
+    assert batch_process_studies.backfill(DAYS, conn, checkpoint, 2, 2) == 0
+    assert harvested == ["20250102"]
+    assert stored_days(conn) == DAYS
+    assert completed(checkpoint) == DAYS
@@ -0,0 +1,56 @@
+import os
+
+from billing_lookup import FALLBACK_RATE, BillingLookup, normalize_study_id
+
+HEADER = "StudyID\tFundCode\tPIName\tRate\n"
+
+
+def write_table(path, *rows):
+    with open(path, "w") as f:
+        f.write(HEADER + "".join("\t".join(row) + "\n" for row in rows))
+
+
+def test_normalize_study_id():
+    assert normalize_study_id(" proj-100 ") == "PROJ_100"
+    assert normalize_study_id("Proj__100  b") == "PROJ_100_B"
+
+
+def test_matching(tmp_path):
+    path = tmp_path / "billinglookup.tsv"
+    write_table(
+        path,
+        ("PROJ_100", "F100", "Ada", "700"),
+        ("PROJ_100_PILOT", "F101", "Ada", "0"),
+        ("Proj_200", "F200", "Grace", "tbd"),
+    )
+    lookup = BillingLookup([str(tmp_path / "missing.tsv"), str(path)])
+
+    assert lookup.get("PROJ_100")["FundCode"] == "F100"
+    assert lookup.get("proj-100")["FundCode"] == "F100"
+    assert lookup.get("PROJ_100_session2")["FundCode"] == "F100"
+    assert lookup.get("PROJ_100_pilot_3")["FundCode"] == "F101"
+    assert lookup.get("PROJ 200")["Rate"] == FALLBACK_RATE
+    assert lookup.get("PROJ_1000") is None
+    assert lookup.get("QA") is None
+    assert len(lookup) == 3
+
+
+def test_reloads_only_on_change(tmp_path, monkeypatch):
+    path = tmp_path / "billinglookup.tsv"
+    write_table(path, ("PROJ_100", "F100", "Ada", "700"))
+    lookup = BillingLookup([str(path)])
+    assert lookup.get("PROJ_100")["Rate"] == 700
+
+    loads = []
+    original = lookup._load
+    monkeypatch.setattr(lookup, "_load", lambda table: loads.append(original(table)))
+    lookup.get("PROJ_100")
+    assert loads == []
+
+    write_table(path, ("PROJ_100", "F100", "Ada", "750"), ("PROJ_300", "F3", "", "1"))
+    assert lookup.get("PROJ_100")["Rate"] == 750
+    assert lookup.get("PROJ_300")["FundCode"] == "F3"
+    assert len(loads) == 1
+
+    os.unlink(path)  # the last table read stays in use
+    assert lookup.get("PROJ_300")["FundCode"] == "F3"
@@ -0,0 +1,59 @@
+import csv
+import io
+import time
+
+import pytest
+
+from fake_orthanc import Corpus, FakeOrthanc, orthanc_id
+
+DAY = "20250101"
+EMPTY, SLOW = 1, 2  # study numbers of the day
+
+
+@pytest.fixture(scope="module")
+def server():
+    corpus = Corpus(studies_per_day=5, series_per_study=2, instances_per_series=3)
+    corpus.studies[orthanc_id("study", DAY, EMPTY)]["Series"] = []  # duration 0
+    with FakeOrthanc(corpus) as server:
+        yield server
+
+
+def slow_middle_study(module, monkeypatch):
+    """Make the SLOW study finish after every later one of the day."""
+    cached_duration = module.cached_duration
+
+    def slow(study, *args):
+        if study.identifier == orthanc_id("study", DAY, SLOW):
+            time.sleep(0.3)
+        return cached_duration(study, *args)
+
+    monkeypatch.setattr(module, "cached_duration", slow)
+
+
+def run_main(module, monkeypatch, capsys, tmp_path, *argv):
+    """Run *module*'s main with *argv* on four workers; return the CSV rows."""
+    argv = [DAY, "--workers", "4", "--cache", str(tmp_path / "cache.db"), *argv]
+    argv += ["--metrics-out", str(tmp_path / "metrics.json")]
+    monkeypatch.setattr("sys.argv", [module.__name__ + ".py", *argv])
+    module.main()
+    return list(csv.reader(io.StringIO(capsys.readouterr().out)))
+
+
+def test_duration_rows_in_study_date_order(duration, monkeypatch, capsys, tmp_path):
+    slow_middle_study(duration, monkeypatch)
+    header, *rows = run_main(duration, monkeypatch, capsys, tmp_path)
+    assert header[2] == "accession_number"
+    # QA study 3 is left out, empty study 1 skipped
+    assert [row[2] for row in rows] == ["E250101000", "E250101002", "E250101004"]
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+
+
+def test_duration94_total_formulas_skip_empty_studies(
+    duration94, monkeypatch, capsys, tmp_path
+):
+    slow_middle_study(duration94, monkeypatch)
+    header, *rows = run_main(duration94, monkeypatch, capsys, tmp_path)
+    assert header[7] == "TOTAL"
+    starts = [row[8][len(row[1]) : len(row[1]) + 10] for row in rows]
+    assert starts == ["2501010700", "2501010930", "2501011045", "2501011200"]
+    assert [row[7] for row in rows] == [f"=D{n}*E{n}" for n in range(2, 2 + len(rows))]
@@ -0,0 +1,100 @@
+import datetime
+
+import pytest
+
+import orthanc_client
+from duration_cache import DurationCache, study_fingerprint
+from duration_utils import cached_duration, studies_for_date
+from fake_orthanc import DEFAULT_LAST_UPDATE, Corpus, FakeOrthanc
+
+
+@pytest.fixture
+def server():
+    with FakeOrthanc(Corpus(studies_per_day=1, instances_per_series=4)) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return orthanc_client.PooledOrthanc(server.url, retries=0)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DurationCache(str(tmp_path / "duration_cache.db"))
+
+
+def the_study(client):
+    (study,) = studies_for_date("20250101", client)
+    return study
+
+
+def requests_to(server, route):
+    return server.stats.snapshot()["routes"].get(route, {}).get("requests", 0)
+
+
+def test_fingerprint(server, client):
+    record = next(iter(server.corpus.studies.values()))
+    assert study_fingerprint(the_study(client), client) == f"{DEFAULT_LAST_UPDATE}/20"
+
+    record["IsStable"] = False
+    server.stats.reset()
+    assert study_fingerprint(the_study(client), client) is None
+    assert requests_to(server, "GET /studies/{id}/statistics") == 0
+
+
+def test_get_and_put(cache):
+    start = datetime.datetime(2025, 1, 1, 7, 0)
+    cache.put("url", "s1", "a/1", datetime.timedelta(minutes=30), start, "Prisma")
+    assert cache.get("url", "s1", "a/1") == {
+        "duration": datetime.timedelta(minutes=30),
+        "start_time": start,
+        "scanner_model": "Prisma",
+    }
+    assert cache.get("url", "s1", "a/2") is None  # study changed
+    assert cache.get("other", "s1", "a/1") is None
+
+    cache.put("url", "s1", "a/2", datetime.timedelta(minutes=31), start)
+    assert cache.get("url", "s1", "a/2")["scanner_model"] == "Prisma"  # kept
+
+    cache.put("url", "s2", None, datetime.timedelta(minutes=5), start)
+    assert cache.get("url", "s2", None) is None
+
+    cache.put("url", "s3", "b/0", 0, None)  # empty study
+    assert cache.get("url", "s3", "b/0") == {
+        "duration": 0,
+        "start_time": None,
+        "scanner_model": None,
+    }
+
+
+def test_refresh_misses_but_stores(cache, tmp_path):
+    start = datetime.datetime(2025, 1, 1, 7, 0)
+    refreshing = DurationCache(str(tmp_path / "duration_cache.db"), refresh=True)
+    refreshing.put("url", "s1", "a/1", datetime.timedelta(minutes=30), start)
+    assert refreshing.get("url", "s1", "a/1") is None
+    assert cache.get("url", "s1", "a/1")["duration"] == datetime.timedelta(minutes=30)
+
+
+def test_cached_duration_hit_miss_and_invalidation(server, client, cache):
+    bulk = "POST /tools/bulk-content"
+    record = next(iter(server.corpus.studies.values()))
+
+    computed = cached_duration(the_study(client), client, cache)
+    assert computed[0] > datetime.timedelta(0) and computed[2] is None
+    assert requests_to(server, bulk) == 1
+
+    assert cached_duration(the_study(client), client, cache) == computed
+    assert requests_to(server, bulk) == 1  # hit
+
+    record["LastUpdate"] = "20250301T000000"
+    assert cached_duration(the_study(client), client, cache) == computed
+    assert requests_to(server, bulk) == 2  # invalidated, then cached again
+    assert cached_duration(the_study(client), client, cache) == computed
+    assert requests_to(server, bulk) == 2
+
+    record["IsStable"] = False
+    record["LastUpdate"] = "20250302T000000"
+    for expected in (3, 4):  # never cached while not stable
+        cached_duration(the_study(client), client, cache)
+        assert requests_to(server, bulk) == expected
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import export_study_info
+from export_study_info import NULL_PARTITION, export, month_rows
+from study_info_db import get_db_connection
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = get_db_connection(str(tmp_path / "study_info.db"))
+    conn.executemany(
+        "INSERT INTO studies (accession, age, manufacturer_model, study_date) "
+        "VALUES (?, ?, ?, ?)",
+        [
+            ("E1", 40, "Prisma", "20250103"),
+            ("E2", "unknown", "Prisma", "20250214"),
+            ("E3", 30, "Prisma", None),
+            ("E4", 35, "Prisma", "2024"),
+            ("E5", 50, "Prisma", ""),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO series (series_uid, accession, sar, duration) VALUES (?, ?, ?, ?)",
+        [
+            ("1.2", "E1", 0.5, 300),
+            ("1.1", "E1", 0.25, 120),
+            ("2.1", "E2", 1.0, 60),
+            ("3.1", "E3", 0.1, 30),
+            ("4.1", "E4", 0.2, 40),
+            ("5.1", "E5", 0.3, 50),
+        ],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_schema_indexes(conn):
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT count(*) FROM studies "
+        "WHERE study_date BETWEEN '20250101' AND '20250131'"
+    ).fetchall()
+    assert "studies_study_date" in str(plan)
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM series WHERE accession = 'E1'"
+    ).fetchall()
+    assert "series_accession" in str(plan)
+
+
+def test_month_rows(conn):
+    months = dict(month_rows(conn))
+    assert list(months) == [None, "202501", "202502"]
+    assert [row[0] for row in months["202501"]] == ["1.1", "1.2"]
+    # NULL, "" and "2024" all land in the one partition without a date
+    assert [row[0] for row in months[None]] == ["3.1", "4.1", "5.1"]
+    age = [column for column, _, _ in export_study_info.COLUMNS].index("age")
+    assert months["202502"][0][age] is None  # text in a numeric column
+
+
+def test_export_rewrites_changed_months_only(conn, tmp_path, monkeypatch):
+    written = []
+
+    def fake_write(out_dir, month, rows, fmt):
+        path = os.path.join(out_dir, export_study_info.partition_name(month))
+        os.makedirs(path, exist_ok=True)
+        open(os.path.join(path, "part-0.parquet"), "w").close()
+        written.append(month)
+        return os.path.relpath(os.path.join(path, "part-0.parquet"), out_dir)
+
+    monkeypatch.setattr(export_study_info, "write_partition", fake_write)
+    out = str(tmp_path / "export")
+
+    assert export(conn, out, verbose=False) == (3, 0, 0)
+    assert sorted(os.listdir(out)) == [
+        "_manifest.json",
+        "study_month=202501",
+        "study_month=202502",
+        f"study_month={NULL_PARTITION}",
+    ]
+
+    written.clear()
+    conn.execute("UPDATE series SET sar = 0.75 WHERE series_uid = '1.2'")
+    conn.execute("DELETE FROM series WHERE accession = 'E2'")
+    conn.commit()
+    assert export(conn, out, verbose=False) == (1, 1, 1)
+    assert written == ["202501"]
+    assert not os.path.exists(os.path.join(out, "study_month=202502"))
+
+    written.clear()
+    assert export(conn, out, fmt="arrow", verbose=False) == (2, 0, 0)
+
+
+def test_export_round_trip(conn, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset
+
+    out = str(tmp_path / "export")
+    export(conn, out, verbose=False)
+    table = pyarrow.dataset.dataset(out, partitioning="hive").to_table()
+    assert table.num_rows == 6
+    assert sorted(table.column("duration").to_pylist()) == [30, 40, 50, 60, 120, 300]
@@ -0,0 +1,106 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from fake_orthanc import Corpus, FakeOrthanc
+
+
+@pytest.fixture(scope="module")
+def server():
+    corpus = Corpus(
+        days=2, studies_per_day=4, series_per_study=3, instances_per_series=5
+    )
+    with FakeOrthanc(corpus) as server:
+        yield server
+
+
+def request(server, path, body=None):
+    data = None if body is None else json.dumps(body).encode()
+    with urllib.request.urlopen(server.url + path, data=data) as response:
+        payload = response.read()
+        if response.headers["Content-Type"] == "application/json":
+            return json.loads(payload)
+        return payload
+
+
+def test_find_exact_wildcard_and_range(server):
+    find = lambda query, **kw: request(  # noqa: E731
+        server, "/tools/find", {"Level": "Study", "Query": query, **kw}
+    )
+    assert len(find({"StudyDate": "20250101"})) == 4
+    assert len(find({"StudyDate": "20250101-20250102"})) == 8
+    assert len(find({"StudyDate": "20250102-"})) == 4
+    assert len(find({"StudyDate": "20250101", "AccessionNumber": "E*"})) == 3
+    assert len(find({}, Limit=3, Since=6)) == 2
+
+    (study,) = find({"AccessionNumber": "E250101000"}, Expand=True)
+    assert study["MainDicomTags"]["StudyDate"] == "20250101"
+    assert study["PatientMainDicomTags"]["PatientID"] == "S2025010100"
+    assert "_private" not in study
+
+
+def test_resources_and_bulk_content(server):
+    (study_id,) = request(
+        server,
+        "/tools/find",
+        {"Level": "Study", "Query": {"AccessionNumber": "E250101001"}},
+    )
+    study = request(server, f"/studies/{study_id}")
+    series = request(server, f"/series/{study['Series'][0]}")
+    assert len(study["Series"]) == 3 and len(series["Instances"]) == 5
+
+    instances = request(
+        server, "/tools/bulk-content", {"Resources": [study_id], "Level": "Instance"}
+    )
+    assert len(instances) == 15
+    stats = request(server, f"/studies/{study_id}/statistics")
+    assert stats["CountInstances"] == 15
+
+
+def test_instance_views(server):
+    (instance_id,) = request(
+        server,
+        "/tools/find",
+        {
+            "Level": "Instance",
+            "Query": {
+                "AccessionNumber": "E250101000",
+                "SeriesNumber": "2",
+                "InstanceNumber": "1",
+            },
+        },
+    )
+    short = request(server, f"/instances/{instance_id}/tags?short")
+    assert short["0008,1090"] == "MAGNETOM Prisma Fit"
+    assert (
+        request(server, f"/instances/{instance_id}/tags?simplify")["SAR"]
+        == short["0018,1316"]
+    )
+    assert (
+        request(server, f"/instances/{instance_id}/content/0008-1090")
+        == b"MAGNETOM Prisma Fit"
+    )
+
+    data = request(server, f"/instances/{instance_id}/file")
+    assert data[128:132] == b"DICM"
+    assert len(data) == request(server, f"/instances/{instance_id}")["FileSize"]
+
+
+def test_missing_resource_and_stats(server):
+    server.stats.reset()
+    with pytest.raises(urllib.error.HTTPError) as excinfo:
+        request(server, "/studies/00000000-00000000-00000000-00000000-00000000")
+    assert excinfo.value.code == 404
+
+    snapshot = server.stats.snapshot()
+    assert snapshot["requests"] == 1
+    assert snapshot["routes"]["GET /studies/{id}"]["requests"] == 1
+
+
+def test_changes(server):
+    changes = request(server, "/changes?since=0&limit=5")
+    assert [c["Seq"] for c in changes["Changes"]] == [1, 2, 3, 4, 5]
+    assert not changes["Done"]
+    assert request(server, "/changes?last")["Last"] == 8
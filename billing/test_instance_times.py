@@ -0,0 +1,43 @@
+import datetime
+
+from bench_instance_times import strptime_bounds, synthetic_payload
+from instance_times import instance_creation_pairs, time_bounds
+
+
+def item(date, time):
+    return {"MainDicomTags": {"InstanceCreationDate": date, "InstanceCreationTime": time}}
+
+
+def test_matches_strptime_loop():
+    data = synthetic_payload(5000, seed=1)
+    assert time_bounds(instance_creation_pairs(data)) == strptime_bounds(data)
+
+
+def test_fractional_seconds():
+    data = [item("20250102", "101500"), item("20250102", "101500.5"), item("20250102", "091500.000001")]
+    assert time_bounds(instance_creation_pairs(data)) == (
+        datetime.datetime(2025, 1, 2, 9, 15, 0, 1),
+        datetime.datetime(2025, 1, 2, 10, 15, 0, 500000),
+    )
+    assert time_bounds(instance_creation_pairs(data)) == strptime_bounds(data)
+
+
+def test_malformed_values_ignored():
+    data = [
+        item("20250102", "101500"),
+        item("20250230", "080000"),  # 30 February
+        item("20250102", "246000"),
+        item("20250102", "0800"),
+        item("20250102", "080000."),
+        item("2025010", "080000"),
+        item("20250102", "08000²"),
+        {"MainDicomTags": {"InstanceCreationDate": "20250101"}},
+        {"ID": "no tags"},
+    ]
+    first = datetime.datetime(2025, 1, 2, 10, 15)
+    assert time_bounds(instance_creation_pairs(data)) == (first, first)
+
+
+def test_empty():
+    assert time_bounds([]) == (None, None)
+    assert time_bounds(instance_creation_pairs([{"ID": "x"}])) == (None, None)
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from json_stream import iter_json_array
+
+
+def chunked(data, size):
+    raw = data.encode("utf-8")
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+PAYLOAD = [
+    {"ID": "a", "MainDicomTags": {"InstanceCreationTime": "101500.5", "Name": "Müller^Zoë"}},
+    {"ID": "b", "Nested": [1, [2, {"x": "]},["}], 3.25e2]},
+    12345,
+    "plain string with \\\" escapes",
+    [],
+    None,
+]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_round_trip_any_chunking(size):
+    text = json.dumps(PAYLOAD, ensure_ascii=False, indent=1)
+    assert list(iter_json_array(chunked(text, size))) == PAYLOAD
+
+
+def test_empty_array():
+    assert list(iter_json_array(chunked(" [ ] ", 1))) == []
+
+
+def test_is_lazy():
+    chunks = iter(chunked(json.dumps(PAYLOAD), 5))
+    first = next(iter_json_array(chunks))
+    assert first == PAYLOAD[0]
+    assert next(chunks, None) is not None  # rest of the input not consumed yet
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', "[1, 2", "[1 2]", '[{"a": ]'])
+def test_malformed(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(text, 3)))
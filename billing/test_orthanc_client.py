@@ -0,0 +1,106 @@
+import httpx
+import pytest
+
+import orthanc_client
+from duration_utils import ExpandedStudy, studies_for_dates
+from fake_orthanc import Corpus, FakeOrthanc
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeOrthanc(Corpus(days=3, studies_per_day=4)) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return orthanc_client.PooledOrthanc(server.url, retries=0)
+
+
+def test_date_range_query():
+    assert orthanc_client.date_range_query(["20250103"]) == "20250103"
+    assert (
+        orthanc_client.date_range_query(["20250102", "20250101"]) == "20250101-20250102"
+    )
+
+
+@pytest.mark.parametrize("page_size", [1, 5, 12, 1000])
+def test_find_expanded_pages(server, client, page_size):
+    server.stats.reset()
+    records = orthanc_client.find_expanded(
+        client, {"StudyDate": "20250101-20250103"}, page_size=page_size
+    )
+    assert len(records) == 12 and len({r["ID"] for r in records}) == 12
+    assert server.stats.snapshot()["requests"] == 12 // page_size + 1
+
+
+def test_studies_for_dates_groups_without_extra_requests(server, client):
+    server.stats.reset()
+    by_date = studies_for_dates(
+        ["20250101", "20250102", "20250103", "20250104"],
+        client,
+        {"AccessionNumber": "E*"},
+    )
+    assert [len(by_date[d]) for d in sorted(by_date)] == [3, 3, 3, 0]
+
+    study = by_date["20250102"][0]
+    assert isinstance(study, ExpandedStudy)
+    assert study.date.strftime("%Y%m%d%H%M") == "202501020700"
+    assert study.main_dicom_tags["AccessionNumber"] == "E250102000"
+    assert study.patient_information["PatientID"] == "S2025010200"
+    assert server.stats.snapshot()["requests"] == 1
+
+
+def flaky_client(responses, monkeypatch, retries=3, backoff=0):
+    """PooledOrthanc answering from *responses*, a list of status codes and
+    exceptions; returns (client, requests made, sleeps)."""
+    requests, sleeps = [], []
+
+    def handler(request):
+        requests.append(request)
+        outcome = responses[min(len(requests), len(responses)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, json={})
+
+    monkeypatch.setattr(orthanc_client.time, "sleep", sleeps.append)
+    client = orthanc_client.PooledOrthanc(
+        "http://orthanc",
+        retries=retries,
+        backoff=backoff,
+        transport=httpx.MockTransport(handler),
+    )
+    return client, requests, sleeps
+
+
+def test_retries_busy_response(monkeypatch):
+    client, requests, sleeps = flaky_client([503, 200], monkeypatch)
+    assert client.get("http://orthanc/system").status_code == 200
+    assert len(requests) == 2 and sleeps == [0]
+
+
+def test_returns_last_busy_response(monkeypatch):
+    client, requests, sleeps = flaky_client([503, 429, 502, 504], monkeypatch)
+    assert client.get("http://orthanc/system").status_code == 504
+    assert len(requests) == 4  # the first attempt and 3 retries
+
+
+def test_does_not_retry_other_errors(monkeypatch):
+    client, requests, _ = flaky_client([404, 200], monkeypatch)
+    assert client.get("http://orthanc/system").status_code == 404
+    assert len(requests) == 1
+
+
+def test_reraises_transport_error(monkeypatch):
+    error = httpx.ConnectError("connection refused")
+    client, requests, _ = flaky_client([error], monkeypatch, retries=2)
+    with pytest.raises(httpx.ConnectError):
+        client.get("http://orthanc/system")
+    assert len(requests) == 3
+
+
+def test_backoff_doubles(monkeypatch):
+    error = httpx.ReadTimeout("timed out")
+    client, _, sleeps = flaky_client([error, 503, error, 200], monkeypatch, backoff=0.5)
+    assert client.get("http://orthanc/system").status_code == 200
+    assert sleeps == [0.5, 1.0, 2.0]
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import math
+
+import httpx
+import pytest
+import requests
+
+import orthanc_client
+import request_metrics
+from fake_orthanc import Corpus, FakeOrthanc
+from request_metrics import Metrics, operation_name
+
+
+@pytest.mark.parametrize(
+    "method, url, expected",
+    [
+        ("post", "http://vna:8042/tools/find", "POST /tools/find"),
+        (
+            "GET",
+            "http://vna:8042/studies/0a-1b/statistics",
+            "GET /studies/{id}/statistics",
+        ),
+        (
+            "GET",
+            "/instances/0a-1b/content/0008-1110/0/0008-1150",
+            "GET /instances/{id}/content/{tag}",
+        ),
+        (
+            "GET",
+            "https://xnat/data/experiments/X_E1/scans/3?format=json",
+            "GET /data/experiments/{id}/scans/{id}",
+        ),
+        ("GET", "https://xnat/data/experiments?label=E1", "GET /data/experiments"),
+    ],
+)
+def test_operation_name(method, url, expected):
+    assert operation_name(method, url) == expected
+
+
+def test_histogram_and_outputs(tmp_path):
+    metrics = Metrics()
+    for seconds in (0.001, 0.002, 0.2, 60):
+        metrics.observe("vna", "GET /x", seconds, bytes_in=10, bytes_out=1)
+    with pytest.raises(KeyError):
+        with metrics.timed("sqlite", "flush"):
+            raise KeyError
+
+    hot, flush = metrics.snapshot()
+    assert hot["count"] == 4 and hot["bytes_in"] == 40 and hot["buckets"][0] == 2
+    assert hot["buckets"][-1] == 1
+    assert request_metrics.quantile(hot["buckets"], 0.5) == 0.005
+    assert request_metrics.quantile(hot["buckets"], 0.95) == math.inf
+    assert flush["errors"] == 1
+
+    prom = metrics.as_prometheus()
+    assert (
+        'mictools_request_duration_seconds_bucket{target="vna",operation="GET /x",le="+Inf"} 4'
+        in prom
+    )
+    assert 'mictools_response_bytes_total{target="vna",operation="GET /x"} 40' in prom
+
+    metrics.dump(str(tmp_path / "m.json"))
+    data = json.loads((tmp_path / "m.json").read_text())
+    assert data["operations"][0]["buckets"]["0.005"] == 2
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeOrthanc(Corpus(series_per_study=2, instances_per_series=3)) as server:
+        yield server
+
+
+def test_pooled_orthanc_records_plain_and_streamed(server, monkeypatch):
+    metrics = Metrics()
+    monkeypatch.setattr(request_metrics, "METRICS", metrics)
+    client = orthanc_client.PooledOrthanc(server.url, retries=0)
+
+    (study_id,) = client.post_tools_find(
+        {"Level": "Study", "Query": {"AccessionNumber": "E250101000"}}
+    )
+    with client.stream(
+        "POST",
+        client.url + "/tools/bulk-content",
+        json={"Resources": [study_id], "Level": "Instance"},
+    ) as response:
+        body = response.read()
+
+    rows = {row["operation"]: row for row in metrics.snapshot()}
+    assert rows["POST /tools/find"]["count"] == 1
+    assert rows["POST /tools/bulk-content"]["bytes_in"] == len(body)
+    assert rows["POST /tools/bulk-content"]["bytes_out"] > 0
+
+
+def test_instrument_session(server):
+    metrics = Metrics()
+    session = request_metrics.instrument_session(requests.Session(), metrics)
+    session.get(server.url + "/studies/00000000-00000000-00000000-00000000-00000000")
+
+    (row,) = metrics.snapshot()
+    assert row["target"] == "127.0.0.1"
+    assert row["operation"] == "GET /studies/{id}"
+    assert row["errors"] == 1
+
+
+def test_instrument_async_client(server):
+    metrics = Metrics()
+
+    async def fetch():
+        async with httpx.AsyncClient(base_url=server.url) as client:
+            request_metrics.instrument_async_client(client, metrics)
+            response = await client.post(
+                "/tools/find", json={"Level": "Study", "Query": {}}
+            )
+            return response.content
+
+    body = asyncio.run(fetch())
+    (row,) = metrics.snapshot()
+    assert row["operation"] == "POST /tools/find"
+    assert (row["count"], row["errors"], row["bytes_in"]) == (1, 0, len(body))
+    assert row["bytes_out"] > 0
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+import rollups
+from rollups import SarSketch
+from study_info_db import get_db_connection
+
+
+def test_sketch_quantiles_merge_and_round_trip():
+    rng = random.Random(1)
+    values = [rng.uniform(0.01, 3.2) for _ in range(2000)]
+    left, right = SarSketch(), SarSketch()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+    merged = SarSketch.from_json(left.to_json()).merge(right)
+
+    assert merged.count == len(values)
+    values.sort()
+    for q in (0.05, 0.5, 0.95):
+        exact = values[int(q * (len(values) - 1))]
+        assert merged.quantile(q) == pytest.approx(exact, rel=0.03)
+    assert SarSketch().quantile(0.5) is None
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = get_db_connection(str(tmp_path / "study_info.db"))
+    studies = [
+        ("E1", "Prisma", "Protocol0", "20250101", 3600),
+        ("E2", "Prisma", "Protocol0", "20250101", 1800),
+        ("E3", "Skyra", None, "20250101", None),
+        ("E4", "Prisma", "Protocol0", "20250202", 900),
+    ]
+    conn.executemany(
+        "INSERT INTO studies (accession, manufacturer_model, study_description, "
+        "study_date, wall_seconds) VALUES (?, ?, ?, ?, ?)",
+        studies,
+    )
+    conn.executemany(
+        "INSERT INTO series (series_uid, accession, sar, duration) VALUES (?, ?, ?, ?)",
+        [
+            ("1.1", "E1", 0.5, 300),
+            ("1.2", "E1", 1.5, 600),
+            ("2.1", "E2", 1.0, 120),
+            ("3.1", "E3", 0.2, 60),
+            ("4.1", "E4", 2.0, 240),
+        ],
+    )
+    conn.commit()
+    rollups.rebuild(conn)
+    yield conn
+    conn.close()
+
+
+def test_query_groups_days(conn):
+    prisma, skyra = rollups.query(conn, "20250101", "20250131", by=("scanner",))
+    assert prisma["scanner"] == "Prisma" and skyra["scanner"] == "Skyra"
+    assert (prisma["studies"], prisma["study_seconds"]) == (2, 5400)
+    assert (prisma["series"], prisma["series_seconds"]) == (3, 1020)
+    assert prisma["sar"].quantile(0.5) == pytest.approx(1.0, rel=0.01)
+    assert (skyra["studies"], skyra["study_seconds"], skyra["series"]) == (1, 0, 1)
+
+    quarter = rollups.query(
+        conn, *rollups.date_range("202501", "202503"), by=("protocol",)
+    )
+    assert [(g["protocol"], g["series"]) for g in quarter] == [
+        ("", 1),
+        ("Protocol0", 4),
+    ]
+    assert quarter[1]["sar"].count == 4
+
+    months = rollups.query(conn, "20250101", "20250228", by=("month",))
+    assert [m["month"] for m in months] == ["202501", "202502"]
+
+
+def test_refresh_days_follows_changes(conn):
+    with conn:
+        days = rollups.days_of_accessions(conn, ["E2"])
+        conn.execute("DELETE FROM series WHERE accession = 'E2'")
+        conn.execute(
+            "UPDATE studies SET study_date = '20250202' WHERE accession = 'E2'"
+        )
+        days |= rollups.days_of_accessions(conn, ["E2"])
+        rollups.refresh_days(conn, days)
+
+    assert days == {"20250101", "20250202"}
+    jan = {g["scanner"]: g for g in rollups.query(conn, "20250101", "20250101")}
+    assert (jan["Prisma"]["studies"], jan["Prisma"]["series"]) == (1, 2)
+    (feb,) = rollups.query(conn, "20250202", "20250202")
+    assert (feb["studies"], feb["study_seconds"], feb["series"]) == (2, 2700, 1)
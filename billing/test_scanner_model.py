@@ -0,0 +1,79 @@
+import pytest
+
+import orthanc_client
+from fake_orthanc import Corpus, FakeOrthanc
+from scanner_model import ScannerModelResolver, header_value
+
+
+class Element:
+    def __init__(self, value):
+        self.value = value
+
+
+class Header(dict):
+    def get(self, key, default=None):
+        return Element(self[key]) if key in self else default
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeOrthanc(Corpus(studies_per_day=4, series_per_study=3)) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return orthanc_client.PooledOrthanc(server.url, retries=0)
+
+
+def series_of(client, accession):
+    (study,) = orthanc_client.find_expanded(client, {"AccessionNumber": accession})
+    return client.post_tools_bulk_content(
+        {"Resources": [study["ID"]], "Level": "Series"}
+    )
+
+
+def test_header_value():
+    assert header_value(Header({"0008,1090": " Prisma "}), "0008,1090") == "Prisma"
+    assert header_value(Header({(0x0008, 0x1090): "Prisma"}), "0008,1090") == "Prisma"
+    assert header_value(Header({"0008,1090": ""}), "0008,1090") is None
+
+
+def test_headers_and_series_tags_need_no_requests(server, client):
+    resolver = ScannerModelResolver(client)
+    series = series_of(client, "E250101000")
+    server.stats.reset()
+
+    assert resolver.resolve(series, [None, Header({"0008,1090": "Skyra"})]) == "Skyra"
+    tagged = [
+        dict(s, MainDicomTags=dict(s["MainDicomTags"], ManufacturerModelName="Trio"))
+        for s in series
+    ]
+    assert ScannerModelResolver(client).resolve(tagged) == "Trio"
+    assert server.stats.snapshot()["requests"] == 0
+
+
+def test_sampling_is_bounded_and_memoized_per_station(server, client):
+    resolver = ScannerModelResolver(client)
+    first, same_station = series_of(client, "E250101000"), series_of(
+        client, "E250101002"
+    )
+    server.stats.reset()
+
+    # the corpus' localizers lack the model, so one request per series at most
+    assert resolver.resolve(first) == "MAGNETOM Prisma Fit"
+    assert server.stats.snapshot()["requests"] <= len(first)
+
+    server.stats.reset()
+    assert resolver.resolve(same_station) == "MAGNETOM Prisma Fit"
+    assert server.stats.snapshot()["requests"] == 0
+
+
+def test_unresolvable(client):
+    series = [
+        {
+            "MainDicomTags": {},
+            "Instances": ["00000000-00000000-00000000-00000000-00000000"],
+        }
+    ]
+    assert ScannerModelResolver(client).resolve(series) is None
@@ -0,0 +1,234 @@
+import json
+
+import pytest
+
+from fake_orthanc import Corpus, FakeOrthanc
+from study_info_db import get_db_connection
+
+
+@pytest.fixture(scope="module")
+def server():
+    with FakeOrthanc(Corpus(days=2, studies_per_day=4, series_per_study=3)) as server:
+        yield server
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = get_db_connection(str(tmp_path / "study_info.db"))
+    yield conn
+    conn.close()
+
+
+def stored(conn):
+    return {row[0] for row in conn.execute("SELECT accession FROM studies")}
+
+
+def accession_of(server, study_id):
+    return server.corpus.studies[study_id]["MainDicomTags"]["AccessionNumber"]
+
+
+class StopFollowing(Exception):
+    pass
+
+
+def fail_study(store_study_info, server, monkeypatch, study_id):
+    """Make fetching any header of *study_id* fail."""
+    fetch = store_study_info.fetch_instance_tags
+    corpus = server.corpus
+
+    def fetch_instance_tags(instance_id):
+        series_id = corpus.instances[instance_id]["ParentSeries"]
+        if corpus.series[series_id]["ParentStudy"] == study_id:
+            raise RuntimeError("unreadable")
+        return fetch(instance_id)
+
+    monkeypatch.setattr(store_study_info, "fetch_instance_tags", fetch_instance_tags)
+
+
+def follow(store_study_info, conn, monkeypatch, polls=1, **kwargs):
+    """Run follow_changes until it has waited for new changes *polls* times."""
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        if len(waits) == polls:
+            raise StopFollowing
+
+    monkeypatch.setattr(store_study_info.time, "sleep", sleep)
+    with pytest.raises(StopFollowing):
+        store_study_info.follow_changes(conn, poll_interval=0, **kwargs)
+
+
+def saved_state(store_study_info, conn):
+    return (
+        int(store_study_info.get_state(conn, store_study_info.CHANGES_SEQ_KEY)),
+        json.loads(
+            store_study_info.get_state(conn, store_study_info.CHANGES_RETRY_KEY)
+        ),
+    )
+
+
+def test_follow_skips_only_the_failing_study(
+    store_study_info, server, conn, monkeypatch
+):
+    corpus = server.corpus
+    research = {
+        study["MainDicomTags"]["AccessionNumber"]
+        for study in corpus.studies.values()
+        if study["MainDicomTags"]["AccessionNumber"].startswith("E")
+    }
+    bad = corpus.changes[1]["ID"]  # in the middle of the first batch
+    monkeypatch.setattr(store_study_info, "CHANGES_BATCH", 3)
+
+    with monkeypatch.context() as m:
+        fail_study(store_study_info, server, m, bad)
+        follow(store_study_info, conn, m, since=0)
+    assert stored(conn) == research - {accession_of(server, bad)}
+    assert saved_state(store_study_info, conn) == (len(corpus.changes), {bad: 1})
+
+    # Resumes from the saved position, retrying the study that failed.
+    server.stats.reset()
+    follow(store_study_info, conn, monkeypatch)
+    assert stored(conn) == research
+    assert saved_state(store_study_info, conn) == (len(corpus.changes), {})
+    routes = server.stats.snapshot()["routes"]
+    assert routes["POST /tools/bulk-content"]["requests"] == 2  # study, series
+    assert routes["GET /changes"]["requests"] == 1
+
+
+def test_follow_gives_up_on_a_study(store_study_info, server, conn, monkeypatch):
+    bad = server.corpus.changes[0]["ID"]
+    fail_study(store_study_info, server, monkeypatch, bad)
+    attempts = store_study_info.MAX_STUDY_ATTEMPTS
+
+    follow(store_study_info, conn, monkeypatch, polls=attempts - 1, since=0)
+    assert saved_state(store_study_info, conn)[1] == {bad: attempts - 1}
+    follow(store_study_info, conn, monkeypatch)
+    assert saved_state(store_study_info, conn)[1] == {}
+    assert accession_of(server, bad) not in stored(conn)
+
+
+def rows(conn, table):
+    return sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+
+
+def test_process_date_arg_stores_rows(store_study_info, server, conn):
+    store_study_info.process_date_arg("20250101", conn)
+
+    assert stored(conn) == {"E250101000", "E250101001", "E250101002"}
+    study = conn.execute(
+        "SELECT patient_id, age, height, weight, sex, body_part, "
+        "manufacturer_model, study_date, study_description, wall_seconds "
+        "FROM studies WHERE accession = 'E250101001'"
+    ).fetchone()
+    assert study == (
+        "S2025010101",
+        21,
+        1.75,
+        70.0,
+        "O",
+        "BRAIN",
+        "Prisma",
+        "20250101",
+        "Investigators^Protocol1",
+        974,  # 08:15 to the end of the third series, 08:27 + 4:14
+    )
+    series = conn.execute(
+        "SELECT series_number, sar, duration, series_description, "
+        "pulse_sequence_name, sequence_name, repetition_time FROM series "
+        "WHERE accession = 'E250101001' ORDER BY series_number"
+    ).fetchall()
+    assert series == [
+        (1, 0.05, 120, "localizer", "fl2d1", "*fl2d1", 8.6),
+        (2, 0.15, 187, "T1w_MPR", "tfl3d1_16ns", "*tfl3d1_16ns", 2400.0),
+        (3, 0.25, 254, "T2w_SPC", "spc_314ns", "*spc_314ns", 3200.0),
+    ]
+
+
+def test_stored_studies_and_series_are_skipped(store_study_info, server, conn):
+    store_study_info.process_date_arg("202501", conn)
+    before = rows(conn, "studies"), rows(conn, "series")
+    assert len(before[0]) == 6 and len(before[1]) == 18
+
+    server.stats.reset()
+    skipped = []
+    store_study_info.process_date_arg("202501", conn, _skip_cb=skipped.append)
+    assert sorted(skipped) == sorted(stored(conn))
+    assert (rows(conn, "studies"), rows(conn, "series")) == before
+    assert server.stats.snapshot()["routes"].keys() == {"POST /tools/find"}
+
+    writer = store_study_info.StudyInfoWriter(conn)
+    writer.preload(store_study_info.studies_for_date("20250101"))
+    uid = conn.execute(
+        "SELECT series_uid FROM series WHERE accession = 'E250101000'"
+    ).fetchone()[0]
+    assert writer.has_accession("E250101000")
+    assert not writer.has_accession("E250102000")  # not preloaded
+    assert not writer.add_series((uid, "E250101000") + (None,) * 7)
+
+
+def test_stored_study_with_another_date_is_skipped(store_study_info, server, conn):
+    store_study_info.process_date_arg("20250101", conn)
+    with conn:
+        conn.execute(
+            "UPDATE studies SET study_date = NULL WHERE accession = 'E250101000'"
+        )
+        conn.execute(
+            "UPDATE studies SET study_date = '20240101' WHERE accession = 'E250101001'"
+        )
+
+    server.stats.reset()
+    skipped = []
+    store_study_info.process_date_arg("20250101", conn, _skip_cb=skipped.append)
+    assert sorted(skipped) == ["E250101000", "E250101001", "E250101002"]
+    assert server.stats.snapshot()["routes"].keys() == {"POST /tools/find"}
+
+
+def test_force_purges_and_reinserts(store_study_info, server, conn):
+    store_study_info.process_date_arg("20250101", conn)
+    before = rows(conn, "studies"), rows(conn, "series")
+
+    with conn:
+        conn.execute("UPDATE studies SET body_part = 'KNEE', wall_seconds = NULL")
+        conn.execute("DELETE FROM series WHERE series_number = 2")
+        conn.execute(
+            "INSERT INTO series (series_uid, accession, sar, duration) "
+            "VALUES ('1.2.3', 'E250101000', 9.9, 1)"
+        )
+    store_study_info.process_date_arg("20250101", conn, force=True)
+    assert (rows(conn, "studies"), rows(conn, "series")) == before
+
+
+def test_failed_flush_rolls_back(store_study_info, server, conn, monkeypatch):
+    store_study_info.process_date_arg("20250101", conn)
+    before = rows(conn, "studies"), rows(conn, "series"), rows(conn, "rollup_daily")
+
+    def refresh_days(conn, days):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(store_study_info.rollups, "refresh_days", refresh_days)
+    with pytest.raises(RuntimeError):
+        store_study_info.process_date_arg("202501", conn, force=True)
+    after = rows(conn, "studies"), rows(conn, "series"), rows(conn, "rollup_daily")
+    assert after == before
+
+
+def test_flush_refreshes_rollups_of_affected_days(
+    store_study_info, server, conn, monkeypatch
+):
+    refresh_days = store_study_info.rollups.refresh_days
+    refreshed = []
+
+    def spy(conn, days):
+        refreshed.append(set(days))
+        refresh_days(conn, days)
+
+    monkeypatch.setattr(store_study_info.rollups, "refresh_days", spy)
+    store_study_info.process_date_arg("202501", conn)
+    store_study_info.process_date_arg("202501", conn)  # nothing to write
+    store_study_info.store_study("E250102001", conn, force=True)
+    assert refreshed == [{"20250101", "20250102"}, {"20250102"}]
+
+    incremental = rows(conn, "rollup_daily")
+    store_study_info.rollups.rebuild(conn)
+    assert rows(conn, "rollup_daily") == incremental
@@ -1,15 +1,34 @@
 # app.py
 
-from flask import Flask, render_template, request, jsonify, Response
-import requests
+from flask import (
+    Flask,
+    render_template,
+    request,
+    jsonify,
+    Response,
+    stream_with_context,
+)
+import asyncio
+import httpx
+import json
+import os
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from passlib.apache import HtpasswdFile
 
+import check_cache
+import request_metrics
+import vnalib
+
 app = Flask(__name__)
 
-# HTTP Basic Auth backed by .htpasswd (Apache htpasswd format)
-HTPASSWD_PATH = Path(__file__).with_name(".htpasswd")
+# HTTP Basic Auth backed by .htpasswd (Apache htpasswd format), or the file
+# named by HTPASSWD_PATH
+HTPASSWD_PATH = Path(
+    os.environ.get("HTPASSWD_PATH", Path(__file__).with_name(".htpasswd"))
+)
 _htpasswd = HtpasswdFile(str(HTPASSWD_PATH))
 
 
@@ -24,157 +43,205 @@ def require_basic_auth():
             {"WWW-Authenticate": 'Basic realm="compare-vnas"'},
         )
 
-# Constants
-XNAT_BASE_URL = "https://iris.mclean.harvard.edu"
-ORTHANC_URL = "http://micvna.mclean.harvard.edu:8042"
 
-# Session objects
-xs = requests.Session()
-os = requests.Session()
+# Recent accessions listed on the index page, see RecentAccessions
+RECENT_DAYS = 3
+RECENT_REFRESH_SECONDS = 300  # full re-read of the window
+RECENT_POLL_SECONDS = 10  # /changes polling in between
+RECENT_TTL_SECONDS = 900  # drop entries no refresh has seen for this long
+RECENT_FIRST_WAIT_SECONDS = 30  # first page load waits for the first pass
+
+# XNAT and Orthanc requests of all page loads and checks share one engine,
+# with its connection pools and concurrency limits (see vnalib); every request
+# is recorded for /metrics
+VNA = vnalib.BlockingEngine()
+
+
+class RecentAccessions:
+    """In-memory index of the "Investigators" accessions of the last few days.
+
+    A daemon thread keeps it current so that pages render from memory: every
+    *refresh_seconds* it re-reads the whole window with one expanded
+    /tools/find, and in between it polls Orthanc's /changes every
+    *poll_seconds* and looks up only the studies that changed.  Entries leave
+    the index once their study date falls out of the window, or when no
+    refresh has seen them for *ttl_seconds* (e.g. deleted studies).
+    """
+
+    def __init__(
+        self,
+        days=RECENT_DAYS,
+        refresh_seconds=RECENT_REFRESH_SECONDS,
+        poll_seconds=RECENT_POLL_SECONDS,
+        ttl_seconds=RECENT_TTL_SECONDS,
+    ):
+        self.days = days
+        self.refresh_seconds = refresh_seconds
+        self.poll_seconds = poll_seconds
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = {}  # accession -> (StudyDate, StudyTime, last seen)
+        self._last_change = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def snapshot(self, wait=RECENT_FIRST_WAIT_SECONDS):
+        """Return [(display date, accession)], newest day first.
+
+        Starts the refresh thread on first use and waits up to *wait* seconds
+        for its first pass.
+        """
+        self._start()
+        self._ready.wait(wait)
+        first_date = self._first_date()
+        with self._lock:
+            entries = [
+                (study_date, study_time, accession)
+                for accession, (study_date, study_time, _) in self._entries.items()
+                if study_date >= first_date
+            ]
+        entries.sort(key=lambda e: (-int(e[0]), e[1], e[2]))
+        return [
+            (datetime.strptime(study_date, "%Y%m%d").strftime("%a %d"), accession)
+            for study_date, _, accession in entries
+        ]
 
+    def refresh(self):
+        """Re-read every study of the window."""
+        # /changes before the query: nothing slips by
+        last_change = VNA.call(vnalib.Engine.get_changes)["Last"]
+        studies = VNA.call(vnalib.Engine.query_studies, f"{self._first_date()}-", True)
+        for study in studies:
+            self._add(study)
+        self._last_change = last_change
+
+    def poll_changes(self):
+        """Look up the studies changed since the last refresh or poll."""
+        changed = []
+        while True:
+            changes = VNA.call(vnalib.Engine.get_changes, self._last_change)
+            changed.extend(
+                change["ID"]
+                for change in changes["Changes"]
+                if change["ResourceType"] == "Study"
+            )
+            self._last_change = changes["Last"]
+            if changes["Done"]:
+                break
+        for study_id in dict.fromkeys(changed):
+            try:
+                self._add(VNA.call(vnalib.Engine.get_study_details, study_id))
+            except httpx.HTTPStatusError:
+                pass  # deleted meanwhile
+
+    def _add(self, study):
+        main_dicom_tags = study.get("MainDicomTags", {})
+        study_date = main_dicom_tags.get("StudyDate", "")
+        accession_number = main_dicom_tags.get("AccessionNumber", "")
+        if (
+            accession_number
+            and main_dicom_tags.get("StudyDescription", "").startswith("Investigators")
+            and study_date >= self._first_date()
+        ):
+            with self._lock:
+                self._entries[accession_number] = (
+                    study_date,
+                    main_dicom_tags.get("StudyTime", ""),
+                    time.monotonic(),
+                )
 
-def query_studies(study_date):
-    url = f"{ORTHANC_URL}/tools/find"
-    query_payload = {"Level": "Study", "Query": {"StudyDate": study_date}}
-    response = os.post(url, json=query_payload)
-    response.raise_for_status()  # Ensure we get a successful response
-    return response.json()
+    def _evict(self):
+        first_date = self._first_date()
+        expired = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            for accession, (study_date, _, seen) in list(self._entries.items()):
+                if study_date < first_date or seen < expired:
+                    del self._entries[accession]
+
+    def _first_date(self):
+        return (datetime.now() - timedelta(days=self.days - 1)).strftime("%Y%m%d")
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="recent-accessions", daemon=True
+                )
+                self._thread.start()
 
+    def _run(self):
+        next_refresh = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_refresh or self._last_change is None:
+                    self.refresh()
+                    next_refresh = time.monotonic() + self.refresh_seconds
+                else:
+                    self.poll_changes()
+                self._evict()
+            except Exception:
+                # keep serving what we have; retried on the next pass
+                app.logger.exception("Refreshing the recent accessions failed")
+            self._ready.set()
+            time.sleep(self.poll_seconds)
 
-def get_study_details(study_id):
-    url = f"{ORTHANC_URL}/studies/{study_id}"
-    response = os.get(url)
-    response.raise_for_status()
-    return response.json()
 
+RECENT = RecentAccessions()
 
-def get_recent_accession_numbers():
-    accession_numbers = []
-    for days_ago in range(3):
-        study_date = (datetime.now() - timedelta(days=days_ago)).strftime("%Y%m%d")
-        display_date = (datetime.now() - timedelta(days=days_ago)).strftime("%a %d")
-        study_ids = query_studies(study_date)
-        for study_id in study_ids:
-            study_details = get_study_details(study_id)
-            study_description = study_details.get("MainDicomTags", {}).get(
-                "StudyDescription", ""
-            )
-            if study_description.startswith("Investigators"):
-                accession_number = study_details.get("MainDicomTags", {}).get(
-                    "AccessionNumber", ""
-                )
-                if accession_number:
-                    accession_numbers.append((display_date, accession_number))
-
-    return accession_numbers
-
-
-def get_xnat_experiment_id(accession_number):
-    response = xs.get(f"{XNAT_BASE_URL}/data/experiments?label={accession_number}")
-    if response.status_code == 200:
-        experiment_data = response.json()
-        if experiment_data["ResultSet"]["Result"]:
-            return experiment_data["ResultSet"]["Result"][0]["ID"]
-    return None
-
-
-def get_xnat_scans(experiment_id):
-    response = xs.get(f"{XNAT_BASE_URL}/data/experiments/{experiment_id}/scans")
-    if response.status_code == 200:
-        return response.json()["ResultSet"]["Result"]
-    return []
-
-
-def get_xnat_frames(scan_uri):
-    response = xs.get(f"{XNAT_BASE_URL}{scan_uri}?format=json")
-    if response.status_code == 200:
-        scan_info = response.json()
-        children = scan_info["items"][0].get("children", [])
-        for child in children:
-            if "data_fields" in child["items"][0]:
-                file_count = child["items"][0]["data_fields"].get("file_count")
-                if file_count is not None:
-                    return file_count
-    return "N/A"
-
-
-def get_orthanc_study_id(accession_number):
-    query = {"Level": "Study", "Query": {"AccessionNumber": accession_number}}
-    response = os.post(f"{ORTHANC_URL}/tools/find", json=query)
-    if response.status_code == 200:
-        study_ids = response.json()
-        if study_ids:
-            return study_ids[0]
-    return None
-
-
-def get_orthanc_series_ids(study_id):
-    response = os.get(f"{ORTHANC_URL}/studies/{study_id}")
-    if response.status_code == 200:
-        return response.json().get("Series", [])
-    return []
-
-
-def get_orthanc_series_info(series_id):
-    response = os.get(f"{ORTHANC_URL}/series/{series_id}")
-    if response.status_code == 200:
-        series_info = response.json()
-        main_dicom_tags = series_info.get("MainDicomTags", {})
-        series_number = main_dicom_tags.get("SeriesNumber", "N/A")
-        series_description = main_dicom_tags.get("SeriesDescription", "N/A")
-        instances = series_info.get("Instances", [])
-        return str(series_number), series_description, len(instances)
-    return None, None, 0
-
-
-def compare_scans(xnat_scans, orthanc_scans):
-    combined_results = {}
-
-    for scan in xnat_scans:
-        scan_id = scan["ID"]
-        frames = get_xnat_frames(scan["URI"])
-        combined_results[scan_id] = {
-            "xnat_description": scan["series_description"],
-            "xnat_frames": frames,
-            "orthanc_description": "MISSING",
-            "orthanc_frames": "MISSING",
-        }
-
-    for series_number, series_description, num_instances in orthanc_scans:
-        scan_id = str(series_number)
-        if scan_id in combined_results:
-            combined_results[scan_id]["orthanc_description"] = series_description
-            combined_results[scan_id]["orthanc_frames"] = num_instances
-        else:
-            combined_results[scan_id] = {
-                "xnat_description": "MISSING",
-                "xnat_frames": "MISSING",
-                "orthanc_description": series_description,
-                "orthanc_frames": num_instances,
-            }
 
-    return sorted(combined_results.items(), key=lambda x: int(x[0].split("-")[0]))
+# /check results
+CHECK_CACHE = check_cache.CheckCache()
 
 
-def check_accession_number(accession_number):
-    xnat_experiment_id = get_xnat_experiment_id(accession_number)
-    xnat_scans = get_xnat_scans(xnat_experiment_id) if xnat_experiment_id else []
+async def fetch_accession(engine, accession_number):
+    """Return (XNAT experiment, Orthanc study, its instance count)."""
+
+    async def fetch_orthanc():
+        study = await engine.get_orthanc_study(accession_number)
+        if study is None:
+            return None, None
+        return study, await engine.get_orthanc_instance_count(study["ID"])
+
+    experiment, (study, instance_count) = await asyncio.gather(
+        engine.get_xnat_experiment(accession_number), fetch_orthanc()
+    )
+    return experiment, study, instance_count
+
+
+def lookup_accession(accession_number):
+    """Return (XNAT experiment, Orthanc study, fingerprint for CheckCache)."""
+    experiment, study, instance_count = VNA.call(fetch_accession, accession_number)
+    fingerprint = check_cache.check_fingerprint(experiment, study, instance_count)
+    return experiment, study, fingerprint
 
-    orthanc_study_id = get_orthanc_study_id(accession_number)
-    if orthanc_study_id:
-        orthanc_series_ids = get_orthanc_series_ids(orthanc_study_id)
-        orthanc_scans = [
-            get_orthanc_series_info(series_id) for series_id in orthanc_series_ids
-        ]
-    else:
-        orthanc_scans = []
 
-    return compare_scans(xnat_scans, orthanc_scans)
+def iter_scan_rows(experiment, study):
+    """Yield the rows of vnalib.Engine.scan_rows as they become known."""
+    return VNA.iterate(vnalib.Engine.scan_rows, experiment, study)
+
+
+def check_accession_number(accession_number, force=False):
+    """Return (results, cached) for *accession_number*; *force* skips the cache."""
+    experiment, study, fingerprint = lookup_accession(accession_number)
+    if not force:
+        results = CHECK_CACHE.get(accession_number, fingerprint)
+        if results is not None:
+            return results, True
+
+    results = sorted(iter_scan_rows(experiment, study), key=vnalib.scan_sort_key)
+    CHECK_CACHE.put(
+        accession_number, fingerprint, results, stable=bool(study and study["IsStable"])
+    )
+    return results, False
+
+
+def server_sent_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
 @app.route("/")
 def index():
-    recent_accession_numbers = get_recent_accession_numbers()
+    recent_accession_numbers = RECENT.snapshot()
     return render_template(
         "index.html", recent_accession_numbers=recent_accession_numbers
     )
@@ -183,8 +250,55 @@ def index():
 @app.route("/check", methods=["POST"])
 def check():
     accession_number = request.form["accession_number"]
-    results = check_accession_number(accession_number)
-    return jsonify({"results": results})
+    force = request.form.get("force", "").lower() in ("1", "true", "on", "yes")
+    results, cached = check_accession_number(accession_number, force=force)
+    return jsonify({"results": results, "cached": cached})
+
+
+@app.route("/check/stream")
+def check_stream():
+    """Stream the rows of a check as Server-Sent Events.
+
+    Sends a "row" event per series as soon as it is known (see
+    iter_scan_rows), then "done" with {"cached": ...}.
+    """
+    accession_number = request.args["accession_number"]
+    force = request.args.get("force", "").lower() in ("1", "true", "on", "yes")
+
+    def events():
+        experiment, study, fingerprint = lookup_accession(accession_number)
+        results = None if force else CHECK_CACHE.get(accession_number, fingerprint)
+        cached = results is not None
+        if cached:
+            for row in results:
+                yield server_sent_event("row", row)
+        else:
+            results = []
+            for row in iter_scan_rows(experiment, study):
+                results.append(row)
+                yield server_sent_event("row", row)
+            results.sort(key=vnalib.scan_sort_key)
+            CHECK_CACHE.put(
+                accession_number,
+                fingerprint,
+                results,
+                stable=bool(study and study["IsStable"]),
+            )
+        yield server_sent_event("done", {"cached": cached})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(
+        request_metrics.METRICS.as_prometheus(),
+        mimetype="text/plain; version=0.0.4",
+    )
 
 
 if __name__ == "__main__":
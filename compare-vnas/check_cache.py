@@ -0,0 +1,77 @@
+"""Cache of app.py's /check results, see :class:`CheckCache`."""
+
+import threading
+import time
+from collections import OrderedDict
+
+import vnalib
+
+CHECK_CACHE_SIZE = 256
+CHECK_STABLE_TTL_SECONDS = 3600
+# for studies Orthanc does not consider stable, and for results that do not
+# match yet (XNAT routinely lags behind Orthanc)
+CHECK_ARRIVING_TTL_SECONDS = 60
+
+
+def check_fingerprint(experiment, study, instance_count):
+    """Return the fingerprint of both sides of a check.
+
+    *experiment* is the XNAT experiment (with last_modified) or None, *study*
+    the expanded Orthanc study or None, and *instance_count* the study's
+    CountInstances.
+    """
+    return (
+        experiment and (experiment["ID"], experiment.get("last_modified")),
+        study and (study["ID"], study["LastUpdate"], instance_count),
+    )
+
+
+class CheckCache:
+    """LRU cache of comparison results keyed by accession number.
+
+    Each entry carries a fingerprint of both sides (see check_fingerprint).
+    These take three small requests to read, against one or more requests
+    per series for a full comparison.  An entry is used only while the
+    fingerprint is unchanged and it is younger than *stable_ttl* seconds, or
+    *arriving_ttl* for studies Orthanc does not consider stable yet and for
+    results with a mismatched or missing series.
+    """
+
+    def __init__(
+        self,
+        max_entries=CHECK_CACHE_SIZE,
+        stable_ttl=CHECK_STABLE_TTL_SECONDS,
+        arriving_ttl=CHECK_ARRIVING_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.stable_ttl = stable_ttl
+        self.arriving_ttl = arriving_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # accession -> (fingerprint, expires, results)
+
+    def get(self, accession_number, fingerprint):
+        with self._lock:
+            entry = self._entries.get(accession_number)
+            if entry is None:
+                return None
+            cached_fingerprint, expires, results = entry
+            if cached_fingerprint != fingerprint or time.monotonic() >= expires:
+                del self._entries[accession_number]
+                return None
+            self._entries.move_to_end(accession_number)
+            return results
+
+    def put(self, accession_number, fingerprint, results, stable):
+        """Store the (scan ID, info) rows *results*; *stable* is Orthanc's
+        IsStable."""
+        settled = stable and not any(vnalib.mismatched(info) for _, info in results)
+        ttl = self.stable_ttl if settled else self.arriving_ttl
+        with self._lock:
+            self._entries[accession_number] = (
+                fingerprint,
+                time.monotonic() + ttl,
+                results,
+            )
+            self._entries.move_to_end(accession_number)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
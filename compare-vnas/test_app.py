@@ -0,0 +1,319 @@
+import base64
+import json
+from datetime import datetime
+
+import httpx
+import pytest
+from passlib.apache import HtpasswdFile
+
+import check_cache
+import vnalib
+
+NOW = datetime(2025, 1, 3, 12, 0)  # RECENT_DAYS back: 20250101
+
+
+class FakeVNA(vnalib.BlockingEngine):
+    """BlockingEngine whose Orthanc and XNAT are the *orthanc* and *xnat*
+    httpx.MockTransport handlers."""
+
+    def __init__(self, orthanc, xnat):
+        super().__init__()
+        self.handlers = {"orthanc": orthanc, "xnat": xnat}
+
+    async def _new_engine(self):
+        engine = vnalib.Engine("http://xnat", "http://orthanc")
+        for name, handler in self.handlers.items():
+            server = getattr(engine, name)
+            await server.client.aclose()
+            server.client = httpx.AsyncClient(
+                base_url=f"http://{name}", transport=httpx.MockTransport(handler)
+            )
+        return engine
+
+
+def ok(payload):
+    return httpx.Response(200, json=payload)
+
+
+class Orthanc:
+    """Studies, their series and /changes, as Orthanc serves them."""
+
+    def __init__(self):
+        self.studies = {}
+        self.series = {}
+        self.changes = []
+        self.requests = []
+
+    def add_study(self, accession, study_date, description="Investigators^X"):
+        study_id = f"s-{accession}"
+        self.studies[study_id] = {
+            "ID": study_id,
+            "IsStable": True,
+            "LastUpdate": "20250103T120000",
+            "MainDicomTags": {
+                "AccessionNumber": accession,
+                "StudyDate": study_date,
+                "StudyTime": "090000",
+                "StudyDescription": description,
+            },
+            "Series": [],
+        }
+        self.change(study_id)
+        return study_id
+
+    def add_series(self, study_id, number, description, instances):
+        series_id = f"{study_id}-{number}"
+        self.series[series_id] = {
+            "ID": series_id,
+            "MainDicomTags": {
+                "SeriesNumber": str(number),
+                "SeriesDescription": description,
+            },
+            "Instances": [f"{series_id}-{i}" for i in range(instances)],
+        }
+        self.studies[study_id]["Series"].append(series_id)
+
+    def delete(self, study_id):
+        del self.studies[study_id]
+        self.change(study_id, "Deleted")
+
+    def change(self, study_id, change_type="StableStudy"):
+        self.changes.append(
+            {
+                "ChangeType": change_type,
+                "ID": study_id,
+                "ResourceType": "Study",
+                "Seq": len(self.changes) + 1,
+            }
+        )
+
+    def __call__(self, request):
+        path, params = request.url.path, request.url.params
+        self.requests.append(f"{request.method} {path}")
+        if path == "/changes":
+            since = len(self.changes) if "last" in params else int(params["since"])
+            return ok(
+                {
+                    "Changes": self.changes[since:],
+                    "Done": True,
+                    "Last": len(self.changes),
+                }
+            )
+        if path == "/tools/find":
+            query = json.loads(request.content)["Query"]
+            return ok([s for s in self.studies.values() if self.matches(s, query)])
+        parts = path.strip("/").split("/")
+        study = self.studies.get(parts[1])
+        if study is None:
+            return httpx.Response(404, json={"HttpStatus": 404})
+        if len(parts) == 2:
+            return ok(study)
+        series = [self.series[series_id] for series_id in study["Series"]]
+        if parts[2] == "statistics":
+            return ok({"CountInstances": sum(len(s["Instances"]) for s in series)})
+        return ok(series)
+
+    @staticmethod
+    def matches(study, query):
+        tags = study["MainDicomTags"]
+        for name, value in query.items():
+            if value.endswith("-"):
+                if tags[name] < value[:-1]:
+                    return False
+            elif tags[name] != value:
+                return False
+        return True
+
+
+# scan ID -> (description, frames) of the one XNAT experiment, E1
+XNAT_SCANS = {"1": ("localizer", 3), "2": ("T1w_MPR", 175), "99": ("Report", 1)}
+
+
+def xnat(request):
+    path = request.url.path
+    if path == "/data/experiments":
+        label = request.url.params["label"]
+        experiments = [{"ID": "X1", "label": "E1", "last_modified": "2025-01-03"}]
+        return ok(
+            {"ResultSet": {"Result": [e for e in experiments if e["label"] == label]}}
+        )
+    if path == "/data/experiments/X1/scans":
+        return ok(
+            {
+                "ResultSet": {
+                    "Result": [
+                        {
+                            "ID": scan_id,
+                            "URI": f"/data/experiments/X1/scans/{scan_id}",
+                            "series_description": description,
+                        }
+                        for scan_id, (description, _) in XNAT_SCANS.items()
+                    ]
+                }
+            }
+        )
+    if path == vnalib.xnat_all_scan_files_path("X1"):
+        files = [
+            {
+                "URI": f"/data/experiments/X1/scans/{scan_id}/resources/1/files/{n}",
+                "collection": "DICOM",
+            }
+            for scan_id, (_, frames) in XNAT_SCANS.items()
+            for n in range(frames)
+        ]
+        return ok({"ResultSet": {"Result": files}})
+    return httpx.Response(404)
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    htpasswd = HtpasswdFile(
+        str(tmp_path_factory.mktemp("auth") / ".htpasswd"), new=True
+    )
+    htpasswd.set_password("tester", "secret")
+    htpasswd.save()
+    with pytest.MonkeyPatch.context() as m:
+        m.setenv("HTPASSWD_PATH", htpasswd.path)
+        import app  # reads HTPASSWD_PATH on first import
+
+        yield app
+
+
+@pytest.fixture
+def orthanc(app, monkeypatch):
+    orthanc = Orthanc()
+    monkeypatch.setattr(app, "VNA", FakeVNA(orthanc, xnat))
+    return orthanc
+
+
+class Clock:
+    """Stand-in for app's datetime and time modules."""
+
+    def __init__(self):
+        self.today = NOW
+        self.seconds = 1000.0
+
+    def now(self):
+        return self.today
+
+    def strptime(self, *args):
+        return datetime.strptime(*args)
+
+    def monotonic(self):
+        return self.seconds
+
+
+@pytest.fixture
+def recent(app, orthanc, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app, "datetime", clock)
+    monkeypatch.setattr(app, "time", clock)
+    recent = app.RecentAccessions(ttl_seconds=900)
+    monkeypatch.setattr(recent, "_start", lambda: None)  # the test drives it
+    recent.clock = clock
+    return recent
+
+
+def accessions(recent):
+    return [accession for _, accession in recent.snapshot(wait=0)]
+
+
+def test_recent_poll_fetches_changed_studies_only(recent, orthanc):
+    orthanc.add_study("E1", "20250103")
+    orthanc.add_study("E2", "20250101")
+    orthanc.add_study("QA1", "20250102", "QA^Phantom")
+    orthanc.add_study("E0", "20241231")  # before the window
+    recent.refresh()
+    assert accessions(recent) == ["E1", "E2"]
+
+    orthanc.requests.clear()
+    recent.poll_changes()
+    assert orthanc.requests == ["GET /changes"]  # nothing changed
+
+    orthanc.requests.clear()
+    orthanc.add_study("E3", "20250102")
+    recent.poll_changes()
+    assert orthanc.requests == ["GET /changes", "GET /studies/s-E3"]
+    assert accessions(recent) == ["E1", "E3", "E2"]
+
+
+def test_recent_drops_studies_leaving_the_window(recent, orthanc):
+    orthanc.add_study("E1", "20250103")
+    orthanc.add_study("E2", "20250101")
+    recent.refresh()
+
+    recent.clock.today = datetime(2025, 1, 4, 0, 5)
+    recent._evict()
+    assert accessions(recent) == ["E1"]
+    assert "E2" not in recent._entries
+
+
+def test_recent_deleted_study_expires_after_ttl(recent, orthanc):
+    orthanc.add_study("E1", "20250103")
+    deleted = orthanc.add_study("E2", "20250103")
+    recent.refresh()
+
+    orthanc.delete(deleted)
+    recent.poll_changes()  # the study is gone: nothing to update
+    recent.clock.seconds += 600
+    recent.refresh()
+    recent._evict()
+    assert accessions(recent) == ["E1", "E2"]  # seen 600 s ago
+
+    recent.clock.seconds += 301
+    recent.refresh()
+    recent._evict()
+    assert accessions(recent) == ["E1"]
+
+
+@pytest.fixture
+def client(app, orthanc, monkeypatch):
+    study_id = orthanc.add_study("E1", "20250103")
+    orthanc.add_series(study_id, 1, "localizer", 3)
+    orthanc.add_series(study_id, 2, "T1w_MPR", 176)
+    orthanc.add_series(study_id, 3, "T2w_SPC", 176)
+    monkeypatch.setattr(app, "CHECK_CACHE", check_cache.CheckCache())
+    client = app.app.test_client()
+    token = base64.b64encode(b"tester:secret").decode()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Basic {token}"
+    return client
+
+
+def read_events(response):
+    """Return [(event, data)] of a text/event-stream *response*."""
+    assert response.mimetype == "text/event-stream"
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        if block:
+            event, data = block.split("\n")
+            assert event.startswith("event: ") and data.startswith("data: ")
+            events.append((event[len("event: ") :], json.loads(data[len("data: ") :])))
+    return events
+
+
+def test_check_stream_yields_the_rows_of_check(client):
+    events = read_events(client.get("/check/stream?accession_number=E1"))
+    assert events[-1] == ("done", {"cached": False})
+    rows = [data for event, data in events[:-1]]
+    assert {event for event, _ in events[:-1]} == {"row"}
+
+    checked = client.post("/check", data={"accession_number": "E1", "force": "1"})
+    assert checked.json["cached"] is False
+    assert sorted(rows, key=vnalib.scan_sort_key) == checked.json["results"]
+    assert [row[0] for row in checked.json["results"]] == ["1", "2", "3", "99"]
+    assert checked.json["results"][1][1] == {
+        "xnat_description": "T1w_MPR",
+        "xnat_frames": 175,
+        "orthanc_description": "T1w_MPR",
+        "orthanc_frames": 176,
+    }
+
+    # from the cache, in /check's order
+    events = read_events(client.get("/check/stream?accession_number=E1"))
+    assert events[-1] == ("done", {"cached": True})
+    assert [data for _, data in events[:-1]] == checked.json["results"]
+
+
+def test_check_stream_requires_auth(client):
+    del client.environ_base["HTTP_AUTHORIZATION"]
+    assert client.get("/check/stream?accession_number=E1").status_code == 401
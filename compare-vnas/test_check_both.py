@@ -0,0 +1,64 @@
+import asyncio
+import importlib.util
+import os
+
+from test_vnalib import FakeEngine
+
+spec = importlib.util.spec_from_file_location(
+    "check_both", os.path.join(os.path.dirname(__file__), "check-both.py")
+)
+check_both = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(check_both)
+
+
+class DayEngine(FakeEngine):
+    """FakeEngine for a day of three accessions; E2 answers first, and only
+    its series 99 differs."""
+
+    async def query_studies(self, study_date, expand=False):
+        return [
+            {
+                "ID": acc,
+                "MainDicomTags": {
+                    "StudyDescription": "Investigators^X",
+                    "AccessionNumber": acc,
+                },
+            }
+            for acc in ("E1", "E2", "E3")
+        ]
+
+    async def compare(self, accession_number, orthanc_study=None):
+        await asyncio.sleep(0.01 if accession_number == "E2" else 0.05)
+        rows = [
+            (
+                "1",
+                {
+                    "xnat_frames": 3,
+                    "orthanc_frames": 3,
+                    "xnat_description": "a",
+                    "orthanc_description": "a",
+                },
+            ),
+            (
+                "99",
+                {
+                    "xnat_frames": 1,
+                    "orthanc_frames": 1,
+                    "xnat_description": "r",
+                    "orthanc_description": "r",
+                },
+            ),
+        ]
+        if accession_number == "E2":
+            rows[1][1]["orthanc_frames"] = "MISSING"
+        return rows
+
+
+def test_ignored_mismatch_reported_with_its_accession(capsys):
+    ok = asyncio.run(check_both.check_studies_for_date(DayEngine({}), "20250101"))
+    assert ok
+    assert capsys.readouterr().out.splitlines()[1:] == [
+        "E1  OK",
+        "E2  OK  (ignoring series>98 mismatch)",
+        "E3  OK",
+    ]
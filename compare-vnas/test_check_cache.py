@@ -0,0 +1,69 @@
+import pytest
+
+import check_cache
+from check_cache import CheckCache, check_fingerprint
+
+
+def row(scan_id, xnat=5, orthanc=5, description="T1w_MPR"):
+    return scan_id, {
+        "xnat_description": description if xnat != "MISSING" else "MISSING",
+        "xnat_frames": xnat,
+        "orthanc_description": description if orthanc != "MISSING" else "MISSING",
+        "orthanc_frames": orthanc,
+    }
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(check_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_check_fingerprint():
+    experiment = {"ID": "X1", "label": "E1", "last_modified": "2025-01-01 10:00"}
+    study = {"ID": "s1", "LastUpdate": "20250101T100000", "IsStable": True}
+    assert check_fingerprint(experiment, study, 40) == (
+        ("X1", "2025-01-01 10:00"),
+        ("s1", "20250101T100000", 40),
+    )
+    assert check_fingerprint(experiment, study, 40) != check_fingerprint(
+        experiment, study, 41
+    )
+    assert check_fingerprint(None, None, None) == (None, None)
+
+
+def test_ttl_follows_stability_and_matches(clock):
+    cache = CheckCache(stable_ttl=3600, arriving_ttl=60)
+    matched = [row("1"), row("2")]
+    cache.put("E1", "fp", matched, stable=True)
+    cache.put("E2", "fp", matched, stable=False)
+    cache.put("E3", "fp", [row("1"), row("2", xnat="MISSING")], stable=True)
+    cache.put("E4", "fp", [row("1", xnat=4)], stable=True)
+
+    clock[0] += 59
+    assert [cache.get(acc, "fp") is not None for acc in ("E1", "E2", "E3", "E4")] == [
+        True,
+        True,
+        True,
+        True,
+    ]
+    clock[0] += 2
+    assert cache.get("E1", "fp") == matched
+    assert [cache.get(acc, "fp") for acc in ("E2", "E3", "E4")] == [None] * 3
+    clock[0] += 3600
+    assert cache.get("E1", "fp") is None
+
+
+def test_fingerprint_change_and_lru(clock):
+    cache = CheckCache(max_entries=2)
+    cache.put("E1", "fp1", [row("1")], stable=True)
+    assert cache.get("E1", "fp2") is None  # changed: dropped
+    assert cache.get("E1", "fp1") is None
+
+    cache.put("E1", "fp", [row("1")], stable=True)
+    cache.put("E2", "fp", [row("1")], stable=True)
+    cache.get("E1", "fp")
+    cache.put("E3", "fp", [row("1")], stable=True)
+    assert cache.get("E2", "fp") is None  # least recently used
+    assert cache.get("E1", "fp") and cache.get("E3", "fp")
@@ -0,0 +1,254 @@
+import asyncio
+
+import httpx
+
+import vnalib
+
+SCANS = [
+    {"ID": "1", "URI": "/scans/1", "series_description": "localizer"},
+    {"ID": "2", "URI": "/scans/2", "series_description": "T1w_MPR"},
+    {"ID": "10", "URI": "/scans/10", "series_description": "rfMRI_REST_AP"},
+    {"ID": "99", "URI": "/scans/99", "series_description": "PhoenixZIPReport"},
+]
+SERIES = [
+    ("1", "localizer", 3),
+    ("2", "T1w_MPR", 176),
+    ("3", "T2w_SPC", 176),
+    ("10", "rfMRI_REST_AP", 420),
+]
+
+
+class FakeEngine(vnalib.Engine):
+    """Engine answering from memory; counts the requests it would make."""
+
+    def __init__(self, counts, frames=None):
+        self.counts = counts
+        self.frames = frames or {}
+        self.requests = []
+
+    async def get_xnat_experiment(self, accession_number):
+        self.requests.append("experiment")
+        return {"ID": "X_" + accession_number} if accession_number != "E0" else None
+
+    async def get_orthanc_study(self, accession_number):
+        self.requests.append("study")
+        return {"ID": "s_" + accession_number}
+
+    async def get_xnat_scans(self, experiment_id):
+        self.requests.append("scans")
+        return SCANS
+
+    async def get_xnat_frame_counts(self, experiment_id):
+        self.requests.append("counts")
+        return self.counts
+
+    async def get_xnat_frames(self, scan_uri):
+        self.requests.append(scan_uri)
+        return self.frames[scan_uri]
+
+    async def get_orthanc_series_info(self, study_id):
+        self.requests.append("series")
+        return SERIES
+
+
+def frames(rows):
+    return [
+        (scan_id, info["xnat_frames"], info["orthanc_frames"]) for scan_id, info in rows
+    ]
+
+
+def test_compare_with_bulk_frame_counts():
+    engine = FakeEngine({"1": 3, "2": 175, "10": 420})
+    rows = asyncio.run(engine.compare("E1"))
+    assert frames(rows) == [
+        ("1", 3, 3),
+        ("2", 175, 176),
+        ("3", "MISSING", 176),
+        ("10", 420, 420),
+        ("99", "N/A", "MISSING"),
+    ]
+    assert [vnalib.mismatched(info) for _, info in rows] == [
+        False,
+        True,
+        True,
+        False,
+        True,
+    ]
+    assert sorted(engine.requests) == [
+        "counts",
+        "experiment",
+        "scans",
+        "series",
+        "study",
+    ]
+
+
+def test_per_scan_frames_when_bulk_listing_fails():
+    engine = FakeEngine(None, {s["URI"]: 7 for s in SCANS})
+    rows = asyncio.run(engine.compare("E1", orthanc_study={"ID": "s1"}))
+    assert [xnat for _, xnat, _ in frames(rows)] == [7, 7, "MISSING", 7, 7]
+    assert "study" not in engine.requests
+    assert sorted(r for r in engine.requests if r.startswith("/")) == sorted(
+        s["URI"] for s in SCANS
+    )
+
+
+def test_missing_experiment():
+    engine = FakeEngine({})
+    rows = asyncio.run(engine.compare("E0"))
+    assert frames(rows) == [(number, "MISSING", n) for number, _, n in SERIES]
+    assert "scans" not in engine.requests
+
+
+def test_scan_rows_stream_and_close():
+    async def first_row():
+        engine = FakeEngine(None, {s["URI"]: 7 for s in SCANS})
+        rows = engine.scan_rows({"ID": "X1"}, {"ID": "s1"})
+        first = await anext(rows)
+        await rows.aclose()
+        return first
+
+    # only series 3, absent from XNAT, is known before the per-scan frames
+    scan_id, info = asyncio.run(first_row())
+    assert (scan_id, info["xnat_frames"]) == ("3", "MISSING")
+
+
+class PaddedSeriesEngine(FakeEngine):
+    """FakeEngine whose series listing goes through the real
+    get_orthanc_series_info, from an Orthanc padding its SeriesNumbers."""
+
+    class orthanc:
+        async def get(path):
+            numbers = ["01", " 2", "3", "010"]
+            return httpx.Response(
+                200,
+                json=[
+                    {
+                        "MainDicomTags": {
+                            "SeriesNumber": number,
+                            "SeriesDescription": description,
+                        },
+                        "Instances": ["i"] * 3,
+                    }
+                    for number, (_, description, _) in zip(numbers, SERIES)
+                ],
+            )
+
+    get_orthanc_series_info = vnalib.Engine.get_orthanc_series_info
+
+
+def test_series_id():
+    assert [vnalib.series_id(n) for n in ("05", " 5", "5", 5)] == ["5"] * 4
+    assert [vnalib.series_id(n) for n in ("N/A", "", "5a")] == ["N/A", "", "5a"]
+
+
+def test_padded_series_numbers_match_xnat_scans():
+    engine = PaddedSeriesEngine({"1": 3, "2": 3, "10": 3})
+    expected = [
+        ("1", 3, 3),
+        ("2", 3, 3),
+        ("3", "MISSING", 3),
+        ("10", 3, 3),
+        ("99", "N/A", "MISSING"),
+    ]
+
+    # check-both's path
+    rows = asyncio.run(engine.compare("E1"))
+    assert frames(rows) == expected
+
+    # app.py's path
+    async def streamed():
+        return [row async for row in engine.scan_rows({"ID": "X1"}, {"ID": "s1"})]
+
+    assert sorted(frames(asyncio.run(streamed()))) == sorted(expected)
+
+
+# scan ID -> [(resource label, resource ID, file count)], in XNAT's order
+RESOURCES = {
+    "1": [("DICOM", "101", 3), ("SNAPSHOTS", "102", 2)],
+    "2": [("DICOM", "201", 176), ("SNAPSHOTS", "202", 2), ("NIFTI", "203", 1)],
+    "99": [("secondary", "991", 1), ("SNAPSHOTS", "992", 2)],  # no DICOM
+}
+
+
+def all_scan_files(resources_first=None):
+    """An XNAT_ALL_SCAN_FILES ResultSet for RESOURCES, with the resources of
+    each scan in XNAT's order or those labelled *resources_first* first."""
+    rows = []
+    for scan_id, resources in RESOURCES.items():
+        for label, resource_id, count in sorted(
+            resources, key=lambda r: r[0] != resources_first
+        ):
+            for n in range(count):
+                uri = f"/data/experiments/X1/scans/{scan_id}/resources/{resource_id}/files/{n}.dcm"
+                rows.append({"Name": f"{n}.dcm", "URI": uri, "collection": label})
+    # a session-level resource, and a row without a collection
+    rows.append(
+        {
+            "Name": "notes.txt",
+            "URI": "/data/experiments/X1/resources/7/files/notes.txt",
+            "collection": "DICOM",
+        }
+    )
+    rows.append(
+        {
+            "Name": "x.dcm",
+            "URI": "/data/experiments/X1/scans/5/resources/DICOM/files/x.dcm",
+        }
+    )
+    return {"ResultSet": {"Result": rows, "totalRecords": str(len(rows))}}
+
+
+def scan_item_tree(scan_id):
+    """The ?format=json item tree of one scan, as XNAT returns it."""
+    resources = RESOURCES.get(scan_id, [("DICOM", "0", 1)])
+    return {
+        "items": [
+            {
+                "data_fields": {"ID": scan_id, "type": "T1w_MPR"},
+                "children": [
+                    {
+                        "field": "file",
+                        "items": [
+                            {
+                                "data_fields": {
+                                    "label": label,
+                                    "xnat_abstractresource_id": resource_id,
+                                    "file_count": count,
+                                }
+                            }
+                            for label, resource_id, count in resources
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class ListingEngine(vnalib.Engine):
+    """Engine whose XNAT answers from RESOURCES."""
+
+    def __init__(self):
+        self.xnat = self
+
+    async def get(self, path, params=None):
+        if path == vnalib.xnat_all_scan_files_path("X1"):
+            return httpx.Response(200, json=all_scan_files())
+        return httpx.Response(200, json=scan_item_tree(path.rsplit("/", 1)[1]))
+
+
+def test_bulk_frame_counts_match_per_scan_counts():
+    engine = ListingEngine()
+    counts = asyncio.run(engine.get_xnat_frame_counts("X1"))
+    assert counts == {"1": 3, "2": 176, "99": 1, "5": 1}
+    for scan_id, count in counts.items():
+        per_scan = asyncio.run(
+            engine.get_xnat_frames(f"/data/experiments/X1/scans/{scan_id}")
+        )
+        assert per_scan == count
+
+
+def test_bulk_frame_counts_prefer_dicom():
+    counts = vnalib.xnat_frame_counts(all_scan_files(resources_first="SNAPSHOTS"))
+    assert counts == {"1": 3, "2": 176, "99": 2, "5": 1}
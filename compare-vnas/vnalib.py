@@ -0,0 +1,467 @@
+"""Shared engine for comparing MICVNA (Orthanc) with XNAT.
+
+Used by both app.py and check-both.py.  :class:`Engine` holds one pooled
+``httpx.AsyncClient`` per server and does every query and comparison
+concurrently.  Two facades run it:
+
+* :func:`run` for command-line tools: one engine for one ``asyncio.run``.
+* :class:`BlockingEngine` for threaded callers such as WSGI apps: the engine
+  lives on an event loop thread of its own, shared by all request threads.
+
+Both take ``async def f(engine, *args)``; the :class:`Engine` methods
+themselves qualify, e.g. ``facade.call(Engine.get_changes)``.
+"""
+
+import asyncio
+import os
+import re
+import threading
+
+import httpx
+
+import request_metrics
+
+# Servers (overridable for testing)
+XNAT_URL = os.environ.get("XNAT_URL", "https://iris.mclean.harvard.edu")
+ORTHANC_URL = os.environ.get("ORTHANC_URL", "http://micvna.mclean.harvard.edu:8042")
+
+# Requests in flight, and pooled connections, per server
+XNAT_CONCURRENCY = 8
+ORTHANC_CONCURRENCY = 8
+TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+# Every request made here is a read, so any of them may be retried on a
+# transport error or one of these statuses.
+RETRIES = 2
+RETRY_STATUSES = {502, 503, 504}
+RETRY_BACKOFF_SECONDS = 0.5  # doubled on each further attempt
+
+# Every file of every scan of an experiment, one row per file.  Counting the
+# rows per scan gives all frame counts of a session in one request instead
+# of one item tree (scan_uri?format=json) per scan.
+XNAT_ALL_SCAN_FILES = "/data/experiments/{experiment_id}/scans/ALL/files"
+XNAT_ALL_SCAN_FILES_PARAMS = {"format": "json"}
+
+_SCAN_OF_FILE = re.compile(r"/scans/([^/]+)/resources/([^/]+)/")
+_PENDING = object()
+_DONE = object()
+
+
+def xnat_all_scan_files_path(experiment_id):
+    return XNAT_ALL_SCAN_FILES.format(experiment_id=experiment_id)
+
+
+def xnat_frame_counts(files_listing):
+    """Return {scan ID: file count} from an ``XNAT_ALL_SCAN_FILES`` response.
+
+    Counts the files of each scan's DICOM resource, or of its first resource
+    if it has none; for MR sessions that is the count the per-scan item tree
+    (:func:`xnat_frames_from_scan`) reports.
+    """
+    per_resource = {}  # scan ID -> {resource: count}, in listing order
+    for row in files_listing["ResultSet"]["Result"]:
+        match = _SCAN_OF_FILE.search(row.get("URI", ""))
+        if match is None:
+            continue
+        scan_id, resource = match.groups()
+        resource = row.get("collection") or resource
+        resources = per_resource.setdefault(scan_id, {})
+        resources[resource] = resources.get(resource, 0) + 1
+
+    counts = {}
+    for scan_id, resources in per_resource.items():
+        if "DICOM" in resources:
+            counts[scan_id] = resources["DICOM"]
+        else:
+            counts[scan_id] = next(iter(resources.values()))
+    return counts
+
+
+def xnat_frames_from_scan(scan_info):
+    """Return the file count from a single scan's ``?format=json`` item tree."""
+    children = scan_info["items"][0].get("children", [])
+    for child in children:
+        if "data_fields" in child["items"][0]:
+            file_count = child["items"][0]["data_fields"].get("file_count")
+            if file_count is not None:
+                return file_count
+    return "N/A"
+
+
+def mismatched(scan_info):
+    """Return True if the XNAT and Orthanc sides of a row differ (a series
+    MISSING on one side included)."""
+    return (scan_info["xnat_frames"] != scan_info["orthanc_frames"]) or (
+        scan_info["xnat_description"] != scan_info["orthanc_description"]
+    )
+
+
+def series_id(series_number):
+    """Return Orthanc's SeriesNumber in the form of an XNAT scan ID: "05" and
+    " 5" become "5"; values that are not a number are kept as they are."""
+    try:
+        return str(int(series_number))
+    except (TypeError, ValueError):
+        return str(series_number)
+
+
+def scan_sort_key(row):
+    """Order (scan ID, info) rows by series number."""
+    return int(row[0].split("-")[0])
+
+
+class Server:
+    """An ``httpx.AsyncClient`` for one server with a cap on requests in flight.
+
+    Credentials come from ~/.netrc, as with ``requests``.  Requests time out
+    after *timeout* and are retried up to *retries* times (see RETRIES).
+    """
+
+    def __init__(self, base_url, concurrency, timeout=TIMEOUT, retries=RETRIES):
+        try:
+            auth = httpx.NetRCAuth()
+        except FileNotFoundError:
+            auth = None
+        self.client = request_metrics.instrument_async_client(
+            httpx.AsyncClient(
+                base_url=base_url,
+                auth=auth,
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=concurrency,
+                    max_keepalive_connections=concurrency,
+                ),
+            )
+        )
+        self.retries = retries
+        self._slots = asyncio.Semaphore(concurrency)
+
+    async def request(self, method, path, **kwargs):
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                async with self._slots:
+                    response = await self.client.request(method, path, **kwargs)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                if last_attempt or response.status_code not in RETRY_STATUSES:
+                    return response
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2**attempt)
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class Engine:
+    """XNAT and Orthanc queries, and the series-by-series comparison."""
+
+    def __init__(
+        self,
+        xnat_url=XNAT_URL,
+        orthanc_url=ORTHANC_URL,
+        xnat_concurrency=XNAT_CONCURRENCY,
+        orthanc_concurrency=ORTHANC_CONCURRENCY,
+    ):
+        self.xnat = Server(xnat_url, xnat_concurrency)
+        self.orthanc = Server(orthanc_url, orthanc_concurrency)
+
+    async def aclose(self):
+        await asyncio.gather(self.xnat.aclose(), self.orthanc.aclose())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    # Orthanc
+
+    async def query_studies(self, study_date, expand=False):
+        query_payload = {
+            "Level": "Study",
+            "Query": {"StudyDate": study_date},
+            "Expand": expand,
+        }
+        response = await self.orthanc.post("/tools/find", json=query_payload)
+        response.raise_for_status()  # Ensure we get a successful response
+        return response.json()
+
+    async def get_study_details(self, study_id):
+        response = await self.orthanc.get(f"/studies/{study_id}")
+        response.raise_for_status()
+        return response.json()
+
+    async def get_changes(self, since=None):
+        """Return Orthanc's /changes after sequence number *since* (the last
+        one if None)."""
+        params = {"last": ""} if since is None else {"since": since, "limit": 1000}
+        response = await self.orthanc.get("/changes", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_orthanc_study(self, accession_number):
+        """Return the expanded study (with Series, IsStable, LastUpdate), or
+        None."""
+        query = {
+            "Level": "Study",
+            "Query": {"AccessionNumber": accession_number},
+            "Expand": True,
+        }
+        response = await self.orthanc.post("/tools/find", json=query)
+        if response.status_code == 200:
+            studies = response.json()
+            if studies:
+                return studies[0]  # Assuming the first study is the one we want
+        return None
+
+    async def get_orthanc_instance_count(self, study_id):
+        response = await self.orthanc.get(f"/studies/{study_id}/statistics")
+        if response.status_code == 200:
+            return response.json().get("CountInstances")
+        return None
+
+    async def get_orthanc_series_info(self, study_id):
+        """Return [(number, description, instance count)] for every series of
+        a study, in one request."""
+        response = await self.orthanc.get(f"/studies/{study_id}/series")
+        if response.status_code != 200:
+            return []
+        series_info = []
+        for series in response.json():
+            main_dicom_tags = series.get("MainDicomTags", {})
+            series_number = main_dicom_tags.get("SeriesNumber", "N/A")
+            series_description = main_dicom_tags.get("SeriesDescription", "N/A")
+            instances = series.get("Instances", [])
+            series_info.append(
+                (series_id(series_number), series_description, len(instances))
+            )
+        return series_info
+
+    # XNAT
+
+    async def get_xnat_experiment(self, accession_number):
+        """Return the experiment's ID and last_modified, or None."""
+        response = await self.xnat.get(
+            "/data/experiments",
+            params={"label": accession_number, "columns": "ID,label,last_modified"},
+        )
+        if response.status_code == 200:
+            experiment_data = response.json()
+            if experiment_data["ResultSet"]["Result"]:
+                return experiment_data["ResultSet"]["Result"][0]
+        return None
+
+    async def get_xnat_scans(self, experiment_id):
+        response = await self.xnat.get(f"/data/experiments/{experiment_id}/scans")
+        if response.status_code == 200:
+            return response.json()["ResultSet"]["Result"]
+        return []
+
+    async def get_xnat_frames(self, scan_uri):
+        response = await self.xnat.get(scan_uri, params={"format": "json"})
+        if response.status_code == 200:
+            return xnat_frames_from_scan(response.json())
+        return "N/A"
+
+    async def get_xnat_frame_counts(self, experiment_id):
+        """Return {scan ID: frames} for every scan in one request, or None."""
+        response = await self.xnat.get(
+            xnat_all_scan_files_path(experiment_id),
+            params=XNAT_ALL_SCAN_FILES_PARAMS,
+        )
+        if response.status_code == 200:
+            return xnat_frame_counts(response.json())
+        return None
+
+    # Comparison
+
+    async def lookup(self, accession_number, orthanc_study=None):
+        """Return (XNAT experiment, Orthanc study), fetched concurrently.
+
+        *orthanc_study* is the expanded study if already known.
+        """
+        if orthanc_study is not None:
+            return await self.get_xnat_experiment(accession_number), orthanc_study
+        return await asyncio.gather(
+            self.get_xnat_experiment(accession_number),
+            self.get_orthanc_study(accession_number),
+        )
+
+    async def scan_rows(self, experiment, study):
+        """Yield a (scan ID, info) row per series as soon as both sides are
+        known.
+
+        The XNAT scan list, the frame counts of all scans and the Orthanc
+        series are fetched concurrently; frame counts fall back to one
+        request per scan if the bulk listing fails.  A series missing from
+        one side gets "MISSING" there.
+        """
+        xnat = {}  # scan ID -> [description, frames or None while pending]
+        orthanc = {}  # scan ID -> (description, instance count)
+        xnat_listed = experiment is None
+        orthanc_listed = study is None
+        xnat_scans = None  # the scan list, until frame counts are known too
+        frame_counts = _PENDING  # then {scan ID: frames}, or None to ask per scan
+        tasks = {}
+        if experiment:
+            tasks[asyncio.ensure_future(self.get_xnat_scans(experiment["ID"]))] = (
+                "scans",
+                None,
+            )
+            tasks[
+                asyncio.ensure_future(self.get_xnat_frame_counts(experiment["ID"]))
+            ] = (
+                "counts",
+                None,
+            )
+        if study:
+            tasks[asyncio.ensure_future(self.get_orthanc_series_info(study["ID"]))] = (
+                "series",
+                None,
+            )
+
+        def known(scan_id):
+            return (
+                xnat_listed
+                and orthanc_listed
+                and (scan_id not in xnat or xnat[scan_id][1] is not None)
+            )
+
+        def row(scan_id):
+            xnat_description, xnat_frames = xnat.get(scan_id, ("MISSING", "MISSING"))
+            orthanc_description, orthanc_frames = orthanc.get(
+                scan_id, ("MISSING", "MISSING")
+            )
+            return scan_id, {
+                "xnat_description": xnat_description,
+                "xnat_frames": xnat_frames,
+                "orthanc_description": orthanc_description,
+                "orthanc_frames": orthanc_frames,
+            }
+
+        emitted = set()
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    kind, scan_id = tasks.pop(task)
+                    if kind == "scans":
+                        xnat_scans = task.result()
+                    elif kind == "counts":
+                        frame_counts = task.result()
+                    elif kind == "frames":
+                        xnat[scan_id][1] = task.result()
+                    else:
+                        for number, description, num_instances in task.result():
+                            orthanc[number] = (description, num_instances)
+                        orthanc_listed = True
+
+                if xnat_scans is not None and frame_counts is not _PENDING:
+                    xnat_listed = True
+                    for scan in xnat_scans:
+                        if frame_counts is not None:
+                            frames = frame_counts.get(scan["ID"], "N/A")
+                        else:
+                            frames = None
+                            task = asyncio.ensure_future(
+                                self.get_xnat_frames(scan["URI"])
+                            )
+                            tasks[task] = ("frames", scan["ID"])
+                        xnat[scan["ID"]] = [scan["series_description"], frames]
+                    xnat_scans = None
+
+                for scan_id in list(xnat) + list(orthanc):
+                    if scan_id not in emitted and known(scan_id):
+                        emitted.add(scan_id)
+                        yield row(scan_id)
+        finally:
+            for task in tasks:  # the caller went away
+                task.cancel()
+
+    async def compare(self, accession_number, orthanc_study=None):
+        """Return the rows of :meth:`scan_rows` for *accession_number*, in
+        series order."""
+        experiment, study = await self.lookup(accession_number, orthanc_study)
+        rows = [row async for row in self.scan_rows(experiment, study)]
+        return sorted(rows, key=scan_sort_key)
+
+
+def run(main, *args, **engine_kwargs):
+    """Return ``await main(engine, *args)`` run on a new :class:`Engine`.
+
+    The facade for command-line tools; the engine is closed afterwards.
+    """
+
+    async def run_main():
+        async with Engine(**engine_kwargs) as engine:
+            return await main(engine, *args)
+
+    return asyncio.run(run_main())
+
+
+class BlockingEngine:
+    """Facade for threaded callers such as WSGI apps.
+
+    The :class:`Engine` runs on an event loop in a daemon thread, started on
+    first use.  :meth:`call` and :meth:`iterate` block only the calling
+    thread, so all of them share the engine's connection pools and
+    concurrency limits.
+    """
+
+    def __init__(self, **engine_kwargs):
+        self.engine_kwargs = engine_kwargs
+        self.engine = None
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def call(self, f, *args):
+        """Return ``await f(engine, *args)``."""
+        loop = self._start()
+        return asyncio.run_coroutine_threadsafe(f(self.engine, *args), loop).result()
+
+    def iterate(self, f, *args):
+        """Yield the items of the async iterator ``f(engine, *args)``.
+
+        Closing the returned generator early closes the async iterator too.
+        """
+        loop = self._start()
+        iterator = aiter(f(self.engine, *args))
+        try:
+            while True:
+                item = asyncio.run_coroutine_threadsafe(
+                    self._anext(iterator), loop
+                ).result()
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            if hasattr(iterator, "aclose"):
+                asyncio.run_coroutine_threadsafe(iterator.aclose(), loop).result()
+
+    @staticmethod
+    async def _anext(iterator):
+        return await anext(iterator, _DONE)
+
+    def _start(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="vnalib", daemon=True
+                ).start()
+                self.engine = asyncio.run_coroutine_threadsafe(
+                    self._new_engine(), loop
+                ).result()
+                self._loop = loop
+            return self._loop
+
+    async def _new_engine(self):
+        return Engine(**self.engine_kwargs)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+"""Request-level metrics for the Orthanc/XNAT tools.
+
+Every call is recorded under a *target* (the server's host name, or a local
+resource such as "sqlite") and an *operation* (for HTTP, the method and the
+path with identifiers replaced, e.g. ``GET /instances/{id}/content/{tag}``),
+with a count, a latency histogram, errors and bytes sent and received.  The
+billing scripts record all Orthanc traffic through
+:class:`orthanc_client.PooledOrthanc`; ``requests`` sessions are covered with
+:func:`instrument_session` and ``httpx.AsyncClient`` instances with
+:func:`instrument_async_client`.
+
+At exit a script either prints a summary, slowest operations first, to
+stderr or, with ``--metrics-out PATH``, writes the metrics as JSON or (for a
+``.prom`` path) in the Prometheus textfile format::
+
+    parser = argparse.ArgumentParser()
+    request_metrics.add_arguments(parser)
+    args = parser.parse_args()
+    request_metrics.report_at_exit(args.metrics_out)
+
+This module only uses the standard library.  billing imports it through its
+``request_metrics.py`` symlink; compare-vnas installs it with
+``pip install ./request-metrics`` from the top of the repository.
+"""
+
+import atexit
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+# upper bounds in seconds, as in the Prometheus client defaults plus 30 s
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, math.inf)
+
+# path segments following one of these are identifiers
+COLLECTIONS = {
+    "patients",
+    "studies",
+    "series",
+    "instances",
+    "experiments",
+    "projects",
+    "subjects",
+    "scans",
+    "resources",
+    "files",
+}
+
+
+def operation_name(method, url):
+    """Return "METHOD /path" with the identifiers in *url* replaced.
+
+    >>> operation_name("GET", "http://vna:8042/instances/0a-1b/content/0008-1090")
+    'GET /instances/{id}/content/{tag}'
+    """
+    segments = urlsplit(str(url)).path.split("/")
+    for i in range(1, len(segments)):
+        if segments[i] and segments[i - 1] in COLLECTIONS:
+            segments[i] = "{id}"
+        elif segments[i] and segments[i - 1] == "content":
+            segments[i] = "{tag}"
+            del segments[i + 1 :]  # nested sequence paths
+            break
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+class Metrics:
+    """Thread-safe registry of per-(target, operation) statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def observe(self, target, operation, seconds, bytes_in=0, bytes_out=0, error=False):
+        """Record one call of *operation* on *target* that took *seconds*.
+
+        *bytes_in* is what was received, *bytes_out* what was sent.
+        """
+        with self._lock:
+            entry = self._entries.get((target, operation))
+            if entry is None:
+                entry = self._entries[(target, operation)] = {
+                    "count": 0,
+                    "errors": 0,
+                    "seconds": 0.0,
+                    "bytes_in": 0,
+                    "bytes_out": 0,
+                    "buckets": [0] * len(BUCKETS),
+                }
+            entry["count"] += 1
+            entry["errors"] += bool(error)
+            entry["seconds"] += seconds
+            entry["bytes_in"] += bytes_in
+            entry["bytes_out"] += bytes_out
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][i] += 1
+                    break
+
+    @contextlib.contextmanager
+    def timed(self, target, operation):
+        """Record the duration of the ``with`` block; exceptions count as errors."""
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(target, operation, time.perf_counter() - started, error=error)
+
+    def snapshot(self):
+        """Return a list of dicts, one per (target, operation), hottest first."""
+        with self._lock:
+            rows = [
+                dict(
+                    entry,
+                    target=target,
+                    operation=operation,
+                    buckets=list(entry["buckets"]),
+                )
+                for (target, operation), entry in self._entries.items()
+            ]
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+    # -- output ------------------------------------------------------------
+
+    def summary(self):
+        """Return a human-readable table of the recorded operations."""
+        rows = self.snapshot()
+        if not rows:
+            return ""
+        width = max(len(f"{row['target']} {row['operation']}") for row in rows)
+        lines = [
+            f"{'operation':<{width}} {'count':>7} {'errors':>6} {'total s':>9} "
+            f"{'mean ms':>8} {'p95 ms':>8} {'MB in':>8} {'MB out':>7}"
+        ]
+        for row in rows:
+            mean = row["seconds"] / row["count"]
+            p95 = quantile(row["buckets"], 0.95)
+            p95 = f">{BUCKETS[-2] * 1e3:.0f}" if p95 == math.inf else f"{p95 * 1e3:.0f}"
+            name = f"{row['target']} {row['operation']}"
+            lines.append(
+                f"{name:<{width}} {row['count']:>7} {row['errors']:>6} "
+                f"{row['seconds']:>9.2f} {mean * 1e3:>8.1f} {p95:>8} "
+                f"{row['bytes_in'] / 1e6:>8.2f} {row['bytes_out'] / 1e6:>7.2f}"
+            )
+        return "\n".join(lines)
+
+    def as_json(self):
+        rows = self.snapshot()
+        for row in rows:
+            row["buckets"] = {
+                ("+Inf" if bound == math.inf else str(bound)): n
+                for bound, n in zip(BUCKETS, row["buckets"])
+            }
+        return {"generated": time.time(), "operations": rows}
+
+    def as_prometheus(self, prefix="mictools"):
+        """Return the metrics in the Prometheus text exposition format."""
+        rows = self.snapshot()
+        out = [
+            f"# HELP {prefix}_request_duration_seconds Time spent per call.",
+            f"# TYPE {prefix}_request_duration_seconds histogram",
+        ]
+        for row in rows:
+            labels = _labels(row)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, row["buckets"]):
+                cumulative += n
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                out.append(
+                    f'{prefix}_request_duration_seconds_bucket{{{labels},le="{le}"}} '
+                    f"{cumulative}"
+                )
+            out.append(
+                f"{prefix}_request_duration_seconds_sum{{{labels}}} {row['seconds']}"
+            )
+            out.append(
+                f"{prefix}_request_duration_seconds_count{{{labels}}} {row['count']}"
+            )
+
+        for name, key, help_text in (
+            ("request_errors_total", "errors", "Calls that failed."),
+            ("response_bytes_total", "bytes_in", "Bytes received."),
+            ("request_bytes_total", "bytes_out", "Bytes sent."),
+        ):
+            out.append(f"# HELP {prefix}_{name} {help_text}")
+            out.append(f"# TYPE {prefix}_{name} counter")
+            for row in rows:
+                out.append(f"{prefix}_{name}{{{_labels(row)}}} {row[key]}")
+        return "\n".join(out) + "\n"
+
+    def dump(self, path):
+        """Write the metrics to *path*: Prometheus text for ``.prom``, else JSON.
+
+        The file is replaced atomically, as the node_exporter textfile
+        collector requires.
+        """
+        if path.endswith(".prom"):
+            text = self.as_prometheus()
+        else:
+            text = json.dumps(self.as_json(), indent=2) + "\n"
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+
+
+def _labels(row):
+    def escape(value):
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return f'target="{escape(row["target"])}",operation="{escape(row["operation"])}"'
+
+
+def quantile(buckets, q):
+    """Upper bound of the histogram bucket holding the *q* quantile."""
+    total = sum(buckets)
+    if total == 0:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    for bound, n in zip(BUCKETS, buckets):
+        cumulative += n
+        if cumulative >= rank:
+            return bound
+    return math.inf
+
+
+# Process-wide registry used by default everywhere.
+METRICS = Metrics()
+
+
+def instrument_session(session, metrics=METRICS):
+    """Record every request made through the ``requests`` *session*."""
+
+    def record(response, *args, **kwargs):
+        started = time.perf_counter()
+        size = len(response.content)  # read here so the body time is included
+        request = response.request
+        body = request.body or b""
+        metrics.observe(
+            urlsplit(request.url).hostname,
+            operation_name(request.method, request.url),
+            response.elapsed.total_seconds() + time.perf_counter() - started,
+            bytes_in=size,
+            bytes_out=len(body.encode() if isinstance(body, str) else body),
+            error=response.status_code >= 400,
+        )
+        return response
+
+    session.hooks["response"].append(record)
+    return session
+
+
+def instrument_async_client(client, metrics=METRICS):
+    """Record every request made through the ``httpx.AsyncClient`` *client*."""
+
+    async def record(response):
+        await response.aread()  # so that elapsed covers the body
+        request = response.request
+        metrics.observe(
+            request.url.host,
+            operation_name(request.method, request.url),
+            response.elapsed.total_seconds(),
+            bytes_in=len(response.content),
+            bytes_out=len(request.content),
+            error=response.status_code >= 400,
+        )
+
+    client.event_hooks["response"].append(record)
+    return client
+
+
+def add_arguments(parser):
+    """Add ``--metrics-out`` to the argparse *parser*."""
+    parser.add_argument(
+        "--metrics-out",
+        metavar="PATH",
+        help=(
+            "Write request metrics to PATH at exit (Prometheus textfile if it ends "
+            "in .prom, JSON otherwise) instead of printing a summary to stderr"
+        ),
+    )
+
+
+def report_at_exit(path=None, metrics=METRICS):
+    """At interpreter exit, dump *metrics* to *path*, or print the summary."""
+
+    def report():
+        if path:
+            metrics.dump(path)
+            return
+        summary = metrics.summary()
+        if summary:
+            print("\nRequest metrics:\n" + summary, file=sys.stderr)
+
+    atexit.register(report)